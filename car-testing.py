@@ -6,17 +6,28 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import sys
 import numpy as np
 
-file_path = "sve_dionice_merged_EUR_filled.xlsx"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+import price_store
+import results_store
+import symbols
+from event_panel import EventPanel
+from ticker_loader import TickerLoader
+from trading_calendar import TradingCalendar, ON_OR_AFTER
+
+stage = "filled"     # price_store/filled/ (nekadašnji sve_dionice_merged_EUR_filled.xlsx)
 dogadaji_path = "INSERTIONS_EVENT.csv" # ili DELETIONS_EVENT.csv
 ime_benchmarka = "CBX"
 window = 50     # ± broj trgovačkih dana
 output_dir = "testiranje_car_skripta"
 os.makedirs(output_dir, exist_ok=True)
 
-wb = pd.ExcelFile(file_path)    # u wb lista svih sheetova/tickera
-cbx = wb.parse(ime_benchmarka)  # parsiranje cbx sheeta
+sheet_names = set(price_store.list_tickers(stage))    # skup svih tickera
+master = symbols.load_master()    # X, X-R-A i ISIN -> ista dionica
+loader = TickerLoader(stage, price_col="Last Price")    # svaki ticker se parsira jednom (LRU cache)
+cbx = price_store.load_ticker(ime_benchmarka, stage)  # ucitavanje cbx-a
 cbx.columns = cbx.columns.str.strip()   # parsiranje kolona
 cbx["Date"] = pd.to_datetime(cbx["Date"], errors="coerce")
 cbx = cbx.sort_values("Date").reset_index(drop=True)    # cbx sortiran po datumima
@@ -31,10 +42,14 @@ cbx["Return"] = cbx[cijena_kolona_cbx].pct_change(fill_method=None)
 dogadaji = pd.read_csv(dogadaji_path, dtype=str)
 dogadaji["EventDate"] = pd.to_datetime(dogadaji["EventDate"].str.strip(), format="%Y-%m-%d", errors="coerce")
 
+# Dan 0 = prvi trgovacki dan ZSE-a na ili nakon EventDate (vikendi/praznici -> sljedeca sesija), svi eventi odjednom
+kalendar = TradingCalendar.from_store(stage)
+dogadaji["EventDateActual"] = kalendar.align(dogadaji["EventDate"], ON_OR_AFTER)
+
 # print(dogadaji)   # DOBRO
 
-rezultati = []             # STRUKTURA ZA POHRANU - ZAPAMTI!
-sve_car_podaci = []        # STRUKTURA ZA POHRANU - ZAPAMTI!
+rezultati = []             # STRUKTURA ZA POHRANU - ZAPAMTI! (Symbol, EventDate, EventDateActual)
+ulazi = {}                 # ticker -> (datumi, Return_stock, Return_cbx) - jednom po tickeru
 
 for idx_dogadaj, red in dogadaji.iterrows():    # iterira red po red po dogadajima
     # idx dogadaj - broj redka
@@ -46,26 +61,20 @@ for idx_dogadaj, red in dogadaji.iterrows():    # iterira red po red po dogadaji
         print(f"PAZI: DATUM JE Na ZA DIONICU {ime_dionice}")
         continue
     
-    # Ako nema tickera u sheet nameovima, trazimo pomocu sufiksa -R-A jer za neke dionice ima samo taj sheet u excelici
-    if ime_dionice not in wb.sheet_names:
-        ime_dionice_alt = ime_dionice.replace("-R-A", "").strip()
-        if ime_dionice_alt in wb.sheet_names:
-            ime_dionice = ime_dionice_alt
-        else:
-            print(f"NEMA TICKERA ZA DIONICU {ime_dionice}")
-            continue
-
-    stock = wb.parse(ime_dionice)   # objekt tipa ExcelFile u varijabli stock
-    stock.columns = stock.columns.str.strip()
-    stock["Date"] = pd.to_datetime(stock["Date"], errors="coerce")
-    stock = stock.sort_values("Date").reset_index(drop=True)
+    # Ticker iz eventa (npr. JDPL-R-A) mapira se na ticker pod kojim je dionica spremljena
+    ime_dionice_alt = master.sheet(ime_dionice, sheet_names)
+    if ime_dionice_alt is None:
+        print(f"NEMA TICKERA ZA DIONICU {ime_dionice}")
+        continue
+    ime_dionice = ime_dionice_alt
+
+    stock = loader.get(ime_dionice)   # sortiran po datumu, s kolonom Return - NE MIJENJATI (dijeli se izmedu eventa)
 
     # print(stock[["Date","Symbol","Last Price"]].head(5))
     # if(idx_dogadaj > 5):
     #     break                 # ISPROBAN ISPIS - DOBRO
 
     cijena_kolona = "Last Price"
-    stock["Return"] = stock[cijena_kolona].pct_change(fill_method=None)
     # print(stock[["Date","Symbol","Last Price", "Return"]].head(5))
     # if(idx_dogadaj > 5):
     #     break           
@@ -77,110 +86,80 @@ for idx_dogadaj, red in dogadaji.iterrows():    # iterira red po red po dogadaji
         continue
 
 
-    exact_match = stock[stock["Date"] == datum_dogadaja]
-    if exact_match.empty:
+    # filled stage ima svaki dan kalendara izmedu prvog i zadnjeg dana dionice
+    event_date_actual = red["EventDateActual"]
+    if pd.isna(event_date_actual) or not (stock["Date"].iloc[0] <= event_date_actual <= stock["Date"].iloc[-1]):
         print(f"Nema cijene za dionicu {ime_dionice}, datum: {datum_dogadaja}")
-        continue   # POPRAVI, TU JE ZBOG SUNH-R-A,2016-09-19
-    
-    event_idx = exact_match.index[0]    # NOTE: AKO ZELIMO POMAKNUTI UNATRAG, EVENT_IDX -= 1, UZET CE RADNI DAN PRIJE REBALANSA 
-    event_date_actual = stock.loc[event_idx, "Date"]
-    # print(event_idx)
-    # print(event_date_actual)
-    # break
-
-    start_idx = max(event_idx - window, 0)      
-    end_idx = min(event_idx + window, len(stock) - 1)
-
-    stock_window = stock.iloc[start_idx:end_idx+1].copy()   
-    # BITNO: stock_window je novi dataframe od 2 * window + 1 redaka, s event_idx u sredini 
-    # print(len(stock_window))
-    # break
-
-    # postavljanje prozora za benchmark cbx
-    pocetak = stock["Date"].min()
-    kraj = stock["Date"].max()
-    cbx_window = cbx[(cbx["Date"] >= pocetak) & (cbx["Date"] <= kraj)].copy()
-
-    # print(cbx_window[["Date","Last Price", "Return"]].head(20))
-    # break
-
-    merged = pd.merge(
-        stock_window[["Date", cijena_kolona, "Return"]],
-        cbx_window[["Date", cijena_kolona, "Return"]],
-        on="Date", suffixes=("_stock", "_cbx"), how="inner"
-    )
-
-    # print(merged.head(10))  
-    # break
-
-    # VAŽNO: RAČUNANJE AR, CAR - DOBRO
-    merged["AR"] = merged["Return_stock"] - merged["Return_cbx"]
-    merged["AR"] = merged["AR"].replace([np.inf, -np.inf], np.nan).fillna(0)
-    merged["CAR"] = merged["AR"].cumsum()
-
-    # print(merged.head(15))
-    # break
-
-    merged = merged.reset_index(drop=True)  
-    event_pos_in_merged = merged[merged["Date"] == event_date_actual].index     # ne treba previse gledati, za svaki slucaj ovdje
-    event_row_number = event_pos_in_merged[0]
-    merged["DayOffset"] = range(-event_row_number, len(merged) - event_row_number)
-    # VAŽNO: dataframeu pridružena kolona DayOffset kao dan u odnosu na effective date
-
-    # print(merged.head(15))
-    # break
-
-    # SPREMANJE REZULTATA - DOBRO ZA PREGLEDAVANJE
-    # out_path = os.path.join(output_dir, f"{ime_dionice}_CAR.csv")
-    # merged_output = merged.copy()
-    # merged_output["EventDateOriginal"] = datum_dogadaja.date()
-    # merged_output["EventDateActual"] = event_date_actual.date()
-    # merged_output.to_csv(out_path, index=False)
-
-    car_kraj = merged['CAR'].iloc[-1]
-
-    # KONTROLNI ISPIS ZA PRAĆENJE TOKA
-    # print(f"Iteracija: {idx_dogadaj}, Dionica: {ime_dionice}, Datum dogadaja: {datum_dogadaja.date()}, CAR_kraj={car_kraj:.4f}")
+        continue
     
-    if car_kraj > 0.3 or car_kraj < -0.3:
-        print(f"PAZI, {ime_dionice}: Event={event_date_actual.date()} , CAR_kraj={car_kraj:.4f}, CAR_event={merged.loc[merged['DayOffset']==0, 'CAR'].values[0]:.4f}")
-
-    # print(f"[OK] {ime_dionice}: Event={event_date_actual.date()} (original: {datum_dogadaja.date()}), {len(merged)} dana, CAR_kraj={merged['CAR'].iloc[-1]:.4f}, CAR_event={merged.loc[merged['DayOffset']==0, 'CAR'].values[0]:.4f}")
-
-    # STRUKTURA ZA REZULTAT
-    car_za_prosjek = merged[["DayOffset", "CAR", "AR"]].copy()
-    car_za_prosjek["Symbol"] = ime_dionice
-    sve_car_podaci.append(car_za_prosjek)   # JEDNA OD POČETNE DVIJE
-
-    rezultati.append({
-        "Symbol": ime_dionice,
-        "EventDateOriginal": datum_dogadaja.date(),
-        "EventDateActual": event_date_actual.date(),
-        "DaysData": len(merged),
-        "CAR_total": merged["CAR"].iloc[-1]
-    })
-
-    # if ime_dionice == 'RIVP':
-    #     out_path = os.path.join(output_dir, f"{ime_dionice}_CAR.csv")
-    #     merged_output = merged.copy()
-    #     merged_output["EventDateOriginal"] = datum_dogadaja.date()
-    #     merged_output["EventDateActual"] = event_date_actual.date()
-    #     merged_output.to_csv(out_path, index=False)
 
-# VAŽNO - stvara se df iz rjecnika
-df_rez = pd.DataFrame(rezultati)
+    # prinosi tickera spajaju se jednom (stock i cbx po datumu), svi eventi te dionice ih dijele
+    if ime_dionice not in ulazi:
+        merged = pd.merge(
+            stock[["Date", "Return"]],
+            cbx[["Date", "Return"]],
+            on="Date", suffixes=("_stock", "_cbx"), how="inner"
+        )
+        ulazi[ime_dionice] = (merged["Date"].to_numpy(), merged["Return_stock"].to_numpy(),
+                              merged["Return_cbx"].to_numpy())
+
+    # STRUKTURA ZA REZULTAT - samo metapodaci eventa, prozori se izrezuju odjednom nakon petlje
+    rezultati.append((ime_dionice, datum_dogadaja, event_date_actual))
+
+print(f"[CACHE] {loader.stats()}")
+
+# EVENT PANEL: eventi x DayOffset (-window .. +window); prozori odrezani na rubu povijesti su nevaljane celije
+eventi = pd.DataFrame(rezultati, columns=["Symbol", "EventDateOriginal", "EventDateActual"])
+ulaz_stock = EventPanel.from_series({t: (d, s) for t, (d, s, _) in ulazi.items()}, eventi, window, window)
+ulaz_cbx = EventPanel.from_series({t: (d, c) for t, (d, _, c) in ulazi.items()}, eventi, window, window)
+
+# BAZA REZULTATA (results.sqlite) - kljuc (Group, Symbol, EventDate, model, window, verzija); verzija je hash
+# datuma, prinosa dionice i CBX-a u prozoru, pa se racunaju samo eventi kojih nema u bazi ili su im se podaci promijenili
+eventi_baza = eventi.rename(columns={"EventDateOriginal": "EventDate"}).assign(
+    Group="deleted" if "DELETIONS" in dogadaji_path else "inserted")
+store = results_store.ResultsStore()
+kljucevi = store.keys(eventi_baza, "market_adjusted_simple",
+                      (-window, window), {"benchmark": ime_benchmarka, "stage": stage},
+                      results_store.row_versions(ulaz_stock.dates, ulaz_stock.values, ulaz_cbx.values))
+novi = np.flatnonzero(~store.cached(kljucevi))
+if len(novi):
+    # VAŽNO: RAČUNANJE AR - DOBRO (inf/NaN prinos -> AR 0 unutar prozora)
+    ar = ulaz_stock.values[novi] - ulaz_cbx.values[novi]
+    ar = np.where(ulaz_stock.valid[novi], np.where(np.isfinite(ar), ar, 0.0), np.nan)
+    store.save_paths(eventi_baza.iloc[novi], ar, window, "market_adjusted_simple", {"benchmark": ime_benchmarka, "stage": stage},
+                     kljucevi["version"].iloc[novi], dates=ulaz_stock.dates[novi])
+ar, datumi = store.paths(kljucevi, window, window)    # AR/CAR putanje s datumima; notebook ih cita iz baze
+store.close()
+print(f"[OK] {len(novi)} novih eventa spremljeno u {results_store.RESULTS_DB}, {len(eventi) - len(novi)} iz baze")
+
+panel_ar = EventPanel(ar, np.isfinite(ar), ulaz_stock.offsets, EventPanel.compact_events(eventi), datumi)
+panel_car = panel_ar.cumsum()
+car_kraj = panel_car.last()
+car_event = panel_car.at(0)
+
+for i in np.flatnonzero(np.abs(car_kraj) > 0.3):
+    print(f"PAZI, {eventi['Symbol'][i]}: Event={eventi['EventDateActual'][i].date()} , CAR_kraj={car_kraj[i]:.4f}, CAR_event={car_event[i]:.4f}")
+
+# VAŽNO - stvara se df iz panela
+df_rez = pd.DataFrame({
+    "Symbol": eventi["Symbol"],
+    "EventDateOriginal": eventi["EventDateOriginal"].dt.date,
+    "EventDateActual": eventi["EventDateActual"].dt.date,
+    "DaysData": panel_ar.valid.sum(axis=1),
+    "CAR_total": car_kraj
+})
 # df_rez.to_csv(os.path.join(output_dir, "rezultati_pojedinacni.csv"), index=False)
 # print(f"\n[OK] Rezultati spremljeni ({len(df_rez)} dionice)")
-if sve_car_podaci:
-    combined = pd.concat(sve_car_podaci, ignore_index=True)
-    
-    avg_car = combined.groupby("DayOffset").agg({
-        "CAR": ["mean", "std", "count"],
-        "AR": ["mean"]
-    }).reset_index()
-    
-    avg_car.columns = ["DayOffset", "CAR_mean", "CAR_std", "Count", "AR_mean"]
-    avg_car = avg_car.sort_values("DayOffset")
+
+if len(panel_ar):
+    avg_car = pd.DataFrame({
+        "DayOffset": panel_car.offsets,
+        "CAR_mean": panel_car.mean(),
+        "CAR_std": panel_car.std(),
+        "Count": panel_car.count(),
+        "AR_mean": panel_ar.mean()
+    })
+    avg_car = avg_car[avg_car["Count"] > 0].reset_index(drop=True)
     
     # avg_car.to_csv(os.path.join(output_dir, "CAR_prosjek.csv"), index=False)
     print(f"[OK] Prosjecni CAR spremljen ({len(avg_car)} dana)")
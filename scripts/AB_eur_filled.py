@@ -0,0 +1,177 @@
+"""
+Fused HRK->EUR conversion and calendar-fill stage (A_HRK_EURconv + B_dodavanjeiMicanjeRedaka).
+
+A and B together read the whole universe three times and write it twice. This
+stage reads every ticker of the merged stage once, applies the HRK->EUR
+conversion, drops BLOCK/OTC rows, de-duplicates each day and aligns the ticker
+onto the global trading calendar in memory, then writes the filled stage
+directly. The transformations are exactly the ones A and B apply, so the
+output is identical to running A followed by B (tests/test_ab_eur_filled.py).
+
+The CBX benchmark is not a ZSE security history, so no raw file, A or B ever
+produced it. This stage builds it from the ZSE CROBEX index history csv
+(INDEX_FILE, columns date;last_value) on the same trading calendar as the
+stocks: Date, Symbol, Last Price. Without that file the CBX already in the
+destination stage is left as it is.
+
+Usage:
+    python scripts/AB_eur_filled.py            # merged -> filled
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import price_store
+import symbols
+from trading_calendar import TradingCalendar
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+
+# --- Configuration ---
+SRC = "merged"
+DST = "filled"
+INDEX_FILE = os.path.join(ROOT_DIR, "XZAG-IndexHistory-HRZB00ICBEX6-2010-01-01 - 2025-11-03.csv")
+BENCHMARK_TICKER = "CBX"
+FX = 7.53450                             # fiksni tečaj HRK → EUR
+
+PRICE_COLS = ["Open Price", "High Price", "Low Price", "Last Price", "VWAP Price", "Prev Close Price"]
+ZERO_COLS = ["Volume", "Num Trades", "Turnover"]
+META_COLS = ["MIC", "Symbol", "ISIN", "Price Currency"]
+TURNOVER_COL = "Turnover"
+PRICE_CCY_COL = "Price Currency"
+TURNOVER_CCY_COL = "Turnover Currency"
+DATE_COL = "Date"
+MODEL_COL = "Trading Model"
+DROP_MODELS = {"BLOCK", "OTC"}
+
+
+def convert_hrk(df):
+    """A_HRK_EURconv: converts HRK prices and turnover to EUR. Returns (df, price rows, turnover rows)."""
+    df = df.copy()
+    df.columns = [str(c).strip() for c in df.columns]
+    price_mask = df[PRICE_CCY_COL].eq("HRK") if PRICE_CCY_COL in df.columns else pd.Series([False] * len(df))
+    turnover_mask = df[TURNOVER_CCY_COL].eq("HRK") if TURNOVER_CCY_COL in df.columns else pd.Series([False] * len(df))
+
+    for col in PRICE_COLS:
+        if col in df.columns:
+            df.loc[price_mask, col] = df.loc[price_mask, col] / FX
+            df[col] = df[col].round(4)
+    if PRICE_CCY_COL in df.columns:
+        df.loc[price_mask, PRICE_CCY_COL] = "EUR"
+
+    if TURNOVER_COL in df.columns:
+        df.loc[turnover_mask, TURNOVER_COL] = df.loc[turnover_mask, TURNOVER_COL] / FX
+        df[TURNOVER_COL] = df[TURNOVER_COL].round(2)
+    if TURNOVER_CCY_COL in df.columns:
+        df.loc[turnover_mask, TURNOVER_CCY_COL] = "EUR"
+    return df, int(price_mask.sum()), int(turnover_mask.sum())
+
+
+def trading_dates(df):
+    """Normalized dates of every row; B builds the calendar before dropping BLOCK/OTC rows."""
+    if DATE_COL not in df.columns:
+        return pd.DatetimeIndex([])
+    return pd.DatetimeIndex(pd.to_datetime(df[DATE_COL], errors="coerce").dt.normalize().dropna())
+
+
+def clean_daily(df):
+    """B, first half: normalizes dates, drops BLOCK/OTC rows and keeps one row per day."""
+    df = df.copy()
+    df[DATE_COL] = pd.to_datetime(df[DATE_COL], errors="coerce").dt.normalize()
+    df = df.dropna(subset=[DATE_COL])
+    if MODEL_COL in df.columns:
+        mask_bad = df[MODEL_COL].astype(str).str.upper().str.strip().isin(DROP_MODELS)
+        df = df[~mask_bad]
+    if df.empty:
+        return df
+    return df.sort_values(DATE_COL).groupby(DATE_COL, as_index=False).last().set_index(DATE_COL)
+
+
+def align(daily, calendar):
+    """B, second half: reindexes onto the calendar, ffills prices/meta and zero-fills activity."""
+    wanted_idx = pd.DatetimeIndex(calendar.between(daily.index.min(), daily.index.max())).as_unit(daily.index.unit)
+
+    re = daily.reindex(wanted_idx)
+    new_rows_mask = re.index.isin(re.index.difference(daily.index))
+    for col in PRICE_COLS + META_COLS:
+        if col in re.columns:
+            re[col] = re[col].ffill()
+    for col in ZERO_COLS:
+        if col in re.columns:
+            re.loc[new_rows_mask, col] = 0
+    return re.reset_index().rename(columns={"index": DATE_COL})
+
+
+def benchmark_frame(index_file, calendar):
+    """CROBEX closes of the ZSE index history csv on the trading calendar (ffilled), as the CBX ticker."""
+    index = pd.read_csv(index_file, sep=";", decimal=",")
+    closes = pd.Series(index["last_value"].to_numpy(dtype=float),
+                       index=pd.to_datetime(index["date"], errors="coerce").dt.normalize())
+    closes = closes[closes.index.notna()].sort_index()
+    closes = closes[~closes.index.duplicated(keep="last")]
+    days = pd.DatetimeIndex(calendar.between(closes.index.min(), closes.index.max()))
+    return pd.DataFrame({DATE_COL: days, "Symbol": BENCHMARK_TICKER,
+                         "Last Price": closes.reindex(days).ffill().to_numpy()})
+
+
+def build_filled(src=SRC, tickers=None, index_file=INDEX_FILE):
+    """
+    Runs the fused stage in memory and returns ({ticker: filled frame}, summary frame).
+    Each source ticker is read exactly once; CBX is added when index_file exists.
+    """
+    if tickers is None:
+        tickers = symbols.load_master().canonical_sheets(price_store.list_tickers(src))
+
+    converted = {}
+    summary_rows = []
+    all_dates = []
+    for ticker in tickers:
+        df, price_rows, turnover_rows = convert_hrk(price_store.load_ticker(ticker, src))
+        all_dates.append(trading_dates(df).values)
+        converted[ticker] = df
+        summary_rows.append({
+            "Sheet": ticker,
+            "Rows": len(df),
+            "HRK→EUR (price rows)": price_rows,
+            "HRK→EUR (turnover rows)": turnover_rows,
+        })
+    calendar = TradingCalendar(np.concatenate(all_dates) if all_dates else [])
+
+    filled = {}
+    for ticker, df in converted.items():
+        if DATE_COL not in df.columns:
+            filled[ticker] = df
+            continue
+        daily = clean_daily(df)
+        filled[ticker] = daily if daily.empty else align(daily, calendar)
+    if index_file and os.path.exists(index_file):
+        filled[BENCHMARK_TICKER] = benchmark_frame(index_file, calendar)
+    return filled, pd.DataFrame(summary_rows).sort_values("Sheet")
+
+
+def run(src=SRC, dst=DST):
+    filled, summary = build_filled(src)
+    for ticker, df in filled.items():
+        price_store.write_ticker(df, ticker, dst)
+    print("\n=== HRK → EUR konverzija: sažetak ===")
+    print(summary.to_string(index=False))
+    if BENCHMARK_TICKER not in filled:
+        print(f"\n{BENCHMARK_TICKER} nije izgrađen (nema {INDEX_FILE}), postojeći {BENCHMARK_TICKER} ostaje")
+    print(f"\nGotovo ✅ Spremio sam: {price_store.stage_dir(dst)}")
+    return filled
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fused HRK->EUR conversion and calendar fill.")
+    parser.add_argument("--src", default=SRC, choices=price_store.STAGES)
+    parser.add_argument("--dst", default=DST, choices=price_store.STAGES)
+    args = parser.parse_args(argv)
+    run(args.src, args.dst)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,8 +1,9 @@
 import pandas as pd
-import xlsxwriter
+import price_store
+import symbols
 # === Postavke ===
-SRC = "sve_dionice_merged.xlsx"          # ulazna datoteka
-DST = "sve_dionice_merged_EUR.xlsx"      # izlazna datoteka
+SRC = "merged"                           # ulazni stage u price_store/
+DST = "eur"                              # izlazni stage u price_store/
 FX = 7.53450                             # fiksni tečaj HRK → EUR
 
 PRICE_COLS = [
@@ -14,62 +15,48 @@ PRICE_CCY_COL = "Price Currency"
 TURNOVER_CCY_COL = "Turnover Currency"
 
 # === Učitavanje i obrada ===
-xls = pd.ExcelFile(SRC)
 summary_rows = []
 
-# zadrži:
-# - sve sheetove bez -R-A
-# - sheetove s -R-A samo ako ne postoji njihova verzija bez nastavka
-all_sheets = xls.sheet_names
-base_names = set(s.replace("-R-A", "") for s in all_sheets)
-filtered_sheets = []
-izbaceni=[]
-for name in all_sheets:
-    if name.endswith("-R-A"):
-        if name.replace("-R-A", "") not in all_sheets:
-            filtered_sheets.append(name)
-        else:
-            izbaceni.append(name)
-    else:
-        filtered_sheets.append(name)
-
-with pd.ExcelWriter(DST, engine="xlsxwriter") as writer:
-    for sheet in filtered_sheets:
-        df = xls.parse(sheet)
-        df.columns = [str(c).strip() for c in df.columns]
-
-        # maske gdje su valute HRK
-        price_mask = df[PRICE_CCY_COL].eq("HRK") if PRICE_CCY_COL in df.columns else pd.Series([False]*len(df))
-        turnover_mask = df[TURNOVER_CCY_COL].eq("HRK") if TURNOVER_CCY_COL in df.columns else pd.Series([False]*len(df))
-
-        # konverzija cijena
-        for col in PRICE_COLS:
-            if col in df.columns:
-                df.loc[price_mask, col] = df.loc[price_mask, col] / FX
-                df[col] = df[col].round(4)
-        if PRICE_CCY_COL in df.columns:
-            df.loc[price_mask, PRICE_CCY_COL] = "EUR"
-
-        # konverzija prometa
-        if TURNOVER_COL in df.columns:
-            df.loc[turnover_mask, TURNOVER_COL] = df.loc[turnover_mask, TURNOVER_COL] / FX
-            df[TURNOVER_COL] = df[TURNOVER_COL].round(2)
-        if TURNOVER_CCY_COL in df.columns:
-            df.loc[turnover_mask, TURNOVER_CCY_COL] = "EUR"
-
-        # spremi konvertirani sheet
-        df.to_excel(writer, sheet_name=sheet, index=False)
-
-        summary_rows.append({
-            "Sheet": sheet,
-            "Rows": len(df),
-            "HRK→EUR (price rows)": int(price_mask.sum()),
-            "HRK→EUR (turnover rows)": int(turnover_mask.sum())
-        })
+# jedan ticker po dionici (X i X-R-A su ista dionica, vidi symbols.py)
+all_sheets = price_store.list_tickers(SRC)
+filtered_sheets = symbols.load_master().canonical_sheets(all_sheets)
+
+for sheet in filtered_sheets:
+    df = price_store.load_ticker(sheet, SRC)
+    df.columns = [str(c).strip() for c in df.columns]
+
+    # maske gdje su valute HRK
+    price_mask = df[PRICE_CCY_COL].eq("HRK") if PRICE_CCY_COL in df.columns else pd.Series([False]*len(df))
+    turnover_mask = df[TURNOVER_CCY_COL].eq("HRK") if TURNOVER_CCY_COL in df.columns else pd.Series([False]*len(df))
+
+    # konverzija cijena
+    for col in PRICE_COLS:
+        if col in df.columns:
+            df.loc[price_mask, col] = df.loc[price_mask, col] / FX
+            df[col] = df[col].round(4)
+    if PRICE_CCY_COL in df.columns:
+        df.loc[price_mask, PRICE_CCY_COL] = "EUR"
+
+    # konverzija prometa
+    if TURNOVER_COL in df.columns:
+        df.loc[turnover_mask, TURNOVER_COL] = df.loc[turnover_mask, TURNOVER_COL] / FX
+        df[TURNOVER_COL] = df[TURNOVER_COL].round(2)
+    if TURNOVER_CCY_COL in df.columns:
+        df.loc[turnover_mask, TURNOVER_CCY_COL] = "EUR"
+
+    # spremi konvertirani ticker
+    price_store.write_ticker(df, sheet, DST)
+
+    summary_rows.append({
+        "Sheet": sheet,
+        "Rows": len(df),
+        "HRK→EUR (price rows)": int(price_mask.sum()),
+        "HRK→EUR (turnover rows)": int(turnover_mask.sum())
+    })
 
 # === Sažetak ===
 summary = pd.DataFrame(summary_rows).sort_values("Sheet")
 print("\n=== HRK → EUR konverzija: sažetak ===")
 print(summary.to_string(index=False))
-print(f"\nKonvertirana datoteka spremljena kao: {DST}")
+print(f"\nKonvertirani podaci spremljeni u: {price_store.stage_dir(DST)}")
 
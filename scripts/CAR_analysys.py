@@ -1,9 +1,14 @@
 import pandas as pd
 import numpy as np
-import statsmodels.api as sm
 import matplotlib.pyplot as plt
 import os
 from datetime import datetime
+from car_cache import CarCache
+from event_panel import EventPanel
+import market_model
+import results_store
+import symbols
+from stock_index import StockIndex
 
 # --- Configuration ---
 # Define the lengths of your estimation and event windows (in trading days)
@@ -12,12 +17,16 @@ ESTIMATION_DAYS = 59
 EVENT_WINDOW_PRE = 10  # Days before event
 EVENT_WINDOW_POST = 10 # Days after event
 EVENT_WINDOW_LEN = EVENT_WINDOW_PRE + EVENT_WINDOW_POST + 1
+EVENT_DAYS = pd.RangeIndex(-EVENT_WINDOW_PRE, EVENT_WINDOW_POST + 1, name='Event Day')
+GAP_DAYS = 1   # trading days between the estimation and the event window
+MIN_OBS = 20   # minimum usable observations in the estimation window
+CAR_WINDOWS = [(-1, 1), (-5, 5), (0, 10), (-10, 10)]   # windows tabulated next to the CAAR plots
+NORMAL_MODEL = 'market'   # any of market_model.MODELS: mean_adjusted, market_adjusted, market, scholes_williams, dimson
 
 # --- File Definitions ---
 EVENTS_FILE = 'xlsx\\inserted-deleted.xlsx' # <-- File path updated
 MARKET_INDEX_FILE = 'XZAG-IndexHistory-HRZB00ICBEX6-2010-01-01 - 2025-11-03.csv' # <-- File path updated
-STOCK_FILE_PREFIX = 'sve_dionice_merged_EUR_filled.xlsx - '
-STOCK_FILE_SUFFIX = '.csv'
+STOCK_STAGE = 'filled'  # price_store/filled/<TICKER>.parquet
 
 def load_and_preprocess_market_data(filepath):
     """Loads and processes the market index data."""
@@ -42,89 +51,62 @@ def load_and_preprocess_market_data(filepath):
     market_df['market_return'] = np.log(market_df['last_value'] / market_df['last_value'].shift(1))
     return market_df[['market_return']].dropna()
 
-def load_and_preprocess_stock_data(ticker):
-    """Loads and processes a single stock's data."""
-    filepath = f"{STOCK_FILE_PREFIX}{ticker}{STOCK_FILE_SUFFIX}"
-    if not os.path.exists(filepath):
-        print(f"Warning: Stock file not found for ticker: {ticker}. Skipping.")
-        return None
-        
-    stock_df = pd.read_csv(filepath)
-    # Normalize to remove time component
-    stock_df['Date'] = pd.to_datetime(stock_df['Date']).dt.normalize()
-    stock_df = stock_df.set_index('Date').sort_index()
-    # Calculate log returns for the stock
-    stock_df['stock_return'] = np.log(stock_df['Last Price'] / stock_df['Last Price'].shift(1))
-    return stock_df[['stock_return']].dropna()
-
-def calculate_event_car(event_date, ticker, market_data):
-    """
-    Performs the full event study calculation for a single stock and event.
-    """
-    stock_data = load_and_preprocess_stock_data(ticker)
-    if stock_data is None:
-        return None
+# --- Load full stock universe once into memory ---
+STOCK_INDEX = None
 
-    # 1. Merge stock and market data to align trading days
-    data = pd.merge(stock_data, market_data, on='Date', how='inner')
+def load_stock_index():
+    """Loads every ticker once into a per-symbol offset index with precomputed log returns."""
+    global STOCK_INDEX
+    if STOCK_INDEX is None:
+        print("Loading full stock dataset into memory...")
+        STOCK_INDEX = StockIndex.from_store(STOCK_STAGE)
+    return STOCK_INDEX
 
-    # 2. Find the event date location
-    try:
-        # Find the first trading day *on or after* the announcement date
-        event_date_loc = data.index.get_loc(event_date, method='bfill')
-    except KeyError:
-        # Event date is outside the stock's trading range
-        print(f"Warning: Event date {event_date.date()} for {ticker} is outside its data range. Skipping.")
-        return None
-    except Exception as e:
-        print(f"Error finding event date for {ticker}: {e}. Skipping.")
-        return None
-
-    # 3. Define Estimation and Event window locations
-    # Estimation Window
-    est_win_end_loc = event_date_loc - EVENT_WINDOW_PRE - 2 # Gap of 1 day
-    est_win_start_loc = est_win_end_loc - ESTIMATION_DAYS
-    
-    # Event Window
-    event_win_start_loc = event_date_loc - EVENT_WINDOW_PRE
-    event_win_end_loc = event_date_loc + EVENT_WINDOW_POST
 
-    # Check if windows are out of bounds
-    if est_win_start_loc < 0 or event_win_end_loc >= len(data):
-        print(f"Warning: Not enough data for {ticker} around event {event_date.date()}. Skipping.")
-        return None
+def run_event_study(events, market_data):
+    """
+    Market-model event study for many (Symbol, EventDate) pairs at once.
+    Returns (result, ar, tests): result is one row per event with alpha, beta,
+    status, ..., ar an events x EVENT_WINDOW_LEN array of abnormal returns and
+    tests the significance tests over the same events.
+    """
+    stocks = load_stock_index()
+    master = symbols.load_master()
+    events = events.reset_index(drop=True)
+    # Event tickers may use the -R-A alias
+    events['Symbol'] = [master.sheet(t, stocks.offsets) or t for t in events['Symbol']]
+    # only events missing from the results store (or whose window data changed) are fitted
+    result, ar, tests = results_store.event_study(
+        events, stocks, market_data['market_return'], benchmark=os.path.basename(MARKET_INDEX_FILE),
+        est_days=ESTIMATION_DAYS, pre=EVENT_WINDOW_PRE, post=EVENT_WINDOW_POST, gap=GAP_DAYS,
+        min_obs=MIN_OBS, model=NORMAL_MODEL)
+    print(f"{int(result['cached'].sum())} of {len(result)} events read from {results_store.RESULTS_DB}")
+
+    for row in result.itertuples():
+        if row.status == market_model.NO_DATA:
+            print(f"Warning: No data found for ticker {row.Symbol}. Skipping.")
+        elif row.status == market_model.OUT_OF_RANGE:
+            print(f"Warning: Not enough data for {row.Symbol} around event {row.EventDate.date()}. Skipping.")
+        elif row.status == market_model.FEW_OBS:
+            print(f"Warning: Not enough observations ({row.n_obs}) in estimation window for {row.Symbol}. Skipping.")
+    return result, ar, tests
 
-    # 4. Extract window data
-    estimation_data = data.iloc[est_win_start_loc : est_win_end_loc + 1]
-    event_data = data.iloc[event_win_start_loc : event_win_end_loc + 1]
 
-    if len(event_data) != EVENT_WINDOW_LEN:
-        # This can happen if the event is too close to the start/end of the data
-        print(f"Warning: Event window for {ticker} is incomplete ({len(event_data)} days). Skipping.")
+def calculate_event_car(event_date, ticker, market_data):
+    """
+    Performs the event study for a single stock and a single event.
+    Returns a DataFrame indexed by Event Day (-EVENT_WINDOW_PRE .. +EVENT_WINDOW_POST)
+    with columns ['abnormal_return','car'], or None if it cannot be computed.
+    """
+    events = pd.DataFrame({'Symbol': [ticker], 'EventDate': [pd.Timestamp(event_date)]})
+    result, ar, _ = run_event_study(events, market_data)
+    if result['status'].iloc[0] != market_model.OK:
         return None
 
-    # 5. Run Market Model Regression (OLS)
-    # Y = stock_return, X = market_return
-    Y = estimation_data['stock_return']
-    X = estimation_data['market_return']
-    X_with_const = sm.add_constant(X) # Add constant (alpha)
-
-    model = sm.OLS(Y, X_with_const).fit()
-    alpha, beta = model.params['const'], model.params['market_return']
-
-    # 6. Calculate Abnormal Returns (AR)
-    event_data['expected_return'] = alpha + (beta * event_data['market_return'])
-    event_data['abnormal_return'] = event_data['stock_return'] - event_data['expected_return']
-
-    # 7. Calculate Cumulative Abnormal Returns (CAR)
+    event_data = pd.DataFrame({'abnormal_return': ar[0]}, index=EVENT_DAYS)
     event_data['car'] = event_data['abnormal_return'].cumsum()
-    
-    # Standardize index to -10, -9, ..., 0, ..., +10
-    event_data.reset_index(drop=True, inplace=True)
-    event_data.index = event_data.index - EVENT_WINDOW_PRE
-    event_data.index.name = 'Event Day'
-    
-    return event_data[['abnormal_return', 'car']]
+    return event_data
+
 
 def parse_stock_list(stock_str):
     """Parses the semi-colon separated stock tickers."""
@@ -177,29 +159,26 @@ def main():
     # Normalize to remove time component
     events_df['Datum objave'] = pd.to_datetime(events_df['Datum objave'], dayfirst=True).dt.normalize()
 
-    all_inserted_results = []
-    all_deleted_results = []
-
-    # 3. Iterate through each event
+    # 3. Collect every (ticker, event) pair and estimate all of them in one batch
     print(f"Processing {len(events_df)} events...")
+    pairs = []
     for _, event in events_df.iterrows():
         event_date = event['Datum objave']
-        
-        # Process Inserted Stocks
-        inserted_stocks = parse_stock_list(event['Uključeni'])
-        for ticker in inserted_stocks:
-            res = calculate_event_car(event_date, ticker, market_data)
-            if res is not None:
-                all_inserted_results.append(res['abnormal_return'])
-        
-        # Process Deleted Stocks
-        deleted_stocks = parse_stock_list(event['Isključeni'])
-        for ticker in deleted_stocks:
-            res = calculate_event_car(event_date, ticker, market_data)
-            if res is not None:
-                all_deleted_results.append(res['abnormal_return'])
-
-    if not all_inserted_results and not all_deleted_results:
+        for ticker in parse_stock_list(event['Uključeni']):
+            pairs.append((ticker, event_date, 'inserted'))
+        for ticker in parse_stock_list(event['Isključeni']):
+            pairs.append((ticker, event_date, 'deleted'))
+    events = pd.DataFrame(pairs, columns=['Symbol', 'EventDate', 'Group'])
+    result, ar, tests = run_event_study(events, market_data)
+
+    ok = (result['status'] == market_model.OK).to_numpy()
+    inserted_ids = np.flatnonzero(ok & (result['Group'] == 'inserted').to_numpy())
+    deleted_ids = np.flatnonzero(ok & (result['Group'] == 'deleted').to_numpy())
+    panel = EventPanel.from_ar(ar, EVENT_WINDOW_PRE, result, result['status'])
+    inserted, deleted = panel.select(inserted_ids), panel.select(deleted_ids)
+    cars = CarCache.from_event_study(ar, EVENT_WINDOW_PRE, result['status'])
+
+    if not len(inserted) and not len(deleted):
         print("No valid event data could be processed. Exiting.")
         print("Please check file names, dates, and data ranges.")
         return
@@ -208,31 +187,31 @@ def main():
     print("\n--- Analysis Complete ---")
 
     # --- INSERTED STOCKS ---
-    if all_inserted_results:
-        # Concatenate all Abnormal Return series into a single DataFrame
-        aar_inserted_df = pd.concat(all_inserted_results, axis=1)
-        # Calculate Average Abnormal Return (AAR) for each day
-        aar_inserted_df['aar'] = aar_inserted_df.mean(axis=1)
-        # Calculate Cumulative Average Abnormal Return (CAAR)
-        aar_inserted_df['caar'] = aar_inserted_df['aar'].cumsum()
-        
-        print(f"\nResults for Inserted Stocks ({len(all_inserted_results)} events):")
+    if len(inserted):
+        # Average Abnormal Return (AAR) and its cumulative sum (CAAR) for each day
+        aar_inserted_df = inserted.summary()
+
+        print(f"\nResults for Inserted Stocks ({len(inserted)} events):")
         print(aar_inserted_df[['aar', 'caar']])
+        print(cars.caar_table(CAR_WINDOWS, inserted_ids))
+        print(tests.select(inserted_ids).window_tests(CAR_WINDOWS))
+        # several stocks share a revision date: cross-correlation-robust versions
+        print(tests.select(inserted_ids).clustered_tests(CAR_WINDOWS))
         plot_caar(aar_inserted_df, 'CAAR for Stocks Inserted into CROBEX')
     else:
         print("\nNo valid data found for 'Inserted' stocks.")
 
     # --- DELETED STOCKS ---
-    if all_deleted_results:
-        # Concatenate all Abnormal Return series into a single DataFrame
-        aar_deleted_df = pd.concat(all_deleted_results, axis=1)
-        # Calculate Average Abnormal Return (AAR) for each day
-        aar_deleted_df['aar'] = aar_deleted_df.mean(axis=1)
-        # Calculate Cumulative Average Abnormal Return (CAAR)
-        aar_deleted_df['caar'] = aar_deleted_df['aar'].cumsum()
-        
-        print(f"\nResults for Deleted Stocks ({len(all_deleted_results)} events):")
+    if len(deleted):
+        # Average Abnormal Return (AAR) and its cumulative sum (CAAR) for each day
+        aar_deleted_df = deleted.summary()
+
+        print(f"\nResults for Deleted Stocks ({len(deleted)} events):")
         print(aar_deleted_df[['aar', 'caar']])
+        print(cars.caar_table(CAR_WINDOWS, deleted_ids))
+        print(tests.select(deleted_ids).window_tests(CAR_WINDOWS))
+        # several stocks share a revision date: cross-correlation-robust versions
+        print(tests.select(deleted_ids).clustered_tests(CAR_WINDOWS))
         plot_caar(aar_deleted_df, 'CAAR for Stocks Deleted from CROBEX')
     else:
         print("\nNo valid data found for 'Deleted' stocks.")
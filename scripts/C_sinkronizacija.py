@@ -1,25 +1,13 @@
 import pandas as pd
-file_path = "..\sve_dionice_merged_EUR_filled.xlsx"
+import price_store
+import symbols
+stage = "filled"
 
-xls = pd.ExcelFile(file_path)
+print("Tickeri pronađeni u storeu:")
 
-print("Sheetovi pronađeni u datoteci:")
-
-# zadrži:
-# - sve sheetove bez -R-A
-# - sheetove s -R-A samo ako ne postoji njihova verzija bez nastavka
-all_sheets = xls.sheet_names
-base_names = set(s.replace("-R-A", "") for s in all_sheets)
-filtered_sheets = []
-izbaceni=[]
-for name in all_sheets:
-    if name.endswith("-R-A"):
-        if name.replace("-R-A", "") not in all_sheets:
-            filtered_sheets.append(name)
-        else:
-            izbaceni.append(name)
-    else:
-        filtered_sheets.append(name)
+# jedan ticker po dionici (X i X-R-A su ista dionica, vidi symbols.py)
+all_sheets = price_store.list_tickers(stage)
+filtered_sheets = symbols.load_master().canonical_sheets(all_sheets)
 
 # 2) Odaberi metriku i agregaciju (za Volume/Num Trades često je "sum", za cijene "last")
 metric = "Last Price"  # npr. "Volume", "Num Trades", "Last Price", "VWAP Price", "Turnover"
@@ -31,9 +19,9 @@ agg = per_metric_agg.get(metric, default_agg)
 pivot = pd.DataFrame()
 
 for sheet in filtered_sheets:
-    df = xls.parse(sheet)
-    df.columns = [str(c).strip() for c in df.columns]
-    if "Date" not in df.columns or metric not in df.columns:
+    try:
+        df = price_store.load_ticker(sheet, stage, columns=["Date", metric])   # čitaju se samo potrebni stupci
+    except (KeyError, ValueError):
         continue
 
     # Parsiraj datum na date (bez vremena) i ukloni loše retke
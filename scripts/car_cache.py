@@ -0,0 +1,93 @@
+"""
+Prefix-sum cache of abnormal returns for constant-time CAR queries.
+
+The event study produces an (n_events, pre + post + 1) array of abnormal
+returns. Keeping its row-wise cumulative sums (with a leading zero column)
+turns every CAR(t1, t2) into one difference of two lookups, so any number of
+windows over any subset of events is answered without re-summing:
+
+    cache = CarCache(ar, pre=10)
+    cache.car([0, 1, 2], -5, 5)              # CAR(-5, +5) of three events
+    cache.car(ids, [-1, 0, -10], [1, 10, 10])  # a different window per event
+    cache.table([(-1, 1), (-5, 5), (0, 10)])   # events x windows frame
+
+Missing abnormal returns count as zero (like pandas' cumsum); a CAR whose
+window holds no abnormal return at all is NaN.
+"""
+import numpy as np
+import pandas as pd
+
+
+class CarCache:
+
+    def __init__(self, ar, pre):
+        ar = np.asarray(ar, dtype=float)
+        if ar.ndim != 2:
+            raise ValueError(f"Expected an (events, days) array, got shape {ar.shape}")
+        self.pre = pre
+        self.post = ar.shape[1] - pre - 1
+        n_events = ar.shape[0]
+        observed = np.isfinite(ar)
+        self._sum = np.zeros((n_events, ar.shape[1] + 1))
+        self._count = np.zeros((n_events, ar.shape[1] + 1), dtype=np.int64)
+        np.cumsum(np.where(observed, ar, 0.0), axis=1, out=self._sum[:, 1:])
+        np.cumsum(observed, axis=1, out=self._count[:, 1:])
+
+    @classmethod
+    def from_event_study(cls, ar, pre, status=None):
+        """From market_model.event_study output; rows whose status is not 'ok' become NaN."""
+        ar = np.asarray(ar, dtype=float)
+        if status is not None:
+            ar = np.where((np.asarray(status) == 'ok')[:, None], ar, np.nan)
+        return cls(ar, pre)
+
+    def __len__(self):
+        return self._sum.shape[0]
+
+    def _columns(self, t1, t2):
+        t1, t2 = np.asarray(t1), np.asarray(t2)
+        if (t1 < -self.pre).any() or (t2 > self.post).any() or (t1 > t2).any():
+            raise ValueError(f"Windows must satisfy {-self.pre} <= t1 <= t2 <= {self.post}")
+        return t1 + self.pre, t2 + self.pre + 1
+
+    def _events(self, event_ids):
+        return np.arange(len(self)) if event_ids is None else np.asarray(event_ids)
+
+    def car(self, event_ids, t1, t2):
+        """CAR(t1, t2) for every event id; ids, t1 and t2 broadcast against each other."""
+        ids = self._events(event_ids)
+        lo, hi = self._columns(t1, t2)
+        total = self._sum[ids, hi] - self._sum[ids, lo]
+        count = self._count[ids, hi] - self._count[ids, lo]
+        return np.where(count > 0, total, np.nan)
+
+    def ar(self, event_ids, t):
+        """Abnormal return on event day t."""
+        return self.car(event_ids, t, t)
+
+    def caar(self, t1, t2, event_ids=None):
+        """Cross-sectional mean of CAR(t1, t2); arrays of t1/t2 give one CAAR per window."""
+        ids = self._events(event_ids)
+        t1, t2 = np.broadcast_arrays(np.asarray(t1), np.asarray(t2))
+        cars = self.car(ids[:, None], t1.reshape(1, -1), t2.reshape(1, -1))
+        n = np.isfinite(cars).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            caar = np.where(n > 0, np.nansum(cars, axis=0) / n, np.nan)
+        return caar.reshape(t1.shape)
+
+    def table(self, windows, event_ids=None):
+        """events x windows frame of CARs; columns are named 'CAR(t1,t2)'."""
+        ids = self._events(event_ids)
+        t1 = np.array([w[0] for w in windows])
+        t2 = np.array([w[1] for w in windows])
+        cars = self.car(ids[:, None], t1[None, :], t2[None, :])
+        columns = [f'CAR({a:+d},{b:+d})' for a, b in windows]
+        return pd.DataFrame(cars, index=pd.Index(ids, name='event'), columns=columns)
+
+    def caar_table(self, windows, event_ids=None):
+        """CAAR, number of events and t-statistic (cross-sectional) for every window."""
+        cars = self.table(windows, event_ids)
+        n = cars.count()
+        mean = cars.mean()
+        std = cars.std(ddof=1)
+        return pd.DataFrame({'CAAR': mean, 'N': n, 't': mean / (std / np.sqrt(n))})
@@ -0,0 +1,405 @@
+"""
+Concurrent, resumable downloader for ZSE security price histories.
+
+Replaces the serial loop in historical-data-script.py: a bounded thread pool
+shares one pooled requests.Session, every request has a timeout and is retried
+with exponential backoff, responses are checked to really be xlsx files and
+are written atomically into stocks_raw_data/. A manifest records every
+finished download so an interrupted run resumes where it stopped.
+
+Sync mode keeps a high-water mark (last stored trading date) per ISIN in the
+same manifest and asks the endpoint only for the missing date range, appends
+those rows to the stored history and records the touched tickers in
+dirty.json so downstream stages rebuild only those.
+
+Usage:
+    python scripts/downloader.py [--workers 8] [--end 2025-10-27] [--force]
+    python scripts/downloader.py --sync [--end 2025-11-03]         # daily delta refresh
+    python scripts/downloader.py --base-url http://127.0.0.1:8000   # local stand-in server
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+
+# --- Configuration ---
+INPUT_FILE = os.path.join(ROOT_DIR, 'txt', 'ticker-isin.txt')
+OUTPUT_DIR = os.path.join(ROOT_DIR, 'stocks_raw_data')
+MANIFEST_NAME = 'manifest.json'
+DIRTY_NAME = 'dirty.json'        # tickers changed since downstream last rebuilt them
+BASE_URL = 'https://rest.zse.hr/web/Bvt9fe2peQ7pwpyYqODM'
+START_DATE = '2010-01-01'
+END_DATE = '2025-10-27'
+
+MAX_WORKERS = 8          # size of the worker pool (and of the connection pool)
+TIMEOUT = 30             # seconds per request
+MAX_RETRIES = 4          # attempts after the first one
+BACKOFF_SECONDS = 0.5    # sleep = BACKOFF_SECONDS * 2**attempt
+RETRY_STATUS = {429, 500, 502, 503, 504}
+XLSX_MAGIC = b'PK\x03\x04'   # xlsx files are zip archives
+
+
+class DownloadError(Exception):
+    """Raised when a security history cannot be fetched after all retries."""
+
+
+def read_ticker_isin(path=INPUT_FILE):
+    """Reads the 'TICKER,ISIN' lines into a list of (ticker, isin) tuples."""
+    pairs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            ticker, isin = line.split(',')
+            pairs.append((ticker.strip(), isin.strip()))
+    return pairs
+
+
+def history_url(isin, start_date, end_date, base_url=BASE_URL):
+    """Builds the security-history xlsx URL for one ISIN and date range."""
+    return f'{base_url.rstrip("/")}/security-history/XZAG/{isin}/{start_date}/{end_date}/xlsx'
+
+
+def raw_file_name(ticker, isin):
+    """File name used in stocks_raw_data/, e.g. VLEN-R-A_HRVLENRB0001.xlsx."""
+    return f'{ticker}_{isin}.xlsx'
+
+
+def make_session(pool_size=MAX_WORKERS):
+    """One session whose connection pool is large enough for every worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def atomic_write(path, content):
+    """Writes bytes to a temp file in the target directory and renames it over path."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.', suffix='.part', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_manifest(path):
+    """Returns the manifest dict ({file name: entry}), empty if it does not exist yet."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(path, manifest):
+    atomic_write(path, json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+
+
+def load_dirty(output_dir=OUTPUT_DIR):
+    """Returns the sorted list of tickers whose raw history changed since the last pop_dirty()."""
+    path = os.path.join(output_dir, DIRTY_NAME)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def mark_dirty(tickers, output_dir=OUTPUT_DIR):
+    """Adds tickers to the invalidation list consumed by downstream stages."""
+    dirty = set(load_dirty(output_dir)) | set(tickers)
+    atomic_write(os.path.join(output_dir, DIRTY_NAME), json.dumps(sorted(dirty), indent=2).encode('utf-8'))
+
+
+def pop_dirty(output_dir=OUTPUT_DIR):
+    """Returns and clears the invalidation list (call after the downstream rebuild succeeded)."""
+    dirty = load_dirty(output_dir)
+    path = os.path.join(output_dir, DIRTY_NAME)
+    if os.path.exists(path):
+        os.remove(path)
+    return dirty
+
+
+def fetch_xlsx(session, url, timeout=TIMEOUT, max_retries=MAX_RETRIES, backoff=BACKOFF_SECONDS):
+    """
+    GETs url and returns the response body, retrying transient failures.
+    Connection errors, timeouts, 429/5xx answers and bodies that are not xlsx
+    are retried with exponential backoff; other HTTP errors fail immediately.
+    """
+    last_error = None
+    for attempt in range(max_retries + 1):
+        if attempt:
+            time.sleep(backoff * 2 ** (attempt - 1))
+        try:
+            resp = session.get(url, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            last_error = e
+            continue
+        if resp.status_code in RETRY_STATUS:
+            last_error = DownloadError(f'HTTP {resp.status_code}')
+            continue
+        if resp.status_code != 200:
+            raise DownloadError(f'HTTP {resp.status_code} for {url}')
+        if not resp.content.startswith(XLSX_MAGIC):
+            last_error = DownloadError(f'response is not an xlsx file ({len(resp.content)} bytes)')
+            continue
+        return resp.content
+    raise DownloadError(f'giving up on {url} after {max_retries + 1} attempts: {last_error}')
+
+
+def read_history(content_or_path):
+    """Parses a ZSE security-history xlsx (bytes or path) into (DataFrame, sheet name)."""
+    src = io.BytesIO(content_or_path) if isinstance(content_or_path, bytes) else content_or_path
+    with pd.ExcelFile(src) as xls:
+        sheet = xls.sheet_names[0]
+        df = xls.parse(sheet)
+    df.columns = [str(c).strip() for c in df.columns]
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    return df, sheet
+
+
+def write_history(df, sheet, path):
+    """Writes a history frame back in the ZSE layout (newest first) with an atomic rename."""
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name=sheet, index=False)
+    content = buf.getvalue()
+    atomic_write(path, content)
+    return content
+
+
+def day_digest(frame, day):
+    """
+    Content hash of the rows of one day (the high-water day of a sync). Numbers
+    are hashed as floats: a one-day delta parses 13.0 as an integer column.
+    """
+    rows = frame[frame['Date'] == day].reset_index(drop=True)
+    rows = rows.astype({c: float for c in rows.columns if pd.api.types.is_numeric_dtype(rows[c])})
+    return hashlib.sha256(pd.util.hash_pandas_object(rows, index=False).values.tobytes()).hexdigest()
+
+
+def merge_delta(stored, delta, high_water):
+    """
+    Appends the delta rows to the stored history.
+    The high-water day itself is re-requested and replaced, so a day that was
+    stored while trading was still in progress is completed on the next sync.
+    """
+    stored = stored[stored['Date'] < high_water]
+    delta = delta[delta['Date'] >= high_water]
+    merged = pd.concat([delta, stored], ignore_index=True)
+    # stable sort keeps the intra-day row order ZSE uses
+    return merged.sort_values('Date', ascending=False, kind='mergesort').reset_index(drop=True)
+
+
+def download_all(pairs=None, output_dir=OUTPUT_DIR, start_date=START_DATE, end_date=END_DATE,
+                 base_url=BASE_URL, workers=MAX_WORKERS, force=False, session=None):
+    """
+    Downloads the history of every (ticker, isin) pair into output_dir.
+
+    Pairs already recorded in the manifest with the same start and an end (or
+    synced last_date) on or after end_date, whose file is still on disk, are
+    skipped unless force=True. Rewritten tickers are added to dirty.json.
+    Returns a dict with the lists of 'downloaded', 'skipped' and 'failed' file
+    names.
+    """
+    if pairs is None:
+        pairs = read_ticker_isin()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    lock = threading.Lock()
+    result = {'downloaded': [], 'skipped': [], 'failed': []}
+
+    todo = []
+    for ticker, isin in pairs:
+        name = raw_file_name(ticker, isin)
+        entry = manifest.get(name)
+        # a synced file (last_date) already reaches past the requested end
+        covered = entry is not None and max(entry.get('end', ''), entry.get('last_date', '')) >= end_date
+        done = (covered and entry.get('start') == start_date and os.path.exists(os.path.join(output_dir, name)))
+        if done and not force:
+            result['skipped'].append(name)
+        else:
+            todo.append((ticker, isin, name))
+
+    own_session = session is None
+    if own_session:
+        session = make_session(workers)
+
+    def worker(ticker, isin, name):
+        content = fetch_xlsx(session, history_url(isin, start_date, end_date, base_url))
+        atomic_write(os.path.join(output_dir, name), content)
+        entry = {
+            'ticker': ticker,
+            'isin': isin,
+            'start': start_date,
+            'end': end_date,
+            'bytes': len(content),
+            'sha256': hashlib.sha256(content).hexdigest(),
+        }
+        # the manifest is rewritten after every file so a crash loses at most the in-flight ones
+        with lock:
+            manifest[name] = entry
+            save_manifest(manifest_path, manifest)
+        return name
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(worker, *item): item for item in todo}
+            for future in as_completed(futures):
+                ticker, isin, name = futures[future]
+                try:
+                    future.result()
+                    result['downloaded'].append(name)
+                    print(f'[OK] {ticker} ({isin})')
+                except Exception as e:
+                    result['failed'].append(name)
+                    print(f'[FAIL] {ticker} ({isin}): {e}')
+    finally:
+        if own_session:
+            session.close()
+
+    if result['downloaded']:
+        mark_dirty([manifest[n]['ticker'] for n in result['downloaded']], output_dir)
+    print(f"Downloaded {len(result['downloaded'])}, skipped {len(result['skipped'])}, "
+          f"failed {len(result['failed'])}.")
+    return result
+
+
+def sync_all(pairs=None, output_dir=OUTPUT_DIR, end_date=None, base_url=BASE_URL,
+             workers=MAX_WORKERS, session=None):
+    """
+    Brings every stored history up to end_date (default: today) by requesting
+    only [high-water mark, end_date] per ISIN. A file changes when the delta
+    has later days or the high-water day's rows differ from the stored ones
+    (hashed in the manifest as last_day_sha256). ISINs without a stored file
+    get a full download. Changed tickers are added to dirty.json. Returns a dict
+    with the lists of 'updated', 'unchanged' and 'failed' file names.
+    """
+    if pairs is None:
+        pairs = read_ticker_isin()
+    if end_date is None:
+        end_date = date.today().isoformat()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+
+    missing = [(t, i) for t, i in pairs if not os.path.exists(os.path.join(output_dir, raw_file_name(t, i)))]
+    if missing:
+        download_all(missing, output_dir, START_DATE, end_date, base_url, workers, force=True, session=session)
+        manifest = load_manifest(manifest_path)
+    present = [p for p in pairs if p not in missing]
+
+    lock = threading.Lock()
+    result = {'updated': [], 'unchanged': [], 'failed': []}
+    own_session = session is None
+    if own_session:
+        session = make_session(workers)
+
+    def worker(ticker, isin):
+        name = raw_file_name(ticker, isin)
+        path = os.path.join(output_dir, name)
+        entry = manifest.get(name, {})
+        stored = None
+        high_water = entry.get('last_date')
+        if high_water is None:
+            # first sync of a file downloaded before high-water marks existed
+            stored, sheet = read_history(path)
+            high_water = stored['Date'].max().date().isoformat()
+        if high_water > end_date:
+            return name, False
+        content = fetch_xlsx(session, history_url(isin, high_water, end_date, base_url))
+        delta, _ = read_history(content)
+        day = pd.Timestamp(high_water)
+        known_day = entry.get('last_day_sha256') if entry.get('last_date') == high_water else None
+        if known_day is None:
+            if stored is None:
+                stored, sheet = read_history(path)
+            known_day = day_digest(stored, day)
+        # new days, or the high-water day itself changed (stored while trading was still in progress)
+        changed = bool((delta['Date'] > day).any()) or day_digest(delta, day) != known_day
+        if changed:
+            if stored is None:
+                stored, sheet = read_history(path)
+            merged = merge_delta(stored, delta, day)
+            content = write_history(merged, sheet, path)
+            last_date = merged['Date'].max()
+            # hashed as parsed from the endpoint, so the next sync compares like with like
+            source = delta if (delta['Date'] == last_date).any() else merged
+            entry = dict(entry, bytes=len(content), sha256=hashlib.sha256(content).hexdigest(),
+                         last_date=last_date.date().isoformat(), last_day_sha256=day_digest(source, last_date))
+        else:
+            entry = dict(entry, last_date=high_water, last_day_sha256=known_day)
+        # 'end' stays the range of the last full download; how far the file reaches is last_date
+        entry.update(ticker=ticker, isin=isin, start=entry.get('start', START_DATE))
+        with lock:
+            manifest[name] = entry
+            save_manifest(manifest_path, manifest)
+        return name, changed
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(worker, t, i): (t, i) for t, i in present}
+            for future in as_completed(futures):
+                ticker, isin = futures[future]
+                try:
+                    name, changed = future.result()
+                    result['updated' if changed else 'unchanged'].append(name)
+                    if changed:
+                        print(f'[SYNC] {ticker} ({isin})')
+                except Exception as e:
+                    result['failed'].append(raw_file_name(ticker, isin))
+                    print(f'[FAIL] {ticker} ({isin}): {e}')
+    finally:
+        if own_session:
+            session.close()
+
+    if result['updated']:
+        mark_dirty([manifest[n]['ticker'] for n in result['updated']], output_dir)
+    print(f"Synced {len(result['updated'])}, unchanged {len(result['unchanged'])}, "
+          f"failed {len(result['failed'])}.")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Download ZSE security histories into stocks_raw_data/.')
+    parser.add_argument('--input', default=INPUT_FILE, help='TICKER,ISIN list')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--base-url', default=BASE_URL)
+    parser.add_argument('--start', default=START_DATE)
+    parser.add_argument('--end', default=None, help=f'default: {END_DATE}, or today with --sync')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--force', action='store_true', help='ignore the manifest and download everything')
+    parser.add_argument('--sync', action='store_true', help='fetch only the days after each high-water mark')
+    args = parser.parse_args(argv)
+
+    if args.sync:
+        result = sync_all(read_ticker_isin(args.input), args.output_dir, args.end, args.base_url, args.workers)
+        return 1 if result['failed'] else 0
+    result = download_all(read_ticker_isin(args.input), args.output_dir, args.start, args.end or END_DATE,
+                          args.base_url, args.workers, args.force)
+    return 1 if result['failed'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
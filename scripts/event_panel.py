@@ -0,0 +1,165 @@
+"""
+Dense event-time panel: events x day offsets in one float array.
+
+Replaces the list-of-DataFrames pattern (one small frame per event, then
+pd.concat + groupby("DayOffset") in car-testing.py, pd.concat(axis=1) in the
+CAR scripts). An EventPanel holds
+
+    values   float64 (n_events, n_offsets)
+    valid    bool    (n_events, n_offsets), False (and NaN) outside an event's window
+    offsets  int     day offsets, e.g. -10 .. +10
+    events   compact metadata frame: symbol_id, Symbol (categorical),
+             EventDate, EventDateActual, Group (categorical), ...
+    dates    datetime64[D] (n_events, n_offsets) date of every cell, NaT
+             outside an event's window (None if the source had no dates)
+
+so AAR / CAAR / std / count are column reductions over the mask and selecting
+e.g. only the inserted stocks is one boolean index. Windows truncated at the
+start or end of a ticker's history (the old max(event_idx - window, 0)) are
+just invalid cells; no per-event objects are built.
+"""
+import numpy as np
+import pandas as pd
+
+from market_model import gather
+
+
+class EventPanel:
+
+    def __init__(self, values, valid, offsets, events, dates=None):
+        self.values = np.asarray(values, dtype=float)
+        self.valid = np.asarray(valid, dtype=bool)
+        self.offsets = np.asarray(offsets)
+        self.events = events.reset_index(drop=True)
+        self.dates = None if dates is None else np.asarray(dates, dtype='datetime64[D]')
+        if self.values.shape != self.valid.shape or self.values.shape != (len(self.events), len(self.offsets)):
+            raise ValueError(f"Inconsistent panel: values {self.values.shape}, valid {self.valid.shape}, "
+                             f"{len(self.events)} events x {len(self.offsets)} offsets")
+        if self.dates is not None and self.dates.shape != self.values.shape:
+            raise ValueError(f"Inconsistent panel: dates {self.dates.shape}, values {self.values.shape}")
+
+    # --- Construction ---
+    @staticmethod
+    def compact_events(events, symbol_col='Symbol', type_col='Group'):
+        """Categorical symbol / event type columns and an integer symbol_id."""
+        events = events.reset_index(drop=True).copy()
+        events[symbol_col] = events[symbol_col].astype('category')
+        events.insert(0, 'symbol_id', events[symbol_col].cat.codes.astype(np.int32))
+        if type_col in events.columns:
+            events[type_col] = events[type_col].astype('category')
+        return events
+
+    @classmethod
+    def from_ar(cls, ar, pre, events, status=None):
+        """From an event_study (events x (pre + post + 1)) abnormal-return array."""
+        ar = np.asarray(ar, dtype=float)
+        valid = np.isfinite(ar)
+        if status is not None:
+            valid &= (np.asarray(status) == 'ok')[:, None]
+        offsets = np.arange(-pre, ar.shape[1] - pre)
+        return cls(np.where(valid, ar, np.nan), valid, offsets, cls.compact_events(events))
+
+    @classmethod
+    def from_series(cls, series, events, pre, post, symbol_col='Symbol', date_col='EventDateActual'):
+        """
+        Gathers [-pre, +post] rows around every event from per-symbol series.
+
+        series: {symbol: (dates, values)} with sorted datetime64 dates. Day 0 is
+        the row whose date equals the event's date_col; events whose date is not
+        in their series get an all-invalid row. Rows before the start or after
+        the end of a series are invalid (truncated windows). The panel keeps
+        the date of every valid cell.
+        """
+        events = events.reset_index(drop=True)
+        names = list(series)
+        ids = {name: i for i, name in enumerate(names)}
+        lengths = np.array([len(series[n][0]) for n in names], dtype=np.int64)
+        starts = np.concatenate([[0], np.cumsum(lengths)])
+        flat_dates = (np.concatenate([np.asarray(series[n][0], dtype='datetime64[ns]') for n in names])
+                      if names else np.array([], dtype='datetime64[ns]'))
+        flat_values = (np.concatenate([np.asarray(series[n][1], dtype=float) for n in names])
+                       if names else np.array([], dtype=float))
+
+        sid = np.array([ids.get(s, -1) for s in events[symbol_col]], dtype=np.int64)
+        known = sid >= 0
+        base = np.append(starts[:-1], 0)[sid]
+        length = np.append(lengths, 0)[sid]
+        # (symbol id, day) composite key: every event located with one searchsorted
+        scale = np.int64(1 << 32)
+        flat_keys = np.repeat(np.arange(len(names), dtype=np.int64), lengths) * scale + \
+            flat_dates.astype('datetime64[D]').astype(np.int64)
+        day0 = pd.DatetimeIndex(events[date_col]).values.astype('datetime64[D]')
+        event_keys = np.maximum(sid, 0) * scale + day0.astype(np.int64)
+        loc = np.searchsorted(flat_keys, event_keys) - base
+        found = known & ~np.isnat(day0) & (loc < length)
+        found[found] = flat_dates[(base + loc)[found]].astype('datetime64[D]') == day0[found]
+
+        offsets = np.arange(-pre, post + 1)
+        local = loc[:, None] + offsets
+        valid = found[:, None] & (local >= 0) & (local < length[:, None])
+        values = gather(flat_values, base[:, None] + local, valid)
+        days = flat_dates.astype('datetime64[D]')
+        dates = np.where(valid, days[np.where(valid, base[:, None] + local, 0)] if len(days) else
+                         np.datetime64('NaT', 'D'), np.datetime64('NaT', 'D'))
+        return cls(values, valid, offsets, cls.compact_events(events, symbol_col), dates)
+
+    # --- Selection ---
+    def __len__(self):
+        return len(self.events)
+
+    def select(self, mask):
+        """Sub-panel of the events where mask (bool array or index array) holds."""
+        mask = np.asarray(mask)
+        return EventPanel(self.values[mask], self.valid[mask], self.offsets, self.events.iloc[mask],
+                          None if self.dates is None else self.dates[mask])
+
+    def window(self, t1, t2):
+        """Sub-panel of the offsets t1 .. t2."""
+        cols = (self.offsets >= t1) & (self.offsets <= t2)
+        return EventPanel(self.values[:, cols], self.valid[:, cols], self.offsets[cols], self.events,
+                          None if self.dates is None else self.dates[:, cols])
+
+    def with_values(self, values):
+        return EventPanel(values, self.valid, self.offsets, self.events, self.dates)
+
+    # --- Per-event transforms ---
+    def cumsum(self):
+        """Per-event running sum over the valid cells (the CAR of an AR panel)."""
+        return self.with_values(np.cumsum(np.where(self.valid, self.values, 0.0), axis=1))
+
+    def last(self):
+        """Each event's value at its last valid offset (NaN if it has none)."""
+        has_any = self.valid.any(axis=1)
+        last_col = self.valid.shape[1] - 1 - np.argmax(self.valid[:, ::-1], axis=1)
+        return np.where(has_any, self.values[np.arange(len(self)), last_col], np.nan)
+
+    def at(self, offset):
+        """Each event's value at one offset (NaN where invalid)."""
+        col = int(np.flatnonzero(self.offsets == offset)[0])
+        return np.where(self.valid[:, col], self.values[:, col], np.nan)
+
+    # --- Cross-sectional reductions (per offset) ---
+    def count(self):
+        return self.valid.sum(axis=0)
+
+    def mean(self):
+        n = self.count()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(n > 0, np.where(self.valid, self.values, 0.0).sum(axis=0) / n, np.nan)
+
+    def std(self, ddof=1):
+        n = self.count()
+        dev = np.where(self.valid, self.values - self.mean(), 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(n > ddof, np.sqrt((dev * dev).sum(axis=0) / (n - ddof)), np.nan)
+
+    def aar(self):
+        return self.mean()
+
+    def caar(self):
+        return np.nancumsum(self.aar())
+
+    def summary(self):
+        """Per offset: AAR, CAAR, cross-sectional std of AR and event count."""
+        return pd.DataFrame({'aar': self.aar(), 'caar': self.caar(), 'std': self.std(), 'count': self.count()},
+                            index=pd.Index(self.offsets, name='Event Day'))
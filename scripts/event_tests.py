@@ -0,0 +1,303 @@
+"""
+Vectorized significance tests for the event study.
+
+All statistics are computed for every event-window day and for any number of
+CAR windows at once, from the (events x days) abnormal returns and the
+(events x estimation days) estimation residuals; nothing loops over events.
+
+    patell_z   Patell (1976) standardized-AR test; the market model's
+               prediction-error correction is applied when the fit has it
+    bmp_t      Boehmer, Musumeci and Poulsen (1991) standardized cross-sectional
+               test (robust to event-induced variance)
+    rank_t     Corrado (1989) rank test in the Corrado-Zivney (1992) form,
+               ranks over the estimation plus event window of every event;
+               multi-day windows as in Cowan (1992)
+    gsign_z    Cowan (1992) generalized sign test; the expected share of
+               positive returns is taken from the estimation windows
+
+CROBEX revisions put several stocks on the same event date, so their
+abnormal returns are cross-correlated and the tests above overstate
+significance. clustered_tests() adds
+
+    kp_t        Kolari-Pynnoenen (2010) adjusted BMP: bmp_t scaled by
+                sqrt((1 - r) / (1 + (N - 1) r)), where r is the mean
+                estimation-residual correlation over all event pairs and
+                pairs on different event dates count as uncorrelated
+    port_t      portfolio-by-date aggregation: one equal-weighted portfolio
+    port_bmp_t  per event date, tested across portfolios (raw and
+                standardized by each portfolio's estimation-window residuals)
+
+The residual correlation matrix of every date cluster is computed once, on
+the calendar-aligned estimation residuals with blocked matrix products, and
+cached on the fit, so selections and every post window of a sweep reuse it.
+
+Usage:
+    windows = market_model.event_windows(events, stock_index, market_returns)
+    fit = market_model.MODELS['market'](windows)
+    tests = EventTests.from_fit(windows, fit)
+    tests.day_tests()
+    tests.window_tests([(-1, 1), (-5, 5), (0, 10)])
+    tests.select(events['Group'] == 'inserted').window_tests([(-10, 10)])
+    tests.clustered_tests([(-1, 1), (-10, 10)])
+"""
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+STATISTICS = ('patell_z', 'bmp_t', 'rank_t', 'gsign_z')
+CLUSTERED_STATISTICS = ('kp_t', 'port_t', 'port_bmp_t')
+
+
+class EventTests:
+    """
+    est_resid  (n_events, est_days) estimation-window residuals
+    ar         (n_events, n_offsets) event-window abnormal returns
+    sigma      (n_events,) residual standard deviation of the estimation window
+    correction (n_events, n_offsets) prediction-error variance factor (1 if unknown)
+    ok         (n_events,) events that enter the tests
+    est_days   (n_events, est_days) calendar day numbers of est_resid (NaN if missing)
+    cluster    (n_events,) event-date cluster code, -1 if unknown
+    ids        (n_events,) row of each event in the original fit
+    corr_cache per-cluster residual correlations, shared by selections
+    """
+
+    def __init__(self, est_resid, ar, offsets, sigma, correction, ok, est_days=None, cluster=None,
+                 ids=None, corr_cache=None):
+        self.est_resid = np.asarray(est_resid, dtype=float)
+        self.ar = np.asarray(ar, dtype=float)
+        self.offsets = np.asarray(offsets)
+        self.sigma = np.asarray(sigma, dtype=float)
+        self.correction = np.asarray(correction, dtype=float)
+        self.ok = np.asarray(ok, dtype=bool)
+        n = len(self.ok)
+        self.est_days = np.full(self.est_resid.shape, np.nan) if est_days is None else np.asarray(est_days, dtype=float)
+        self.cluster = np.full(n, -1, dtype=np.int64) if cluster is None else np.asarray(cluster, dtype=np.int64)
+        self.ids = np.arange(n) if ids is None else np.asarray(ids)
+        self.corr_cache = {} if corr_cache is None else corr_cache
+        # the first EventTests on a cache is the full set every selection indexes into
+        self.corr_cache.setdefault('root', (self.est_resid, self.est_days, self.cluster))
+
+    @classmethod
+    def from_fit(cls, windows, fit, post=None):
+        """From market_model EventWindows and a model kernel's fit (see market_model.score)."""
+        post = windows.post if post is None else post
+        width = windows.pre + post + 1
+        ok = windows.in_range_for(post) & fit['valid']
+        est_resid = windows.stock('est') - fit['expected']['est']
+        ar = windows.stock('ev')[:, :width] - fit['expected']['ev'][:, :width]
+        n_est = np.isfinite(est_resid).sum(axis=1)
+        correction = np.ones_like(ar)
+        if 'sxx' in fit:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                correction = (1 + 1 / n_est[:, None]
+                              + (windows.market('ev')[:, :width] - fit['x_mean'][:, None]) ** 2 / fit['sxx'][:, None])
+        day0 = windows.event_dates().astype('datetime64[D]')
+        cluster = np.where(np.isnat(day0), -1, day0.astype(np.int64))
+        # the correlations depend only on the estimation window, so they live on the fit
+        return cls(est_resid, ar, np.arange(-windows.pre, post + 1), np.sqrt(fit['sigma2']), correction, ok,
+                   windows.days('est'), cluster, corr_cache=fit.setdefault('corr_cache', {}))
+
+    def select(self, mask):
+        """Tests restricted to a subset of the events (bool mask or index array)."""
+        mask = np.asarray(mask)
+        return EventTests(self.est_resid[mask], self.ar[mask], self.offsets, self.sigma[mask],
+                          self.correction[mask], self.ok[mask], self.est_days[mask], self.cluster[mask],
+                          self.ids[mask], self.corr_cache)
+
+    # --- Building blocks ---
+    def _rows(self):
+        return np.flatnonzero(self.ok)
+
+    def _sar(self):
+        rows = self._rows()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.ar[rows] / (self.sigma[rows, None] * np.sqrt(self.correction[rows]))
+
+    def _patell_var(self):
+        """Variance (T - 2) / (T - 4) of a standardized AR under the null, per event."""
+        t = np.isfinite(self.est_resid[self._rows()]).sum(axis=1).astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(t > 4, (t - 2) / (t - 4), np.nan)
+
+    def _rank_scores(self):
+        """
+        Corrado-Zivney scores U = rank / (M + 1) - 0.5 over estimation + event
+        window, split back into (estimation, event) parts.
+        """
+        rows = self._rows()
+        combined = np.concatenate([self.est_resid[rows], self.ar[rows]], axis=1)
+        ranks = pd.DataFrame(combined).rank(axis=1).to_numpy()
+        m = np.isfinite(combined).sum(axis=1)
+        scores = ranks / (m[:, None] + 1) - 0.5
+        return scores[:, :self.est_resid.shape[1]], scores[:, self.est_resid.shape[1]:]
+
+    def _windows(self, windows):
+        t1 = np.array([w[0] for w in windows])
+        t2 = np.array([w[1] for w in windows])
+        if (t1 < self.offsets[0]).any() or (t2 > self.offsets[-1]).any() or (t1 > t2).any():
+            raise ValueError(f"Windows must satisfy {self.offsets[0]} <= t1 <= t2 <= {self.offsets[-1]}")
+        return t1 - self.offsets[0], t2 - self.offsets[0] + 1
+
+    @staticmethod
+    def _prefix(values):
+        """Row-wise prefix sums and counts of finite values, with a leading zero column."""
+        finite = np.isfinite(values)
+        total = np.zeros((values.shape[0], values.shape[1] + 1))
+        count = np.zeros((values.shape[0], values.shape[1] + 1), dtype=np.int64)
+        np.cumsum(np.where(finite, values, 0.0), axis=1, out=total[:, 1:])
+        np.cumsum(finite, axis=1, out=count[:, 1:])
+        return total, count
+
+    # --- Statistics ---
+    def _rank_norm(self, est_scores, ev_scores):
+        """
+        Per-day rank sums G_t = sum_i U_it / sqrt(N_t) of the event window and
+        their standard deviation S_U over estimation + event window.
+        """
+        scores = np.concatenate([est_scores, ev_scores], axis=1)
+        n_t = np.isfinite(scores).sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            g = np.where(n_t > 0, np.nansum(scores, axis=0) / np.sqrt(n_t), np.nan)
+        s_u = np.sqrt(np.nanmean(g ** 2)) if np.isfinite(g).any() else np.nan
+        return g[est_scores.shape[1]:], s_u
+
+    def _positive_share(self):
+        """Expected share of positive abnormal returns, from the estimation windows."""
+        est = self.est_resid[self._rows()]
+        n = np.isfinite(est).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = (est > 0).sum(axis=1) / n
+        return np.nanmean(np.where(n > 0, share, np.nan)) if (n > 0).any() else np.nan
+
+    def _table(self, car, csar, rank):
+        """Statistics per column of (events, k) CARs and cumulative standardized ARs."""
+        var_null = self._patell_var()
+        p_hat = self._positive_share()
+        n_car = np.isfinite(car).sum(axis=0)
+        n_sar = np.isfinite(csar).sum(axis=0)
+        positive = (car > 0).sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            caar = np.nansum(car, axis=0) / n_car
+            patell = np.nansum(csar, axis=0) / np.sqrt(np.nansum(np.where(np.isfinite(csar), var_null[:, None], 0.0), axis=0))
+            mean = np.nansum(csar, axis=0) / n_sar
+            std = np.sqrt(np.nansum((csar - mean) ** 2, axis=0) / (n_sar - 1))
+            bmp = mean / (std / np.sqrt(n_sar))
+            gsign = (positive - n_car * p_hat) / np.sqrt(n_car * p_hat * (1 - p_hat))
+        return pd.DataFrame({'N': n_car, 'CAAR': caar, 'patell_z': patell, 'bmp_t': bmp,
+                             'rank_t': rank, 'gsign_z': gsign, 'positive': positive})
+
+    def day_tests(self):
+        """Per event day: N, AAR, patell_z, bmp_t, rank_t, gsign_z, positive."""
+        return self.window_tests([(t, t) for t in self.offsets]).rename(columns={'CAAR': 'AAR'}) \
+            .set_index(pd.Index(self.offsets, name='Event Day'))
+
+    def window_tests(self, windows):
+        """Per CAR window (t1, t2): N, CAAR, patell_z, bmp_t, rank_t, gsign_z, positive."""
+        lo, hi = self._windows(windows)
+        rows = self._rows()
+        ar_sum, ar_count = self._prefix(self.ar[rows])
+        sar_sum, sar_count = self._prefix(self._sar())
+        g, s_u = self._rank_norm(*self._rank_scores())
+        g_sum = np.concatenate([[0.0], np.cumsum(np.nan_to_num(g))])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            n_ar = ar_count[:, hi] - ar_count[:, lo]
+            car = np.where(n_ar > 0, ar_sum[:, hi] - ar_sum[:, lo], np.nan)
+            n_sar = sar_count[:, hi] - sar_count[:, lo]
+            csar = np.where(n_sar > 0, (sar_sum[:, hi] - sar_sum[:, lo]) / np.sqrt(n_sar), np.nan)
+            rank = (g_sum[hi] - g_sum[lo]) / np.sqrt(hi - lo) / s_u
+        table = self._table(car, csar, rank)
+        table.index = pd.Index([f'CAR({a:+d},{b:+d})' for a, b in windows], name='window')
+        return table
+
+    # --- Clustered event dates ---
+    def _cluster_corr(self, code):
+        """
+        (ids, correlation matrix) of the estimation residuals of all events in
+        one cluster, aligned on calendar days with pairwise-complete observations.
+        """
+        if code not in self.corr_cache:
+            resid, days, cluster = self.corr_cache['root']
+            ids = np.flatnonzero(cluster == code)
+            resid, days = resid[ids], days[ids]
+            union = np.unique(days[np.isfinite(days)])
+            x = np.full((len(ids), len(union)), np.nan)
+            finite = np.isfinite(days) & np.isfinite(resid)
+            x[np.nonzero(finite)[0], np.searchsorted(union, days[finite])] = resid[finite]
+            m = np.isfinite(x).astype(float)
+            x = np.nan_to_num(x)
+            n = m @ m.T                 # common days of every pair
+            sx = x @ m.T                # sum of x_i over the days shared with j
+            sxx = (x * x) @ m.T
+            sxy = x @ x.T
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cov = n * sxy - sx * sx.T
+                var = n * sxx - sx * sx
+                corr = cov / np.sqrt(var * var.T)
+            self.corr_cache[code] = (ids, corr)
+        return self.corr_cache[code]
+
+    def _pair_correlation(self, rows):
+        """Sum of r_ij over ordered pairs i != j of the given rows that share a cluster."""
+        total = 0.0
+        codes, counts = np.unique(self.cluster[rows], return_counts=True)
+        for code in codes[(counts > 1) & (codes >= 0)]:
+            members = rows[self.cluster[rows] == code]
+            cluster_ids, corr = self._cluster_corr(code)
+            pos = np.searchsorted(cluster_ids, self.ids[members])
+            sub = corr[np.ix_(pos, pos)]
+            total += np.nansum(sub) - np.nansum(np.diag(sub))
+        return total
+
+    def _group_mean(self, codes, values):
+        """Per-cluster mean of the rows of values (NaN-aware), clusters in np.unique order."""
+        labels, inverse = np.unique(codes, return_inverse=True)
+        finite = np.isfinite(values)
+        sums = np.zeros((len(labels), values.shape[1]))
+        counts = np.zeros((len(labels), values.shape[1]))
+        np.add.at(sums, inverse, np.where(finite, values, 0.0))
+        np.add.at(counts, inverse, finite)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def clustered_tests(self, windows):
+        """
+        Per CAR window: N, clusters, mean residual correlation r, bmp_t, the
+        Kolari-Pynnoenen kp_t, and the portfolio-by-date port_N, port_CAAR,
+        port_t and port_bmp_t.
+        """
+        base = self.window_tests(windows)
+        lo, hi = self._windows(windows)
+        rows = self._rows()
+        standardizable = rows[np.isfinite(self.sigma[rows]) & (self.sigma[rows] > 0)]
+        n = len(standardizable)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r_bar = self._pair_correlation(standardizable) / (n * (n - 1)) if n > 1 else np.nan
+            kp = base['bmp_t'].to_numpy() * np.sqrt((1 - r_bar) / (1 + (n - 1) * r_bar))
+
+        # one equal-weighted portfolio per event date, in event time
+        codes = self.cluster[rows]
+        port_ar = self._group_mean(codes, self.ar[rows])
+        port_resid = self._group_mean(codes, self.est_resid[rows])
+        n_est = np.isfinite(port_resid).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            port_sigma = np.sqrt(np.nansum(port_resid ** 2, axis=1) / (n_est - 2))
+            ar_sum, ar_count = self._prefix(port_ar)
+            sar_sum, sar_count = self._prefix(port_ar / port_sigma[:, None])
+            n_ar = ar_count[:, hi] - ar_count[:, lo]
+            car = np.where(n_ar > 0, ar_sum[:, hi] - ar_sum[:, lo], np.nan)
+            n_sar = sar_count[:, hi] - sar_count[:, lo]
+            csar = np.where(n_sar > 0, (sar_sum[:, hi] - sar_sum[:, lo]) / np.sqrt(n_sar), np.nan)
+
+        def cross_t(values):
+            k = np.isfinite(values).sum(axis=0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean = np.nansum(values, axis=0) / k
+                std = np.sqrt(np.nansum((values - mean) ** 2, axis=0) / (k - 1))
+                return mean, mean / (std / np.sqrt(k))
+
+        port_caar, port_t = cross_t(car)
+        _, port_bmp = cross_t(csar)
+        return pd.DataFrame({'N': base['N'].to_numpy(), 'clusters': len(np.unique(codes)), 'r': r_bar,
+                             'bmp_t': base['bmp_t'].to_numpy(), 'kp_t': kp,
+                             'port_N': np.isfinite(car).sum(axis=0), 'port_CAAR': port_caar,
+                             'port_t': port_t, 'port_bmp_t': port_bmp}, index=base.index)
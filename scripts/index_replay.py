@@ -0,0 +1,205 @@
+"""
+CROBEX replay: rebuilds a CROBEX-like index from its constituents.
+
+Nothing checked the benchmark (the CBX sheet or the XZAG index csv) against
+the stocks we hold, and a freshly added constituent moves the very index it is
+measured against. The replay takes the PricePanel (dates x tickers) and the
+membership mask of membership.MembershipIndex and computes the index as
+matrix operations over the whole history:
+
+    periods     the panel dates are cut at every revision date (interval start
+                or end); a period's constituents and weights are fixed on its
+                first day from data up to the day before
+    weights     'price'    price-weighted (one share of every member)
+                'equal'    equal-weighted
+                'capped'   turnover-weighted (trailing TURNOVER_LOOKBACK days),
+                           every weight capped at CAP with the excess
+                           redistributed (the CROBEX rule)
+    returns     buy-and-hold inside a period: the period value is
+                V_t = sum_i w_i * G_it with G_it the growth of stock i since
+                the period started (one cumsum of log returns for all stocks),
+                and periods are chained at the revision dates
+
+Because V_t is a sum of per-stock contributions, the index without stock j is
+(V_t - w_j G_jt) / (1 - w_j): excluding(tickers) gives every event ticker its
+own "index excluding the event stock" benchmark from the same matrices.
+
+Usage:
+    python scripts/index_replay.py [--method capped] [--cap 0.1] [--lookback 126] [--output replay.csv]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import price_store
+from membership import MembershipIndex
+from price_panel import PricePanel
+from trading_calendar import TradingCalendar, ON_OR_AFTER
+
+# --- Configuration ---
+METHODS = ('price', 'equal', 'capped')
+CAP = 0.10                  # maximum constituent weight of the capped variant
+TURNOVER_LOOKBACK = 126     # trading days of turnover behind the capped weights (~6 months)
+BENCHMARK_TICKER = 'CBX'
+
+
+def cap_weights(weights, cap=CAP):
+    """
+    Rows of non-negative weights normalized to 1 with no weight above cap;
+    the excess is spread over the uncapped names in proportion to their
+    weight. Rows with fewer than 1 / cap names are left uncapped.
+    """
+    weights = np.asarray(weights, dtype=float)
+    total = weights.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = np.where(total > 0, weights / total, 0.0)
+    feasible = ((w > 0).sum(axis=1) * cap >= 1)[:, None]
+    capped = np.zeros(w.shape, dtype=bool)
+    for _ in range(w.shape[1]):
+        over = feasible & ~capped & (w > cap + 1e-12)
+        if not over.any():
+            break
+        capped |= over
+        free = np.where(capped, 0.0, w)
+        room = 1.0 - cap * capped.sum(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            w = np.where(capped, cap, free * room / free.sum(axis=1, keepdims=True))
+        w = np.nan_to_num(w)
+    return w
+
+
+class IndexReplay:
+
+    def __init__(self, dates, symbols, member, prices, turnover, revisions, method='capped', cap=CAP,
+                 lookback=TURNOVER_LOOKBACK):
+        if method not in METHODS:
+            raise ValueError(f"Unknown method '{method}', expected one of {METHODS}")
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.symbols = list(symbols)
+        self.method = method
+        prices = np.asarray(prices, dtype=float)
+        n_dates = len(self.dates)
+
+        # periods: [starts[k], starts[k + 1]) cut at the revision days
+        cuts = TradingCalendar(self.dates).ordinal(revisions, ON_OR_AFTER)
+        self.starts = np.unique(np.concatenate([[0], cuts[cuts > 0]]))
+        self.period = np.searchsorted(self.starts, np.arange(n_dates), side='right') - 1
+        self.ends = np.append(self.starts[1:], n_dates) - 1
+
+        # log growth of every stock, flat where the price is missing
+        with np.errstate(invalid='ignore', divide='ignore'):
+            log_ret = np.log(prices[1:] / prices[:-1])
+        log_ret = np.vstack([np.zeros((1, prices.shape[1])), np.where(np.isfinite(log_ret), log_ret, 0.0)])
+        growth = np.cumsum(log_ret, axis=0)
+
+        # weights fixed on the day before each period starts (day 0 for the first one)
+        info = np.maximum(self.starts - 1, 0)
+        eligible = np.asarray(member)[self.starts] & np.isfinite(prices[info]) & (prices[info] > 0)
+        if method == 'price':
+            raw = np.where(eligible, prices[info], 0.0)
+        elif method == 'equal':
+            raw = eligible.astype(float)
+        else:
+            flow = np.vstack([np.zeros((1, prices.shape[1])), np.cumsum(np.nan_to_num(turnover), axis=0)])
+            trailing = flow[info + 1] - flow[np.maximum(info + 1 - lookback, 0)]
+            raw = np.where(eligible, trailing, 0.0)
+        self.period_weights = cap_weights(raw, cap) if method == 'capped' else cap_weights(raw, 1.0)
+
+        # contribution of every stock to its period's value: w_i * exp(growth since the period's base day)
+        base = growth[info][self.period]
+        self.weights = self.period_weights[self.period]
+        self.contrib = self.weights * np.exp(growth - base)
+        self.value = self.contrib.sum(axis=1)
+
+    @classmethod
+    def from_panel(cls, panel=None, membership=None, method='capped', cap=CAP, lookback=TURNOVER_LOOKBACK):
+        panel = panel or PricePanel()
+        membership = membership or MembershipIndex.from_files()
+        intervals = membership.intervals
+        revisions = pd.concat([intervals['start'], intervals['end']]).dropna().unique()
+        return cls(panel.dates, panel.symbols, membership.panel_mask(panel), panel['last_price'],
+                   panel['turnover'], revisions, method, cap, lookback)
+
+    def _chain(self, value):
+        """Log index levels from (dates, k) period values; periods chained at their last day."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            log_value = np.log(value)
+        period_end = np.nan_to_num(log_value[self.ends], nan=0.0, posinf=0.0, neginf=0.0)
+        offset = np.concatenate([np.zeros_like(period_end[:1]), np.cumsum(period_end, axis=0)[:-1]])
+        return offset[self.period] + log_value
+
+    def _returns(self, log_level):
+        returns = np.full(log_level.shape, np.nan)
+        returns[1:] = log_level[1:] - log_level[:-1]
+        return returns
+
+    def levels(self, base=1000.0):
+        """Index level series starting at base."""
+        log_level = self._chain(self.value)
+        first = np.flatnonzero(np.isfinite(log_level))
+        start = log_level[first[0]] if len(first) else 0.0
+        return pd.Series(base * np.exp(log_level - start), index=pd.DatetimeIndex(self.dates, name='Date'))
+
+    def returns(self):
+        """Daily log returns of the replayed index (a benchmark for market_model)."""
+        return pd.Series(self._returns(self._chain(self.value)), index=pd.DatetimeIndex(self.dates, name='Date'))
+
+    def excluding(self, tickers):
+        """
+        Daily log returns of the index without each ticker, one column per
+        ticker; tickers that are never members get the full index.
+        """
+        cols = [self.symbols.index(t) if t in self.symbols else -1 for t in tickers]
+        known = np.array(cols) >= 0
+        safe = np.where(known, cols, 0)
+        contrib = np.where(known, self.contrib[:, safe], 0.0)
+        weight = np.where(known, self.weights[:, safe], 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            value = (self.value[:, None] - contrib) / (1.0 - weight)
+        return pd.DataFrame(self._returns(self._chain(value)), index=pd.DatetimeIndex(self.dates, name='Date'),
+                            columns=list(tickers))
+
+
+def tracking(replayed, benchmark):
+    """Correlation, tracking error and mean difference of two daily log-return series on common days."""
+    both = pd.concat([replayed.rename('replay'), benchmark.rename('benchmark')], axis=1).dropna()
+    diff = both['replay'] - both['benchmark']
+    return {'days': len(both), 'corr': both['replay'].corr(both['benchmark']),
+            'tracking_error': diff.std(ddof=1) * np.sqrt(252), 'mean_diff': diff.mean()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a CROBEX-like index from its constituents.')
+    parser.add_argument('--method', nargs='+', choices=METHODS, default=list(METHODS))
+    parser.add_argument('--cap', type=float, default=CAP)
+    parser.add_argument('--lookback', type=int, default=TURNOVER_LOOKBACK)
+    parser.add_argument('--output', help='csv with the replayed levels of every method')
+    args = parser.parse_args(argv)
+
+    panel = PricePanel()
+    membership = MembershipIndex.from_files()
+    try:
+        cbx = price_store.load_ticker(BENCHMARK_TICKER, panel.stage, columns=['Date', 'Last Price'])
+        cbx = pd.Series(cbx['Last Price'].to_numpy(dtype=float), index=pd.DatetimeIndex(cbx['Date']).normalize())
+        cbx = np.log(cbx / cbx.shift(1)).dropna()
+    except FileNotFoundError:
+        cbx = None
+
+    levels = {}
+    for method in args.method:
+        replay = IndexReplay.from_panel(panel, membership, method, args.cap, args.lookback)
+        levels[method] = replay.levels()
+        line = f"{method:>8}: {len(replay.starts)} periods, {int((replay.period_weights > 0).sum(axis=1).max())} max members"
+        if cbx is not None:
+            stats = tracking(replay.returns(), cbx)
+            line += (f", vs {BENCHMARK_TICKER}: corr {stats['corr']:.3f}, tracking error {stats['tracking_error']:.3f}"
+                     f" over {stats['days']} days")
+        print(line)
+    if args.output:
+        pd.DataFrame(levels).to_csv(args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
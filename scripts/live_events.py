@@ -0,0 +1,355 @@
+"""
+Incremental daily event study of the CROBEX revisions in flight.
+
+car-testing.py and sweep.py score every event of the event files from
+scratch. The tracker keeps the state of every event in a small JSON file and
+an update only touches the events whose window is still open:
+
+    scheduled   not announced yet (AnnDate, EventDate if there is none, is
+                after the last market day) or its estimation window is not
+                complete yet
+    open        the normal-return model was fitted once over the estimation
+                window (alpha, beta, sigma2 are kept) and every new common
+                trading day of stock and benchmark adds one abnormal return
+                AR = R - (alpha + beta * M) to the running CAR
+    closed      the window [-pre, post] is complete, or the event cannot be
+                scored (no data, estimation window out of range, too few
+                observations, stock no longer trading); frozen for good
+
+Day 0 is the first common trading day on or after the anchor date, as in
+market_model. While day 0 is still ahead (an announced effective date) its
+position is projected with weekday counts and the event is provisional; if
+day 0 turns out to be elsewhere (a holiday), the event is refitted once when
+it arrives. Only models whose normal return is alpha + beta * M_t can be
+extended a day at a time (LIVE_MODELS; Dimson needs tomorrow's market).
+
+Stock rows are read with a Date filter pushed down to the Parquet store, so
+an update reads only the rows after each open event's last day. The new
+(event, day offset) rows of every update go to the live_ar table of the
+results store (results_store.py) with the update's as_of day, replacing the
+rows of the same event and offset (a refitted event re-emits its whole
+path). On the first run every historical event is scored once and closed.
+
+Usage:
+    python scripts/live_events.py update [--watch 3600]
+    python scripts/live_events.py update --reset --model scholes_williams --anchor announcement
+    python scripts/live_events.py status
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import market_model
+import price_store
+import results_store
+import symbols
+import sweep
+from stock_index import StockIndex
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+
+# --- Configuration ---
+STATE_FILE = os.path.join(ROOT_DIR, '.live_events.json')
+STAGE = 'filled'
+BENCHMARK_TICKER = 'CBX'
+LIVE_MODELS = ('mean_adjusted', 'market_adjusted', 'market', 'scholes_williams')
+STALE_SESSIONS = 20         # market sessions without a stock return before an open event is given up
+
+DATE_COL = 'Date'
+PRICE_COL = 'Last Price'
+
+# event phases; closed events also keep a market_model status code (or STALE)
+SCHEDULED = 'scheduled'
+OPEN = 'open'
+CLOSED = 'closed'
+STALE = 'stale'
+
+ROW_COLUMNS = ['as_of', 'Group', 'Symbol', 'EventDate', 'model', 'DayOffset', 'Date', 'AR', 'CAR', 'provisional']
+
+
+def _day(value):
+    """'YYYY-MM-DD' of a date, None for NaT."""
+    return None if pd.isna(value) else str(pd.Timestamp(value).date())
+
+
+def _log_returns(frame, last_price=np.nan):
+    """
+    (dates, log returns, last price) of a Date / price frame continuing from
+    last_price; days without a return are dropped, like in StockIndex.
+    """
+    frame = frame.sort_values(DATE_COL, kind='stable')
+    dates = pd.to_datetime(frame[DATE_COL]).dt.normalize().to_numpy(dtype='datetime64[ns]')
+    prices = np.concatenate([[last_price], pd.to_numeric(frame[PRICE_COL], errors='coerce').to_numpy(dtype=float)])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_ret = np.log(prices[1:] / prices[:-1])
+    keep = ~np.isnan(log_ret)
+    return dates[keep], log_ret[keep], float(prices[-1])
+
+
+def _extend(aligned, days):
+    """Appends days future sessions (NaT / NaN) to a one-ticker AlignedReturns so a projected window fits."""
+    if days > 0:
+        aligned.dates = np.append(aligned.dates, np.full(days, np.datetime64('NaT'), dtype='datetime64[ns]'))
+        aligned.stock = np.append(aligned.stock, np.full(days, np.nan))
+        aligned.market = np.append(aligned.market, np.full(days, np.nan))
+        aligned.lengths = aligned.lengths + days
+
+
+class LiveEventStudy:
+
+    def __init__(self, model='market', anchor='effective', est_days=market_model.ESTIMATION_DAYS,
+                 pre=market_model.EVENT_WINDOW_PRE, post=market_model.EVENT_WINDOW_POST,
+                 gap=market_model.GAP_DAYS, min_obs=market_model.MIN_OBS, stage=STAGE,
+                 benchmark=BENCHMARK_TICKER, store_dir=price_store.STORE_DIR):
+        if model not in LIVE_MODELS:
+            raise ValueError(f"Model '{model}' cannot be updated daily, expected one of {LIVE_MODELS}")
+        if anchor not in sweep.ANCHORS:
+            raise ValueError(f"Unknown anchor '{anchor}', expected one of {sorted(sweep.ANCHORS)}")
+        self.config = {'model': model, 'anchor': anchor, 'est_days': est_days, 'pre': pre, 'post': post,
+                       'gap': gap, 'min_obs': min_obs, 'stage': stage, 'benchmark': benchmark}
+        self.store_dir = store_dir
+        self.events = {}        # key -> event state (JSON-friendly dict)
+        self.as_of = None
+
+    # --- State ---
+    @classmethod
+    def load(cls, path=STATE_FILE, store_dir=price_store.STORE_DIR, **config):
+        """The saved tracker, or a new one with config if there is no state yet."""
+        if not os.path.exists(path):
+            return cls(store_dir=store_dir, **config)
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        study = cls(store_dir=store_dir, **state['config'])
+        study.events = state['events']
+        study.as_of = state['as_of']
+        return study
+
+    def save(self, path=STATE_FILE):
+        tmp_path = path + '.part'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'config': self.config, 'as_of': self.as_of, 'events': self.events}, f, indent=1,
+                      sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def params(self):
+        """The setup besides the model, as the params key of the results store."""
+        return json.dumps({k: v for k, v in self.config.items() if k != 'model'}, sort_keys=True)
+
+    def counts(self):
+        """Number of events per phase / status."""
+        return pd.Series([f"{e['phase']}/{e['status']}" if e['status'] else e['phase']
+                          for e in self.events.values()], dtype=object).value_counts()
+
+    # --- Events ---
+    def sync_events(self):
+        """Adds the events of the event files that are not tracked yet; returns how many."""
+        events = sweep.load_events()
+        anchor_col = sweep.ANCHORS[self.config['anchor']]
+        events = events.dropna(subset=[anchor_col])
+        master = symbols.load_master()
+        available = price_store.list_tickers(self.config['stage'], self.store_dir)
+        added = 0
+        for e in events.itertuples(index=False):
+            symbol = master.sheet(e.Symbol, available) or e.Symbol
+            key = f"{e.Group}:{symbol}:{_day(e.EventDate)}"
+            if key in self.events:
+                continue
+            announced = e.AnnDate if 'AnnDate' in events.columns and not pd.isna(e.AnnDate) else e.EventDate
+            self.events[key] = {
+                'group': e.Group, 'symbol': symbol, 'event_date': _day(e.EventDate),
+                'anchor_date': _day(getattr(e, anchor_col)), 'announced': _day(announced),
+                'phase': SCHEDULED, 'status': None, 'provisional': False, 'day0': None,
+                'alpha': None, 'beta': None, 'sigma2': None, 'n_obs': None,
+                'offset': None, 'car': None, 'last_row': None, 'last_price': None, 'last_session': None}
+            added += 1
+        return added
+
+    def _market(self):
+        frame = price_store.load_ticker(self.config['benchmark'], self.config['stage'],
+                                        columns=[DATE_COL, PRICE_COL], store_dir=self.store_dir)
+        dates, returns, _ = _log_returns(frame)
+        return pd.Series(returns, index=pd.DatetimeIndex(dates, name=DATE_COL))
+
+    def _row(self, event, offset, date, ar):
+        return {'Group': event['group'], 'Symbol': event['symbol'], 'EventDate': event['event_date'],
+                'model': self.config['model'], 'DayOffset': offset, 'Date': _day(date), 'AR': ar,
+                'CAR': event['car'], 'provisional': event['provisional']}
+
+    def _close(self, event, status):
+        event['phase'], event['status'] = CLOSED, status
+        return []
+
+    def _open(self, event, market):
+        """
+        Fits the model of one event once and scores the part of its window that
+        has already traded; stays scheduled while the estimation window is
+        incomplete. Returns the emitted rows.
+        """
+        cfg = self.config
+        pre, post, gap, est_days = cfg['pre'], cfg['post'], cfg['gap'], cfg['est_days']
+        ticker = event['symbol']
+        try:
+            frame = price_store.load_ticker(ticker, cfg['stage'], columns=[DATE_COL, PRICE_COL],
+                                            store_dir=self.store_dir)
+        except FileNotFoundError:
+            return self._close(event, market_model.NO_DATA)
+        aligned = market_model.AlignedReturns(StockIndex.from_frames({ticker: frame}, PRICE_COL), market, [ticker])
+        length = int(aligned.lengths[0])
+        if length == 0:
+            return self._close(event, market_model.NO_DATA)
+        event['last_session'] = _day(aligned.dates[length - 1])
+        anchor = np.datetime64(event['anchor_date'], 'D')
+        ids, loc = aligned.locate([ticker], [event['anchor_date']])
+        loc = int(loc[0])
+        provisional = loc >= length
+        if provisional:
+            # day 0 still ahead: one session per weekday until the anchor date
+            loc = length + int(np.busday_count(aligned.dates[-1].astype('datetime64[D]') + 1, anchor))
+        est_end = loc - pre - gap - 1
+        if est_end - est_days + 1 < 0:
+            return self._close(event, market_model.OUT_OF_RANGE)
+        if est_end + 1 >= length:
+            # Scholes-Williams also needs the market return of the day after the estimation window
+            return []
+
+        _extend(aligned, loc + post + 1 - length)
+        windows = market_model.EventWindows(aligned, ids, np.array([loc]), est_days, pre, post, gap)
+        fit = market_model.MODELS[cfg['model']](windows, cfg['min_obs'])
+        _, ok, ar = market_model.fitted_ar(windows, fit)
+        if not ok[0]:
+            return self._close(event, market_model.FEW_OBS)
+
+        last = min(length - 1 - loc, post)      # last traded day offset (< -pre: window not started)
+        event.update(phase=OPEN, status=None, provisional=provisional,
+                     day0=None if provisional else _day(aligned.dates[loc]),
+                     alpha=float(fit['alpha'][0]), beta=float(fit['beta'][0]), sigma2=float(fit['sigma2'][0]),
+                     n_obs=int(fit['n_obs'][0]), offset=last, car=0.0,
+                     last_row=_day(frame[DATE_COL].max()), last_price=_log_returns(frame)[2])
+        rows = []
+        for offset in range(-pre, last + 1):
+            value = float(ar[0, offset + pre])
+            if np.isfinite(value):
+                event['car'] += value
+            rows.append(self._row(event, offset, aligned.dates[loc + offset], value))
+        if last == post:
+            self._close(event, market_model.OK)
+        return rows
+
+    def _advance(self, event, market):
+        """Adds the abnormal returns of the common trading days after the event's last one."""
+        cfg = self.config
+        new = price_store.load_ticker(event['symbol'], cfg['stage'], columns=[DATE_COL, PRICE_COL],
+                                      store_dir=self.store_dir,
+                                      filters=[(DATE_COL, '>', pd.Timestamp(event['last_row']))])
+        dates, returns, last_price = _log_returns(new, event['last_price'])
+        if len(new):
+            event['last_row'], event['last_price'] = _day(new[DATE_COL].max()), last_price
+        m_dates = market.index.values.astype('datetime64[ns]')
+        m_values = market.to_numpy(dtype=float)
+        _, i_stock, i_market = np.intersect1d(dates, m_dates, return_indices=True)
+
+        anchor = np.datetime64(event['anchor_date'], 'ns')
+        rows = []
+        for i, j in zip(i_stock, i_market):
+            date = dates[i]
+            offset = event['offset'] + 1
+            if event['provisional'] and (date >= anchor or offset >= 0):
+                if date >= anchor and offset == 0:
+                    event['provisional'], event['day0'] = False, _day(date)
+                else:
+                    # the projected day 0 was wrong: refit on the real one
+                    return self._open(event, market)
+            value = float(returns[i] - (event['alpha'] + event['beta'] * m_values[j]))
+            if np.isfinite(value):
+                event['car'] += value
+            event['offset'], event['last_session'] = offset, _day(date)
+            rows.append(self._row(event, offset, date, value))
+            if offset == cfg['post']:
+                self._close(event, market_model.OK)
+                return rows
+        return rows
+
+    # --- Update ---
+    def update(self):
+        """
+        Brings every announced, not yet closed event up to the last market day.
+        Returns a frame of the emitted rows (ROW_COLUMNS).
+        """
+        self.sync_events()
+        market = self._market()
+        as_of = market.index.max()
+        sessions = market.index.values.astype('datetime64[ns]')
+        rows = []
+        for event in self.events.values():
+            if event['phase'] == CLOSED or pd.Timestamp(event['announced']) > as_of:
+                continue
+            rows.extend(self._open(event, market) if event['phase'] == SCHEDULED else self._advance(event, market))
+            if event['phase'] != CLOSED and event['last_session'] is not None:
+                # the stock stopped trading (delisted) before its window closed
+                since = np.datetime64(event['last_session'], 'ns')
+                if len(sessions) - np.searchsorted(sessions, since, side='right') >= STALE_SESSIONS:
+                    self._close(event, STALE)
+        self.as_of = _day(as_of)
+        emitted = pd.DataFrame(rows, columns=ROW_COLUMNS[1:])
+        emitted.insert(0, 'as_of', self.as_of)
+        return emitted
+
+    def open_events(self):
+        """Events in flight: announced, fitted and not closed yet."""
+        rows = [dict(key=key, **e) for key, e in self.events.items() if e['phase'] == OPEN]
+        columns = ['group', 'symbol', 'event_date', 'anchor_date', 'day0', 'provisional', 'offset', 'car',
+                   'alpha', 'beta', 'last_session']
+        return pd.DataFrame(rows, columns=columns)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Incremental daily AR / CAR of the events in flight.')
+    parser.add_argument('--state', default=STATE_FILE)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_update = sub.add_parser('update', help='score the new trading days of the open events')
+    p_update.add_argument('--results', default=results_store.RESULTS_DB)
+    p_update.add_argument('--watch', type=int, help='keep polling every WATCH seconds')
+    p_update.add_argument('--reset', action='store_true', help='start a new state with the options below')
+    p_update.add_argument('--model', choices=LIVE_MODELS, default='market')
+    p_update.add_argument('--anchor', choices=sorted(sweep.ANCHORS), default='effective')
+    p_update.add_argument('--stage', choices=price_store.STAGES, default=STAGE)
+    sub.add_parser('status', help='list the open events of the saved state')
+    args = parser.parse_args(argv)
+
+    if args.command == 'update':
+        if args.reset and os.path.exists(args.state):
+            os.remove(args.state)
+        while True:
+            study = LiveEventStudy.load(args.state, model=args.model, anchor=args.anchor, stage=args.stage)
+            start = time.time()
+            rows = study.update()
+            store = results_store.ResultsStore(args.results)
+            store.save_live(rows, study.params())
+            store.close()
+            study.save(args.state)
+            events = len(rows[['Group', 'Symbol', 'EventDate']].drop_duplicates())
+            print(f"[{pd.Timestamp.now():%Y-%m-%d %H:%M}] as of {study.as_of}: {len(rows)} rows from "
+                  f"{events} events in {time.time() - start:.1f}s, "
+                  f"{len(study.open_events())} open")
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+    else:
+        if not os.path.exists(args.state):
+            print(f"No state in {args.state}; run 'update' first")
+            return 1
+        study = LiveEventStudy.load(args.state)
+        print(f"As of {study.as_of} ({study.config['model']} model, {study.config['anchor']} anchor)")
+        print(study.counts().to_string())
+        table = study.open_events()
+        print(f"\nOpen events:\n{table.to_string(index=False) if len(table) else '(none)'}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,441 @@
+"""
+Vectorized batch event study with pluggable normal-return models.
+
+Instead of building sm.add_constant / sm.OLS(...).fit() once per (ticker,
+event), all estimation windows are gathered into one stacked events x
+ESTIMATION_DAYS array and every alpha/beta is solved in closed form at once:
+
+    beta  = sum((x - x_mean)(y - y_mean)) / sum((x - x_mean)^2)
+    alpha = y_mean - beta * x_mean
+
+Missing observations are masked, events with fewer than MIN_OBS usable
+observations (the old reg_df.shape[0] < 20 rule) are rejected, and abnormal
+returns for all events x event-window days come from a single broadcast.
+The estimates agree with statsmodels OLS to ~1e-12.
+
+The same windows feed every model in MODELS (mean-adjusted, market-adjusted,
+market model, Scholes-Williams and Dimson), so one evaluate() call compares
+several models without re-loading or re-aligning anything. The lag/lead betas
+of Scholes-Williams and Dimson correct for the thin trading of most ZSE stocks.
+"""
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+ESTIMATION_DAYS = 59
+EVENT_WINDOW_PRE = 10
+EVENT_WINDOW_POST = 10
+GAP_DAYS = 1            # trading days between the estimation and the event window
+MIN_OBS = 20
+
+# event status codes
+OK = 'ok'
+NO_DATA = 'no_data'
+OUT_OF_RANGE = 'out_of_range'
+FEW_OBS = 'few_obs'
+
+
+def fit_market_model(Y, X, min_obs=MIN_OBS):
+    """
+    Closed-form OLS of Y on [1, X] for every row of the (n_events, n_days) arrays.
+    NaNs are treated as missing; a row containing +-inf is rejected the way
+    statsmodels would refuse to fit it. Returns a dict of (n_events,) arrays:
+    alpha, beta, sigma2 (residual variance, n - 2 dof), n_obs, valid and the
+    market moments x_mean / sxx used by the prediction-error correction.
+    """
+    Y = np.asarray(Y, dtype=float)
+    X = np.asarray(X, dtype=float)
+    mask = ~(np.isnan(Y) | np.isnan(X))
+    has_inf = (np.isinf(Y) | np.isinf(X)).any(axis=1)
+    mask &= ~(np.isinf(Y) | np.isinf(X))
+    n = mask.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = np.where(mask, X, 0.0).sum(axis=1) / n
+        y_mean = np.where(mask, Y, 0.0).sum(axis=1) / n
+        dx = np.where(mask, X - x_mean[:, None], 0.0)
+        dy = np.where(mask, Y - y_mean[:, None], 0.0)
+        sxx = (dx * dx).sum(axis=1)
+        beta = (dx * dy).sum(axis=1) / sxx
+        alpha = y_mean - beta * x_mean
+        resid = np.where(mask, dy - beta[:, None] * dx, 0.0)
+        sigma2 = (resid * resid).sum(axis=1) / (n - 2)
+
+    valid = (n >= max(min_obs, 3)) & (sxx > 0) & ~has_inf
+    alpha = np.where(valid, alpha, np.nan)
+    beta = np.where(valid, beta, np.nan)
+    sigma2 = np.where(valid, sigma2, np.nan)
+    return {'alpha': alpha, 'beta': beta, 'sigma2': sigma2, 'n_obs': n, 'valid': valid,
+            'x_mean': x_mean, 'sxx': sxx}
+
+
+def abnormal_returns(R, M, alpha, beta):
+    """AR = R - (alpha + beta * M) for all events x days in one broadcast."""
+    return np.asarray(R, dtype=float) - (alpha[:, None] + beta[:, None] * np.asarray(M, dtype=float))
+
+
+def gather(values, rows, valid):
+    """values[rows] with NaN wherever valid is False (rows may point anywhere there)."""
+    safe_rows = np.where(valid, rows, 0)
+    out = values[safe_rows] if len(values) else np.full(rows.shape, np.nan)
+    return np.where(valid, out, np.nan)
+
+
+class AlignedReturns:
+    """
+    Stock and market log returns on their common trading days, for many tickers,
+    concatenated into flat arrays grouped by ticker (see stock_index.StockIndex).
+
+    market_returns is one Date-indexed Series shared by every ticker, or a
+    DataFrame with one column per ticker (a per-stock benchmark such as the
+    replayed index excluding that stock); tickers without a column are dropped.
+    """
+
+    def __init__(self, stock_index, market_returns, tickers):
+        per_ticker = isinstance(market_returns, pd.DataFrame)
+        if not per_ticker:
+            shared = self._sorted(market_returns)
+
+        self.tickers = [t for t in dict.fromkeys(tickers)
+                        if t in stock_index and (not per_ticker or t in market_returns.columns)]
+        self.ticker_id = {t: i for i, t in enumerate(self.tickers)}
+        starts, lengths = [], []
+        d_parts, s_parts, m_parts = [], [], []
+        pos = 0
+        for t in self.tickers:
+            m_dates, m_values = self._sorted(market_returns[t]) if per_ticker else shared
+            dates, rets = stock_index.slice(t)
+            _, i_stock, i_market = np.intersect1d(dates, m_dates, assume_unique=True, return_indices=True)
+            d_parts.append(dates[i_stock])
+            s_parts.append(rets[i_stock])
+            m_parts.append(m_values[i_market])
+            starts.append(pos)
+            lengths.append(len(i_stock))
+            pos += len(i_stock)
+        self.starts = np.array(starts, dtype=np.int64)
+        self.lengths = np.array(lengths, dtype=np.int64)
+        self.dates = np.concatenate(d_parts) if d_parts else np.array([], dtype='datetime64[ns]')
+        self.stock = np.concatenate(s_parts) if s_parts else np.array([], dtype=float)
+        self.market = np.concatenate(m_parts) if m_parts else np.array([], dtype=float)
+        # (ticker id, day) composite key, sorted, so every event is located with one searchsorted
+        days = self.dates.astype('datetime64[D]').astype(np.int64)
+        ids = np.repeat(np.arange(len(self.tickers), dtype=np.int64), self.lengths)
+        self._key_scale = np.int64(1 << 32)
+        self._keys = ids * self._key_scale + days
+
+    @staticmethod
+    def _sorted(market_returns):
+        market_returns = market_returns.dropna()
+        m_dates = pd.DatetimeIndex(market_returns.index).normalize().values.astype('datetime64[ns]')
+        m_values = market_returns.to_numpy(dtype=float)
+        order = np.argsort(m_dates, kind='stable')
+        return m_dates[order], m_values[order]
+
+    def locate(self, tickers, event_dates):
+        """
+        For every (ticker, date): ticker id and position of the first common
+        trading day on or after the date (== length if there is none); id -1
+        for tickers without data.
+        """
+        ids = np.array([self.ticker_id.get(t, -1) for t in tickers], dtype=np.int64)
+        return ids, self.locate_ids(ids, event_dates)
+
+    def locate_ids(self, ids, event_dates):
+        """locate() for ticker ids that are already resolved (e.g. repeated placebo draws)."""
+        days = pd.DatetimeIndex(event_dates).values.astype('datetime64[D]').astype(np.int64)
+        keys = np.maximum(ids, 0) * self._key_scale + days
+        global_pos = np.searchsorted(self._keys, keys, side='left')
+        return global_pos - self.start_of(ids)
+
+    def start_of(self, ids):
+        """First flat row of every ticker id (0 for id -1)."""
+        return np.append(self.starts, 0)[ids]
+
+    def length_of(self, ids):
+        """Number of common trading days of every ticker id (0 for id -1)."""
+        return np.append(self.lengths, 0)[ids]
+
+
+class EventWindows:
+    """
+    Estimation and event windows of many events, gathered once from an
+    AlignedReturns and shared by every normal-return model.
+
+    local['est'] / local['ev'] are (n_events, days) positions on each ticker's
+    common calendar; stock(...) and market(...) gather returns on them,
+    market(..., shift=k) the market return k common trading days later
+    (k < 0: earlier), NaN across ticker bounds. Windows are gathered for
+    every event whose estimation window fits, so a shorter post window
+    (in_range_for) reuses the same arrays and estimates.
+    """
+
+    def __init__(self, aligned, ids, loc, est_days, pre, post, gap):
+        self.aligned = aligned
+        self.pre, self.post = pre, post
+        self.has_ticker = ids >= 0
+        self.base = aligned.start_of(ids)
+        self.length = aligned.length_of(ids)
+        self.loc = loc
+        event_start = loc - pre
+        est_start = event_start - gap - 1 - est_days + 1
+        self.located = self.has_ticker & (loc < self.length)
+        self.est_ok = self.located & (est_start >= 0)
+        self.in_range = self.in_range_for(post)
+        self.local = {'est': est_start[:, None] + np.arange(est_days),
+                      'ev': event_start[:, None] + np.arange(pre + post + 1)}
+        self._cache = {}
+
+    def in_range_for(self, post):
+        """Events whose estimation window and event window [-pre, post] lie inside their data."""
+        return self.est_ok & (self.loc + post < self.length)
+
+    def _gather(self, values, window, shift=0):
+        local = self.local[window] + shift
+        valid = self.est_ok[:, None] & (local >= 0) & (local < self.length[:, None])
+        return gather(values, self.base[:, None] + local, valid)
+
+    def stock(self, window):
+        key = ('stock', window)
+        if key not in self._cache:
+            self._cache[key] = self._gather(self.aligned.stock, window)
+        return self._cache[key]
+
+    def market(self, window, shift=0):
+        key = ('market', window, shift)
+        if key not in self._cache:
+            self._cache[key] = self._gather(self.aligned.market, window, shift)
+        return self._cache[key]
+
+    def days(self, window):
+        """Calendar day numbers (days since 1970-01-01, NaN outside the data) of a window's rows."""
+        key = ('days', window)
+        if key not in self._cache:
+            self._cache[key] = self._gather(self.aligned.dates.astype('datetime64[D]').astype(float), window)
+        return self._cache[key]
+
+    def event_dates(self):
+        day0 = np.full(len(self.loc), np.datetime64('NaT'), dtype='datetime64[ns]')
+        day0[self.located] = self.aligned.dates[(self.base + self.loc)[self.located]]
+        return day0
+
+
+def event_windows(events, stock_index, market_returns, est_days=ESTIMATION_DAYS, pre=EVENT_WINDOW_PRE,
+                  post=EVENT_WINDOW_POST, gap=GAP_DAYS, aligned=None):
+    """
+    EventWindows for events ('Symbol', 'EventDate'). Day 0 is the first common
+    trading day on or after EventDate; the estimation window is the est_days
+    trading days ending gap + 1 days before the event window starts. Pass an
+    existing AlignedReturns to reuse it across window configurations.
+    """
+    if aligned is None:
+        aligned = AlignedReturns(stock_index, market_returns, events['Symbol'])
+    ids, loc = aligned.locate(events['Symbol'], events['EventDate'])
+    return EventWindows(aligned, ids, loc, est_days, pre, post, gap)
+
+
+def event_study(events, stock_index, market_returns, est_days=ESTIMATION_DAYS, pre=EVENT_WINDOW_PRE,
+                post=EVENT_WINDOW_POST, gap=GAP_DAYS, min_obs=MIN_OBS, model='market'):
+    """
+    Event study of all events at once under one normal-return model
+    (see MODELS).
+
+    events: frame with 'Symbol' (stored ticker) and 'EventDate'.
+    Returns (result, ar) where result is events plus alpha, beta, sigma2,
+    n_obs, EventDateActual and status, and ar is an (n_events, pre + post + 1)
+    array of abnormal returns (NaN rows where status != 'ok').
+    """
+    return evaluate(events, stock_index, market_returns, [model], est_days, pre, post, gap, min_obs)[model]
+
+
+# --- Normal-return models ---
+# Every model is a kernel(windows, min_obs) evaluated for all events at once. It
+# returns a dict of (n_events,) arrays alpha, beta, sigma2, n_obs, valid and
+# 'expected': {'est': ..., 'ev': ...}, the normal returns over the estimation
+# and the event window (est - expected['est'] are the estimation residuals).
+MODELS = {}
+DIMSON_LAGS = 1     # market lags and leads in the Dimson regression
+
+
+def register_model(name):
+    def decorator(kernel):
+        MODELS[name] = kernel
+        return kernel
+    return decorator
+
+
+def fit_ols(Y, regressors, min_obs=MIN_OBS):
+    """
+    Masked multiple OLS of Y on [1, *regressors] for every row, solved through the
+    stacked centred normal equations. Rows are used only where Y and every
+    regressor are finite. Returns coef (n_events, 1 + k; intercept first),
+    sigma2 (n - k - 1 dof), n_obs and valid.
+    """
+    Y = np.asarray(Y, dtype=float)
+    Xs = np.stack([np.asarray(x, dtype=float) for x in regressors], axis=-1)     # events x days x k
+    k = Xs.shape[-1]
+    has_inf = np.isinf(Y).any(axis=1) | np.isinf(Xs).any(axis=(1, 2))
+    mask = np.isfinite(Y) & np.isfinite(Xs).all(axis=-1)
+    n = mask.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y_mean = np.where(mask, Y, 0.0).sum(axis=1) / n
+        x_mean = np.where(mask[..., None], Xs, 0.0).sum(axis=1) / n[:, None]
+        dy = np.where(mask, Y - y_mean[:, None], 0.0)
+        dx = np.where(mask[..., None], Xs - x_mean[:, None, :], 0.0)
+        sxx = np.einsum('edi,edj->eij', dx, dx)
+        sxy = np.einsum('edi,ed->ei', dx, dy)
+        scale = np.sqrt(np.einsum('eii->ei', sxx))
+        corr = sxx / (scale[:, :, None] * scale[:, None, :])
+        well_posed = np.isfinite(corr).all(axis=(1, 2)) & (np.linalg.det(np.where(np.isfinite(corr), corr, 0.0)) > 1e-12)
+
+    valid = (n >= max(min_obs, k + 2)) & well_posed & ~has_inf
+    eye = np.broadcast_to(np.eye(k), sxx.shape)
+    slopes = np.linalg.solve(np.where(valid[:, None, None], sxx, eye), np.where(valid[:, None], sxy, 0.0)[..., None])[..., 0]
+    intercept = y_mean - (slopes * x_mean).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        resid = np.where(mask, dy - np.einsum('edk,ek->ed', dx, slopes), 0.0)
+        sigma2 = (resid * resid).sum(axis=1) / (n - k - 1)
+
+    coef = np.column_stack([intercept, slopes])
+    coef[~valid] = np.nan
+    return {'coef': coef, 'sigma2': np.where(valid, sigma2, np.nan), 'n_obs': n, 'valid': valid}
+
+
+@register_model('mean_adjusted')
+def mean_adjusted(w, min_obs=MIN_OBS):
+    """Normal return = the stock's mean return over the estimation window."""
+    Y = w.stock('est')
+    mask = np.isfinite(Y)
+    n = mask.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(mask, Y, 0.0).sum(axis=1) / n
+        sigma2 = np.where(mask, (Y - mean[:, None]) ** 2, 0.0).sum(axis=1) / (n - 1)
+    valid = n >= max(min_obs, 2)
+    mean = np.where(valid, mean, np.nan)
+    expected = {window: np.broadcast_to(mean[:, None], w.local[window].shape) for window in ('est', 'ev')}
+    return {'alpha': mean, 'beta': np.where(valid, 0.0, np.nan), 'sigma2': np.where(valid, sigma2, np.nan),
+            'n_obs': n, 'valid': valid, 'expected': expected}
+
+
+@register_model('market_adjusted')
+def market_adjusted(w, min_obs=MIN_OBS):
+    """Normal return = the market return (alpha 0, beta 1); nothing is estimated."""
+    D = w.stock('est') - w.market('est')
+    mask = np.isfinite(D)
+    n = mask.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(mask, D, 0.0).sum(axis=1) / n
+        sigma2 = np.where(mask, (D - mean[:, None]) ** 2, 0.0).sum(axis=1) / (n - 1)
+    valid = n >= max(min_obs, 2)
+    return {'alpha': np.where(valid, 0.0, np.nan), 'beta': np.where(valid, 1.0, np.nan),
+            'sigma2': np.where(valid, sigma2, np.nan), 'n_obs': n, 'valid': valid,
+            'expected': {window: w.market(window) for window in ('est', 'ev')}}
+
+
+@register_model('market')
+def market(w, min_obs=MIN_OBS):
+    """OLS market model R = alpha + beta * M."""
+    fit = fit_market_model(w.stock('est'), w.market('est'), min_obs)
+    fit['expected'] = {window: fit['alpha'][:, None] + fit['beta'][:, None] * w.market(window)
+                       for window in ('est', 'ev')}
+    return fit
+
+
+@register_model('scholes_williams')
+def scholes_williams(w, min_obs=MIN_OBS):
+    """
+    Scholes-Williams (1977) beta for non-synchronous trading:
+    beta = (b[-1] + b[0] + b[+1]) / (1 + 2 * rho), where b[k] is the slope of R_t
+    on M_(t+k) and rho the first-order autocorrelation of M, all over the days
+    where R, M_(t-1), M_t and M_(t+1) exist. alpha = mean(R) - beta * mean(M).
+    """
+    Y = w.stock('est')
+    X = {k: w.market('est', k) for k in (-1, 0, 1)}
+    mask = np.isfinite(Y) & np.isfinite(X[-1]) & np.isfinite(X[0]) & np.isfinite(X[1])
+    n = mask.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        def centred(values):
+            mean = np.where(mask, values, 0.0).sum(axis=1) / n
+            return mean, np.where(mask, values - mean[:, None], 0.0)
+        y_mean, dy = centred(Y)
+        x_mean, dx = {}, {}
+        for k in X:
+            x_mean[k], dx[k] = centred(X[k])
+        sxx = {k: (dx[k] * dx[k]).sum(axis=1) for k in X}
+        b = {k: (dx[k] * dy).sum(axis=1) / sxx[k] for k in X}
+        rho = (dx[0] * dx[-1]).sum(axis=1) / np.sqrt(sxx[0] * sxx[-1])
+        beta = (b[-1] + b[0] + b[1]) / (1 + 2 * rho)
+        alpha = y_mean - beta * x_mean[0]
+        resid = np.where(mask, dy - beta[:, None] * dx[0], 0.0)
+        sigma2 = (resid * resid).sum(axis=1) / (n - 2)
+    valid = (n >= max(min_obs, 4)) & np.isfinite(beta) & (sxx[0] > 0)
+    alpha, beta = np.where(valid, alpha, np.nan), np.where(valid, beta, np.nan)
+    expected = {window: alpha[:, None] + beta[:, None] * w.market(window) for window in ('est', 'ev')}
+    return {'alpha': alpha, 'beta': beta, 'sigma2': np.where(valid, sigma2, np.nan), 'n_obs': n,
+            'valid': valid, 'expected': expected, 'x_mean': x_mean[0], 'sxx': sxx[0]}
+
+
+@register_model('dimson')
+def dimson(w, min_obs=MIN_OBS, lags=None):
+    """
+    Dimson (1979) aggregated-coefficients model: R_t on M_(t-L) .. M_(t+L) by
+    multiple OLS; beta is the sum of the slopes and the normal return uses every
+    lagged and leading market term.
+    """
+    lags = DIMSON_LAGS if lags is None else lags
+    shifts = list(range(-lags, lags + 1))
+    fit = fit_ols(w.stock('est'), [w.market('est', k) for k in shifts], min_obs)
+    coef = fit['coef']
+    expected = {window: coef[:, :1] + sum(coef[:, 1 + i:2 + i] * w.market(window, k) for i, k in enumerate(shifts))
+                for window in ('est', 'ev')}
+    return {'alpha': coef[:, 0], 'beta': coef[:, 1:].sum(axis=1), 'sigma2': fit['sigma2'],
+            'n_obs': fit['n_obs'], 'valid': fit['valid'], 'expected': expected}
+
+
+def fitted_ar(windows, fit, post=None):
+    """
+    (in_range, ok, ar) of one fitted model over [-pre, post] without building
+    a result frame; ar rows are NaN where ok is False.
+    """
+    post = windows.post if post is None else post
+    width = windows.pre + post + 1
+    in_range = windows.in_range_for(post)
+    ok = in_range & fit['valid']
+    ar = np.where(ok[:, None], windows.stock('ev')[:, :width] - fit['expected']['ev'][:, :width], np.nan)
+    return in_range, ok, ar
+
+
+def score(events, windows, name, fit, post=None):
+    """
+    (result, ar) of one fitted model for the event window [-pre, post];
+    post defaults to the windows' own and may be shorter.
+    """
+    in_range, ok, ar = fitted_ar(windows, fit, post)
+    status = np.full(len(events), OK, dtype=object)
+    status[~ok] = FEW_OBS
+    status[~in_range] = OUT_OF_RANGE
+    status[~windows.has_ticker] = NO_DATA
+    result = events.copy()
+    result['EventDateActual'] = pd.to_datetime(windows.event_dates())
+    for key in ('alpha', 'beta', 'sigma2'):
+        result[key] = np.where(ok, fit[key], np.nan)
+    result['n_obs'] = fit['n_obs']
+    result['model'] = name
+    result['status'] = status
+    return result, ar
+
+
+def evaluate(events, stock_index, market_returns, models=('market',), est_days=ESTIMATION_DAYS,
+             pre=EVENT_WINDOW_PRE, post=EVENT_WINDOW_POST, gap=GAP_DAYS, min_obs=MIN_OBS, windows=None):
+    """
+    Evaluates the same events under several normal-return models in one pass: the
+    returns are aligned and the windows gathered once, then every model kernel
+    runs on the shared arrays. Returns {model: (result, ar)} as in event_study.
+    """
+    unknown = [m for m in models if m not in MODELS]
+    if unknown:
+        raise ValueError(f"Unknown model(s) {unknown}, expected one of {sorted(MODELS)}")
+    events = events.reset_index(drop=True)
+    if windows is None:
+        windows = event_windows(events, stock_index, market_returns, est_days, pre, post, gap)
+    return {name: score(events, windows, name, MODELS[name](windows, min_obs)) for name in models}
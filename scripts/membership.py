@@ -0,0 +1,228 @@
+"""
+CROBEX membership timeline as an interval index.
+
+Pairs the insertions and deletions of every security (canonical ISIN via the
+symbol master, so X and X-R-A are one security) into membership intervals
+[start, end): start is the effective date of the insertion, end the effective
+date of the deletion (the first day the stock is no longer a member).
+
+    first event is a deletion               member since before the data (start NaT,
+                                            left_censored)
+    insertion without a later deletion      still a member (end NaT, right_censored)
+    insertion while already a member        ignored (counted in .skipped)
+    later deletion while not a member       ignored (counted in .skipped)
+
+Securities that were members for the whole history never appear in the event
+files and are unknown to the index.
+
+The intervals are kept sorted by (security, start) with a composite integer
+key, so point-in-time queries over arrays of (ticker, date) pairs are one
+searchsorted, and mask(dates, tickers) builds a dates x tickers membership
+matrix (e.g. on a PricePanel's dates and symbols) from a difference array:
+
+    index = MembershipIndex.from_files()
+    index.members('2020-01-02')                       # constituents on a day
+    index.is_member(['INA', 'ZITO'], ['2020-01-02', '2025-10-01'])
+    index.tenure(events['Symbol'], events['EventDate'])   # days as a member so far
+    index.mask(panel.dates, panel.symbols)
+
+Usage:
+    python scripts/membership.py [--date 2020-01-02] [--symbol INA]
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import symbols
+from trading_calendar import to_days
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+
+# --- Configuration ---
+INSERTIONS_FILE = os.path.join(ROOT_DIR, 'INSERTIONS_ANN_EVENT.csv')
+DELETIONS_FILE = os.path.join(ROOT_DIR, 'DELETIONS_ANN_EVENT.csv')
+
+# interval bounds are day numbers shifted into [0, 2**32): open ends sit at the extremes
+_DAY_SHIFT = np.int64(1 << 31)
+_OPEN_START = np.int64(0)
+_OPEN_END = np.int64((1 << 32) - 1)
+_KEY_SCALE = np.int64(1 << 32)
+
+
+def _shifted_days(dates, fill):
+    days = to_days(dates)
+    return np.where(np.isnat(days), fill, days.astype('datetime64[D]').astype(np.int64) + _DAY_SHIFT)
+
+
+def pair_events(insertions, deletions):
+    """
+    Membership intervals from insertion / deletion frames with SecurityId,
+    Symbol, EventDate and optionally AnnDate (symbols.read_events output).
+    Returns (intervals frame, {'duplicate_insertions': n, 'orphan_deletions': m}).
+    """
+    frames = []
+    for kind, events in (('in', insertions), ('out', deletions)):
+        events = events.dropna(subset=['EventDate'])
+        frames.append(pd.DataFrame({
+            'security': events['SecurityId'].fillna(events['Symbol'].str.upper()).to_numpy(),
+            'symbol': events['CanonicalSymbol'].fillna(events['Symbol']).to_numpy(),
+            'date': events['EventDate'].to_numpy(),
+            'ann': events['AnnDate'].to_numpy() if 'AnnDate' in events.columns else pd.NaT,
+            # same-day deletion before insertion: a re-entry continues the timeline
+            'order': 1 if kind == 'in' else 0,
+            'kind': kind}))
+    timeline = pd.concat(frames, ignore_index=True).sort_values(['security', 'date', 'order'], kind='stable')
+
+    rows = []
+    skipped = {'duplicate_insertions': 0, 'orphan_deletions': 0}
+    for security, group in timeline.groupby('security', sort=True):
+        open_row = None
+        for n, e in enumerate(group.itertuples(index=False)):
+            if e.kind == 'in':
+                if open_row is not None:
+                    skipped['duplicate_insertions'] += 1
+                    continue
+                open_row = {'security': security, 'symbol': e.symbol, 'start': e.date, 'start_ann': e.ann,
+                            'left_censored': False}
+            else:
+                if open_row is None and n > 0:
+                    skipped['orphan_deletions'] += 1
+                    continue
+                row = open_row or {'security': security, 'symbol': e.symbol, 'start': pd.NaT, 'start_ann': pd.NaT,
+                                   'left_censored': True}
+                rows.append(dict(row, end=e.date, end_ann=e.ann, right_censored=False))
+                open_row = None
+        if open_row is not None:
+            rows.append(dict(open_row, end=pd.NaT, end_ann=pd.NaT, right_censored=True))
+    columns = ['security', 'symbol', 'start', 'end', 'start_ann', 'end_ann', 'left_censored', 'right_censored']
+    intervals = pd.DataFrame(rows, columns=columns)
+    for col in ('start', 'end', 'start_ann', 'end_ann'):
+        intervals[col] = pd.to_datetime(intervals[col])
+    return intervals, skipped
+
+
+class MembershipIndex:
+
+    def __init__(self, intervals, master=None, skipped=None):
+        self.master = master
+        self.skipped = skipped or {}
+        starts = _shifted_days(intervals['start'], _OPEN_START)
+        order = np.lexsort((starts, intervals['security'].to_numpy()))
+        self.intervals = intervals.iloc[order].reset_index(drop=True)
+        self.securities = list(dict.fromkeys(self.intervals['security']))
+        self.security_id = {s: i for i, s in enumerate(self.securities)}
+        self._sec = np.array([self.security_id[s] for s in self.intervals['security']], dtype=np.int64)
+        self._start = starts[order]
+        self._end = _shifted_days(self.intervals['end'], _OPEN_END)
+        self._keys = self._sec * _KEY_SCALE + self._start
+
+    @classmethod
+    def from_events(cls, insertions, deletions, master=None):
+        intervals, skipped = pair_events(insertions, deletions)
+        return cls(intervals, master, skipped)
+
+    @classmethod
+    def from_files(cls, insertions_file=INSERTIONS_FILE, deletions_file=DELETIONS_FILE, master=None):
+        master = master or symbols.load_master()
+        return cls.from_events(symbols.read_events(insertions_file, master),
+                               symbols.read_events(deletions_file, master), master)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def ids(self, tickers):
+        """Security id of every ticker / alias / ISIN (-1 if it was never a member)."""
+        tickers = np.asarray(tickers, dtype=object)
+        unique, inverse = np.unique(tickers.astype(str), return_inverse=True)
+        master = self.master or symbols.load_master()
+        keys = [master.security_id(t) or str(t).strip().upper() for t in unique]
+        return np.array([self.security_id.get(k, -1) for k in keys], dtype=np.int64)[inverse].reshape(tickers.shape)
+
+    # --- Point-in-time queries ---
+    def interval_of(self, tickers, dates):
+        """Row in .intervals of the membership covering each (ticker, date); -1 if not a member."""
+        ids = self.ids(tickers)
+        days = to_days(dates)
+        keys = np.maximum(ids, 0) * _KEY_SCALE + _shifted_days(days, _OPEN_START)
+        pos = np.searchsorted(self._keys, keys, side='right') - 1
+        safe = np.maximum(pos, 0)
+        hit = (ids >= 0) & ~np.isnat(days) & (pos >= 0) & (self._sec[safe] == ids) & \
+            (_shifted_days(days, _OPEN_START) < self._end[safe])
+        return np.where(hit, pos, -1)
+
+    def is_member(self, tickers, dates):
+        return self.interval_of(tickers, dates) >= 0
+
+    def tenure(self, tickers, dates, calendar=None):
+        """
+        Time each (ticker, date) has been a member: calendar days, or trading
+        sessions with a TradingCalendar. NaN if not a member or the membership
+        started before the data (left-censored).
+        """
+        rows = self.interval_of(tickers, dates)
+        member = rows >= 0
+        start = np.full(len(rows), np.datetime64('NaT'), dtype='datetime64[ns]')
+        start[member] = self.intervals['start'].to_numpy(dtype='datetime64[ns]')[rows[member]]
+        days = to_days(dates)
+        if calendar is None:
+            out = (days - start).astype('timedelta64[D]').astype(float)
+        else:
+            out = calendar.sessions_between(start, days).astype(float)
+            out[out < 0] = np.nan
+        out[~member | np.isnat(start)] = np.nan
+        return out
+
+    def members(self, date):
+        """Intervals active on one date."""
+        date = _shifted_days(date, _OPEN_START)[0]
+        return self.intervals[(self._start <= date) & (date < self._end)]
+
+    def overlapping(self, start, end):
+        """Intervals overlapping [start, end]."""
+        lo = _shifted_days(start, _OPEN_START)[0]
+        hi = _shifted_days(end, _OPEN_END)[0]
+        return self.intervals[(self._start <= hi) & (lo < self._end)]
+
+    # --- Dense mask ---
+    def mask(self, dates, tickers):
+        """(len(dates), len(tickers)) bool membership matrix over sorted dates (e.g. a PricePanel's)."""
+        days = _shifted_days(dates, _OPEN_START)
+        col_ids = self.ids(tickers)
+        cols = [np.flatnonzero(col_ids == i) for i in range(len(self.securities))]
+        pairs = [(k, j) for k, sec in enumerate(self._sec) for j in cols[sec]]
+        diff = np.zeros((len(days) + 1, len(col_ids)), dtype=np.int64)
+        if pairs:
+            k, j = np.array(pairs).T
+            np.add.at(diff, (np.searchsorted(days, self._start[k], side='left'), j), 1)
+            np.add.at(diff, (np.searchsorted(days, self._end[k], side='left'), j), -1)
+        return np.cumsum(diff, axis=0)[:-1] > 0
+
+    def panel_mask(self, panel):
+        """mask() on a price_panel.PricePanel's dates and symbols."""
+        return self.mask(panel.dates, panel.symbols)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='CROBEX membership intervals from the event files.')
+    parser.add_argument('--date', help='list the members on this date')
+    parser.add_argument('--symbol', help='list the membership intervals of this symbol')
+    args = parser.parse_args(argv)
+
+    index = MembershipIndex.from_files()
+    print(f"{len(index)} intervals over {len(index.securities)} securities, "
+          f"{int(index.intervals['left_censored'].sum())} left- / {int(index.intervals['right_censored'].sum())} "
+          f"right-censored; ignored {index.skipped}")
+    if args.date:
+        members = index.members(pd.Timestamp(args.date))
+        print(f"\n{len(members)} members on {args.date}: {', '.join(sorted(members['symbol']))}")
+    if args.symbol:
+        sec = index.ids([args.symbol])[0]
+        print(index.intervals[index._sec == sec].to_string(index=False) if sec >= 0 else f"{args.symbol}: never a member")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
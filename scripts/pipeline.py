@@ -0,0 +1,278 @@
+"""
+Content-hash cached runner for the processing chain.
+
+Each stage declares its script, the code it depends on, its input and output
+paths and its parameters. A stage's fingerprint is the SHA-256 of all of
+those; a stage whose fingerprint matches the last successful run (and whose
+outputs still exist) is skipped. Stages whose dependencies are done run in
+parallel, each as its own subprocess.
+
+The code of a stage is its script plus every scripts/ module it imports
+(followed recursively), so editing a shared helper re-runs its users.
+Because downstream fingerprints hash the upstream outputs, editing only
+`window = 50` in car-testing.py re-runs only the car_testing stage, and a
+re-run upstream stage that produces identical files does not cascade.
+
+Usage:
+    python scripts/pipeline.py run all          # or: run car_testing
+    python scripts/pipeline.py run all --force
+    python scripts/pipeline.py status
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+
+# --- Configuration ---
+STATE_FILE = os.path.join(ROOT_DIR, '.pipeline_state.json')
+MAX_PARALLEL = 4
+
+
+def local_imports(script):
+    """The script and every scripts/<module>.py it imports, directly or indirectly."""
+    seen = set()
+    todo = [script]
+    while todo:
+        rel_path = todo.pop()
+        if rel_path in seen:
+            continue
+        seen.add(rel_path)
+        with open(os.path.join(ROOT_DIR, rel_path), 'r', encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [a.name for a in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                candidate = f"scripts/{name.split('.')[0]}.py"
+                if os.path.exists(os.path.join(ROOT_DIR, candidate)):
+                    todo.append(candidate)
+    return seen
+
+
+class Stage:
+    """One step of the pipeline; paths are relative to the repository root."""
+
+    def __init__(self, name, script, inputs=(), outputs=(), code=(), params=None, args=(), deps=()):
+        self.name = name
+        self.script = script
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = sorted(local_imports(script) | set(code))
+        self.params = dict(params or {})
+        self.args = list(args)
+        self.deps = list(deps)
+
+    def command(self):
+        return [sys.executable, os.path.join(ROOT_DIR, self.script)] + self.args
+
+
+STAGES = [
+    # the fingerprint already decides whether raw data changed, so the stage re-imports every file
+    Stage('import', 'scripts/price_store.py', args=['import', '--all'],
+          inputs=['stocks_raw_data', 'txt/ticker-isin.txt'], outputs=['price_store/merged']),
+    Stage('filled', 'scripts/AB_eur_filled.py',
+          inputs=['price_store/merged', 'txt/ticker-isin.txt'], outputs=['price_store/filled'], deps=['import']),
+    Stage('panel', 'scripts/price_panel.py', args=['build'],
+          inputs=['price_store/filled'], outputs=['price_panel'], deps=['filled']),
+    Stage('car_testing', 'car-testing.py',
+          inputs=['price_store/filled', 'INSERTIONS_EVENT.csv', 'DELETIONS_EVENT.csv'],
+          outputs=['testiranje_car_skripta'], deps=['filled']),
+    Stage('car_analysis', 'scripts/CAR_analysys.py',
+          inputs=['price_store/filled', 'xlsx/inserted-deleted.xlsx',
+                  'XZAG-IndexHistory-HRZB00ICBEX6-2010-01-01 - 2025-11-03.csv'], deps=['filled']),
+]
+
+
+def _walk_files(path):
+    if os.path.isfile(path):
+        yield path
+        return
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if not name.startswith('.'):
+                yield os.path.join(dirpath, name)
+
+
+class Hasher:
+    """File content hashes, memoized on (size, mtime) so unchanged files are not re-read."""
+
+    def __init__(self, memo=None):
+        self.memo = memo if memo is not None else {}
+
+    def file_digest(self, path):
+        st = os.stat(path)
+        key = os.path.relpath(path, ROOT_DIR)
+        stamp = [st.st_size, st.st_mtime_ns]
+        cached = self.memo.get(key)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self.memo[key] = [stamp, digest]
+        return digest
+
+    def path_digest(self, rel_path):
+        path = os.path.join(ROOT_DIR, rel_path)
+        h = hashlib.sha256(rel_path.encode('utf-8'))
+        for file_path in _walk_files(path):
+            h.update(os.path.relpath(file_path, path).encode('utf-8'))
+            h.update(self.file_digest(file_path).encode('ascii'))
+        return h.hexdigest()
+
+    def fingerprint(self, stage):
+        h = hashlib.sha256()
+        for rel_path in stage.code + stage.inputs:
+            h.update(self.path_digest(rel_path).encode('ascii'))
+        h.update(json.dumps([stage.params, stage.args], sort_keys=True).encode('utf-8'))
+        return h.hexdigest()
+
+
+def load_state(path=STATE_FILE):
+    if not os.path.exists(path):
+        return {'stages': {}, 'files': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_FILE):
+    tmp_path = path + '.part'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def select(stages, targets):
+    """The requested stages plus everything they depend on, in declaration order."""
+    by_name = {s.name: s for s in stages}
+    if targets == ['all']:
+        return list(stages)
+    wanted = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in by_name:
+            raise ValueError(f"Unknown stage '{name}', expected one of {sorted(by_name)}")
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(by_name[name].deps)
+    return [s for s in stages if s.name in wanted]
+
+
+def _run_stage(stage):
+    env = dict(os.environ, MPLBACKEND='Agg', PYTHONPATH=BASE_DIR)
+    start = time.time()
+    proc = subprocess.run(stage.command(), cwd=ROOT_DIR, env=env, capture_output=True, text=True)
+    return proc.returncode, proc.stdout + proc.stderr, time.time() - start
+
+
+def run(targets=('all',), stages=STAGES, force=False, max_parallel=MAX_PARALLEL, state_path=STATE_FILE):
+    """
+    Runs the selected stages. Returns {stage name: status}, where status is one
+    of 'ok', 'cached', 'failed', 'missing-input' or 'blocked'.
+    """
+    selected = select(stages, list(targets))
+    state = load_state(state_path)
+    hasher = Hasher(state.setdefault('files', {}))
+    status = {}
+    pending = {s.name: s for s in selected}
+    running = {}
+
+    def ready(stage):
+        return all(status.get(d) in ('ok', 'cached') for d in stage.deps)
+
+    with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if any(status.get(d) in ('failed', 'missing-input', 'blocked') for d in stage.deps):
+                    status[name] = 'blocked'
+                    del pending[name]
+                    continue
+                if not ready(stage):
+                    continue
+                del pending[name]
+                missing = [p for p in stage.inputs if not os.path.exists(os.path.join(ROOT_DIR, p))]
+                if missing:
+                    status[name] = 'missing-input'
+                    print(f"[MISSING] {name}: {', '.join(missing)}")
+                    continue
+                fingerprint = hasher.fingerprint(stage)
+                outputs_ok = all(os.path.exists(os.path.join(ROOT_DIR, p)) for p in stage.outputs)
+                if not force and outputs_ok and state['stages'].get(name) == fingerprint:
+                    status[name] = 'cached'
+                    print(f"[CACHED] {name}")
+                    continue
+                print(f"[RUN] {name}")
+                running[pool.submit(_run_stage, stage)] = (stage, fingerprint)
+
+            if not running:
+                if pending and not any(ready(s) for s in pending.values()):
+                    for name in pending:
+                        status[name] = 'blocked'
+                    pending.clear()
+                continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, fingerprint = running.pop(future)
+                code, output, seconds = future.result()
+                if code == 0:
+                    status[stage.name] = 'ok'
+                    state['stages'][stage.name] = fingerprint
+                    print(f"[OK] {stage.name} ({seconds:.1f}s)")
+                else:
+                    status[stage.name] = 'failed'
+                    state['stages'].pop(stage.name, None)
+                    print(f"[FAIL] {stage.name} (exit {code})\n{output[-2000:]}")
+                save_state(state, state_path)
+
+    save_state(state, state_path)
+    return status
+
+
+def print_status(stages=STAGES, state_path=STATE_FILE):
+    state = load_state(state_path)
+    hasher = Hasher(state.get('files', {}))
+    for stage in stages:
+        if any(not os.path.exists(os.path.join(ROOT_DIR, p)) for p in stage.inputs):
+            label = 'missing input'
+        elif state['stages'].get(stage.name) == hasher.fingerprint(stage):
+            label = 'up to date'
+        else:
+            label = 'stale'
+        print(f"{stage.name:<14} {label}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the A -> B -> C -> CAR pipeline with caching.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_run = sub.add_parser('run', help="run stages ('all' or stage names)")
+    p_run.add_argument('targets', nargs='+')
+    p_run.add_argument('--force', action='store_true', help='ignore cached fingerprints')
+    p_run.add_argument('--jobs', type=int, default=MAX_PARALLEL)
+    sub.add_parser('status', help='show which stages are up to date')
+    args = parser.parse_args(argv)
+
+    if args.command == 'status':
+        print_status()
+        return 0
+    status = run(args.targets, force=args.force, max_parallel=args.jobs)
+    return 1 if any(s in ('failed', 'blocked') for s in status.values()) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,170 @@
+"""
+Batch as-of price lookups over the whole price store.
+
+Replaces the per-query df[df["date"] >= date].sort_values("date").head(1) of
+return_stock_price_on_date.py: every ticker's rows are loaded once into flat
+arrays sorted by (ticker, date), and a batch of (ticker, date) queries is
+answered with one searchsorted on a composite (ticker id, day) key under the
+trading_calendar policies:
+
+    'on_or_after'   the ticker's first row dated >= date
+    'on_or_before'  the ticker's last row dated <= date
+    'exact'         only a row dated exactly date
+
+    lookup = PriceLookup.from_store()
+    lookup.asof(events['Symbol'], events['EventDate'])
+    # -> ticker, date, matched_date, close, volume (NaN / NaT where nothing matches)
+
+Tickers are resolved through the symbol master (X, X-R-A and ISIN give the
+same stored series); unknown tickers never match.
+
+Usage:
+    python scripts/price_lookup.py ARNT 2010-01-05 [--policy on_or_before]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import price_store
+import symbols
+from trading_calendar import ON_OR_AFTER, ON_OR_BEFORE, EXACT, POLICIES, to_days
+
+# --- Configuration ---
+DATE_COL = 'Date'
+FIELDS = {'close': 'Last Price', 'volume': 'Volume'}    # output name -> store column
+
+
+class PriceLookup:
+
+    def __init__(self, names, lengths, dates, values):
+        self.names = list(names)
+        self.name_id = {n: i for i, n in enumerate(self.names)}
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.starts = np.concatenate([[0], np.cumsum(self.lengths)[:-1]]).astype(np.int64)
+        self.dates = dates                # datetime64[ns], grouped by name, sorted and unique within a group
+        self.values = values              # {field: float64 array aligned with dates}
+        ids = np.repeat(np.arange(len(self.names), dtype=np.int64), self.lengths)
+        self._key_scale = np.int64(1 << 32)
+        self._keys = ids * self._key_scale + self.dates.astype('datetime64[D]').astype(np.int64)
+        self._master = None
+
+    @classmethod
+    def from_frames(cls, frames, fields=None, date_col=DATE_COL):
+        """From {name: frame with date_col and the fields' columns}; missing columns become NaN."""
+        fields = FIELDS if fields is None else fields
+        names = sorted(frames)
+        lengths, date_parts = [], []
+        value_parts = {field: [] for field in fields}
+        for name in names:
+            df = frames[name]
+            dates = pd.to_datetime(df[date_col], errors='coerce').dt.normalize().to_numpy(dtype='datetime64[ns]')
+            keep = ~np.isnat(dates)
+            order = np.argsort(dates[keep], kind='stable')
+            dates = dates[keep][order]
+            # one row per day: the last one, like the groupby(...).last() of the fill stage
+            last = np.append(dates[1:] != dates[:-1], True)
+            date_parts.append(dates[last])
+            lengths.append(int(last.sum()))
+            for field, column in fields.items():
+                if column in df.columns:
+                    values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)[keep][order][last]
+                else:
+                    values = np.full(int(last.sum()), np.nan)
+                value_parts[field].append(values)
+        dates = np.concatenate(date_parts) if date_parts else np.array([], dtype='datetime64[ns]')
+        values = {field: np.concatenate(parts) if parts else np.array([], dtype=float)
+                  for field, parts in value_parts.items()}
+        return cls(names, lengths, dates, values)
+
+    @classmethod
+    def from_store(cls, stage=price_store.DEFAULT_STAGE, fields=None, tickers=None):
+        fields = FIELDS if fields is None else fields
+        if tickers is None:
+            tickers = price_store.list_tickers(stage)
+        wanted = list(dict.fromkeys([DATE_COL, *fields.values()]))
+        frames = {}
+        for ticker in tickers:
+            # write_ticker stores stripped column names; read only the wanted ones that exist
+            stored = set(price_store.ticker_columns(ticker, stage))
+            frames[ticker] = price_store.load_ticker(ticker, stage, columns=[c for c in wanted if c in stored])
+        return cls.from_frames(frames, fields)
+
+    @classmethod
+    def from_series(cls, name, dates, **values):
+        """A single named series (e.g. the CROBEX index): from_series('CROBEX', dates, index_close=...)."""
+        frame = pd.DataFrame({DATE_COL: dates, **values})
+        return cls.from_frames({name: frame}, {field: field for field in values})
+
+    def __contains__(self, name):
+        return name in self.name_id
+
+    def __len__(self):
+        return len(self.names)
+
+    def ids(self, tickers, resolve=True):
+        """Series id of every ticker (-1 if unknown); resolve=True maps aliases through the symbol master."""
+        tickers = np.asarray(tickers, dtype=object)
+        unique, inverse = np.unique(tickers.astype(str), return_inverse=True)
+        if resolve:
+            if self._master is None:
+                self._master = symbols.load_master()
+            unique = [self._master.sheet(t, self.name_id) for t in unique]
+        return np.array([self.name_id.get(t, -1) for t in unique], dtype=np.int64)[inverse].reshape(tickers.shape)
+
+    def positions(self, ids, dates, policy=ON_OR_AFTER):
+        """Flat row of every (id, date) under the policy; -1 where nothing matches."""
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}', expected one of {POLICIES}")
+        ids = np.asarray(ids, dtype=np.int64)
+        days = to_days(dates)
+        known = (ids >= 0) & ~np.isnat(days)
+        safe = np.maximum(ids, 0)
+        start = np.append(self.starts, 0)[safe]
+        stop = start + np.append(self.lengths, 0)[safe]
+        keys = safe * self._key_scale + days.astype('datetime64[D]').astype(np.int64)
+        if policy == ON_OR_BEFORE:
+            pos = np.searchsorted(self._keys, keys, side='right') - 1
+            found = known & (pos >= start)
+        else:
+            pos = np.searchsorted(self._keys, keys, side='left')
+            found = known & (pos < stop)
+            if policy == EXACT:
+                found[found] = self._keys[pos[found]] == keys[found]
+        return np.where(found, pos, -1)
+
+    def asof(self, tickers, dates, policy=ON_OR_AFTER, fields=None, resolve=True):
+        """
+        Frame with one row per query: ticker, date, matched_date and the fields
+        (default all); NaT / NaN where the ticker is unknown or nothing matches.
+        """
+        fields = list(self.values) if fields is None else list(fields)
+        tickers = np.asarray(tickers, dtype=object)
+        dates = to_days(dates)
+        pos = self.positions(self.ids(tickers, resolve), dates, policy)
+        found = pos >= 0
+        matched = np.full(len(pos), np.datetime64('NaT'), dtype='datetime64[ns]')
+        matched[found] = self.dates[pos[found]]
+        out = {'ticker': tickers, 'date': dates, 'matched_date': matched}
+        for field in fields:
+            values = np.full(len(pos), np.nan)
+            values[found] = self.values[field][pos[found]]
+            out[field] = values
+        return pd.DataFrame(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='As-of price lookup from the price store.')
+    parser.add_argument('ticker')
+    parser.add_argument('date', nargs='+')
+    parser.add_argument('--policy', choices=POLICIES, default=ON_OR_AFTER)
+    parser.add_argument('--stage', default=price_store.DEFAULT_STAGE, choices=price_store.STAGES)
+    args = parser.parse_args(argv)
+
+    lookup = PriceLookup.from_store(args.stage)
+    print(lookup.asof([args.ticker] * len(args.date), pd.to_datetime(args.date), args.policy).to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
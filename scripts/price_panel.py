@@ -0,0 +1,162 @@
+"""
+Memory-mapped dense date x ticker price panel.
+
+B_dodavanjeiMicanjeRedaka.py already aligns every ticker onto the union of
+trading dates; this build step keeps that alignment on disk as contiguous
+NumPy arrays so analysis code never has to re-merge prices by Date:
+
+    price_panel/last_price.npy   float64 (dates x tickers)
+    price_panel/vwap_price.npy   float64
+    price_panel/volume.npy       float64
+    price_panel/turnover.npy     float64
+    price_panel/traded.npy       bool    True where the stock really traded that day
+    price_panel/dates.npy        datetime64[D]
+    price_panel/symbols.json     column order
+
+Cells outside a ticker's listed range are NaN (prices) / 0 (volume, turnover).
+PricePanel memory-maps the files read-only, so loading the whole universe is
+zero-copy and several processes share one page-cached copy.
+
+Usage:
+    python scripts/price_panel.py build [--stage filled]
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import price_store
+from trading_calendar import TradingCalendar, EXACT
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+
+# --- Configuration ---
+PANEL_DIR = os.path.join(ROOT_DIR, 'price_panel')
+SOURCE_STAGE = 'filled'
+FIELDS = {
+    'last_price': 'Last Price',
+    'vwap_price': 'VWAP Price',
+    'volume': 'Volume',
+    'turnover': 'Turnover',
+}
+ZERO_FILL_FIELDS = {'volume', 'turnover'}
+TRADED_FIELD = 'traded'
+TRADES_COL = 'Num Trades'
+
+
+def _atomic_save(path, array):
+    tmp_path = path + '.part'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(tmp_path, path)
+
+
+def build_panel(stage=SOURCE_STAGE, panel_dir=PANEL_DIR, tickers=None):
+    """
+    Builds the panel files from a price_store stage and returns the panel_dir.
+    The 'traded' mask is Num Trades > 0 (Volume > 0 if the column is missing),
+    so the days B_dodavanjeiMicanjeRedaka.py forward-filled are False.
+    """
+    if tickers is None:
+        tickers = price_store.list_tickers(stage)
+    columns = ['Date', TRADES_COL] + list(FIELDS.values())
+    frames = {}
+    for ticker in tickers:
+        df = price_store.load_ticker(ticker, stage)
+        df = df[[c for c in columns if c in df.columns]].copy()
+        df['Date'] = pd.to_datetime(df['Date'], errors='coerce').dt.normalize()
+        df = df.dropna(subset=['Date']).drop_duplicates('Date', keep='last')
+        frames[ticker] = df.set_index('Date')
+
+    all_dates = pd.DatetimeIndex(sorted(set().union(*(f.index for f in frames.values())))) if frames \
+        else pd.DatetimeIndex([])
+    n_dates, n_tickers = len(all_dates), len(tickers)
+    arrays = {name: np.full((n_dates, n_tickers), 0.0 if name in ZERO_FILL_FIELDS else np.nan)
+              for name in FIELDS}
+    traded = np.zeros((n_dates, n_tickers), dtype=bool)
+
+    for j, ticker in enumerate(tickers):
+        df = frames[ticker]
+        rows = all_dates.get_indexer(df.index)
+        for name, col in FIELDS.items():
+            if col in df.columns:
+                arrays[name][rows, j] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+        activity = df[TRADES_COL] if TRADES_COL in df.columns else df.get(FIELDS['volume'])
+        if activity is not None:
+            traded[rows, j] = pd.to_numeric(activity, errors='coerce').fillna(0).to_numpy() > 0
+
+    os.makedirs(panel_dir, exist_ok=True)
+    for name, array in arrays.items():
+        _atomic_save(os.path.join(panel_dir, f'{name}.npy'), array)
+    _atomic_save(os.path.join(panel_dir, f'{TRADED_FIELD}.npy'), traded)
+    _atomic_save(os.path.join(panel_dir, 'dates.npy'), all_dates.values.astype('datetime64[D]'))
+    with open(os.path.join(panel_dir, 'symbols.json'), 'w', encoding='utf-8') as f:
+        json.dump({'stage': stage, 'symbols': list(tickers)}, f, indent=2)
+    return panel_dir
+
+
+class PricePanel:
+    """Read-only, memory-mapped view of a built panel."""
+
+    def __init__(self, panel_dir=PANEL_DIR, mmap_mode='r'):
+        if not os.path.exists(os.path.join(panel_dir, 'symbols.json')):
+            raise FileNotFoundError(f"No price panel in {panel_dir}; run 'python scripts/price_panel.py build'")
+        self.panel_dir = panel_dir
+        self.mmap_mode = mmap_mode
+        with open(os.path.join(panel_dir, 'symbols.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.stage = meta['stage']
+        self.symbols = meta['symbols']
+        self.symbol_index = {s: j for j, s in enumerate(self.symbols)}
+        self.dates = np.load(os.path.join(panel_dir, 'dates.npy'))
+        self.calendar = TradingCalendar(self.dates)
+        self._arrays = {}
+
+    def __getitem__(self, field):
+        """The dates x tickers array of a field ('last_price', ..., 'traded'), memory-mapped on first use."""
+        if field not in self._arrays:
+            if field != TRADED_FIELD and field not in FIELDS:
+                raise KeyError(f"Unknown panel field '{field}'")
+            self._arrays[field] = np.load(os.path.join(self.panel_dir, f'{field}.npy'), mmap_mode=self.mmap_mode)
+        return self._arrays[field]
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.symbols)
+
+    def column(self, symbol, field='last_price'):
+        """One ticker's series as a (strided, zero-copy) view."""
+        return self[field][:, self.symbol_index[symbol]]
+
+    def date_loc(self, dates):
+        """Row positions of dates (scalar or array); -1 where the date is not in the panel."""
+        pos = self.calendar.ordinal(dates, EXACT)
+        return pos if np.ndim(dates) else pos[0]
+
+    def to_frame(self, field='last_price', symbols=None):
+        """pandas view (Date index, one column per ticker) for plotting or ad-hoc work."""
+        if symbols is None:
+            return pd.DataFrame(self[field], index=pd.DatetimeIndex(self.dates, name='Date'),
+                                columns=self.symbols, copy=False)
+        cols = [self.symbol_index[s] for s in symbols]
+        return pd.DataFrame(self[field][:, cols], index=pd.DatetimeIndex(self.dates, name='Date'), columns=symbols)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Dense memory-mapped price panel.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_build = sub.add_parser('build', help='build the panel from a price_store stage')
+    p_build.add_argument('--stage', default=SOURCE_STAGE, choices=price_store.STAGES)
+    p_build.add_argument('--panel-dir', default=PANEL_DIR)
+    args = parser.parse_args(argv)
+
+    panel_dir = build_panel(args.stage, args.panel_dir)
+    panel = PricePanel(panel_dir)
+    print(f"Panel {panel.shape[0]} dates x {panel.shape[1]} tickers saved to {panel_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+"""
+Columnar per-ticker price store.
+
+Every processing stage keeps its output as one compressed Parquet file per
+ticker instead of one giant multi-sheet workbook:
+
+    price_store/merged/<TICKER>.parquet   (was sve_dionice_merged.xlsx)
+    price_store/eur/<TICKER>.parquet      (was sve_dionice_merged_EUR.xlsx)
+    price_store/filled/<TICKER>.parquet   (was sve_dionice_merged_EUR_filled.xlsx)
+
+The PRICE_STORE_DIR environment variable moves the whole store (e.g. to a
+scratch directory), also for the scripts that use the default location.
+
+Analysis scripts use load_ticker()/list_tickers() instead of
+pd.ExcelFile(...).parse(sheet); reading only the needed columns of one ticker
+touches nothing else. Every calendar year of a file is its own row group, so
+a reader filtering on Date (pyarrow filters, the query.py SQL views) skips the
+other years from the row-group statistics. Excel export is kept as an optional
+last step for humans.
+
+Usage:
+    python scripts/price_store.py import [--all]            # stocks_raw_data/*.xlsx -> merged
+    python scripts/price_store.py export filled out.xlsx    # one sheet per ticker
+    python scripts/price_store.py list filled
+    python scripts/price_store.py rewrite filled            # regroup files written before the yearly row groups
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+
+# --- Configuration ---
+STORE_DIR = os.environ.get('PRICE_STORE_DIR') or os.path.join(ROOT_DIR, 'price_store')   # override for a scratch store
+RAW_DIR = os.path.join(ROOT_DIR, 'stocks_raw_data')
+STAGES = ('merged', 'eur', 'filled')
+DEFAULT_STAGE = 'filled'
+COMPRESSION = 'zstd'
+
+DATE_COL = 'Date'
+
+
+def stage_dir(stage, store_dir=STORE_DIR):
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage '{stage}', expected one of {STAGES}")
+    return os.path.join(store_dir, stage)
+
+
+def ticker_path(ticker, stage=DEFAULT_STAGE, store_dir=STORE_DIR):
+    return os.path.join(stage_dir(stage, store_dir), f'{ticker}.parquet')
+
+
+def list_tickers(stage=DEFAULT_STAGE, store_dir=STORE_DIR):
+    """Sorted tickers stored for a stage (the old workbook's sheet names)."""
+    directory = stage_dir(stage, store_dir)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(f[:-len('.parquet')] for f in os.listdir(directory) if f.endswith('.parquet'))
+
+
+def has_ticker(ticker, stage=DEFAULT_STAGE, store_dir=STORE_DIR):
+    return os.path.exists(ticker_path(ticker, stage, store_dir))
+
+
+def normalize_frame(df):
+    """Strips column names and stores Date as a real datetime column."""
+    df = df.copy()
+    df.columns = [str(c).strip() for c in df.columns]
+    if DATE_COL in df.columns:
+        df[DATE_COL] = pd.to_datetime(df[DATE_COL], errors='coerce')
+    return df
+
+
+def year_row_groups(df):
+    """(start, stop) row ranges of the runs of rows in the same Date year; one range without a Date column."""
+    if DATE_COL not in df.columns or not len(df):
+        return [(0, len(df))]
+    years = df[DATE_COL].dt.year.fillna(-1).to_numpy()
+    bounds = np.concatenate([[0], np.flatnonzero(years[1:] != years[:-1]) + 1, [len(df)]])
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def write_ticker(df, ticker, stage=DEFAULT_STAGE, store_dir=STORE_DIR):
+    """Writes one ticker's frame for a stage, one row group per year; the file is replaced atomically."""
+    directory = stage_dir(stage, store_dir)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.', suffix='.part', dir=directory)
+    os.close(fd)
+    try:
+        df = normalize_frame(df)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pq.ParquetWriter(tmp_path, table.schema, compression=COMPRESSION) as writer:
+            for start, stop in year_row_groups(df):
+                writer.write_table(table.slice(start, stop - start))
+        os.replace(tmp_path, ticker_path(ticker, stage, store_dir))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def ticker_columns(ticker, stage=DEFAULT_STAGE, store_dir=STORE_DIR):
+    """Column names stored for one ticker (read from the Parquet schema, no data)."""
+    return pq.read_schema(ticker_path(ticker, stage, store_dir)).names
+
+
+def load_ticker(ticker, stage=DEFAULT_STAGE, columns=None, store_dir=STORE_DIR, filters=None):
+    """
+    Loads one ticker's frame for a stage, optionally only the given columns
+    and only the rows matching pyarrow filters, e.g. [('Date', '>', day)].
+    Raises FileNotFoundError if the ticker is not in the store.
+    """
+    path = ticker_path(ticker, stage, store_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Ticker '{ticker}' not found in stage '{stage}' ({path})")
+    return pd.read_parquet(path, columns=columns, filters=filters)
+
+
+def load_stage(stage=DEFAULT_STAGE, columns=None, tickers=None, store_dir=STORE_DIR):
+    """Returns {ticker: frame} for a whole stage (or for the given tickers)."""
+    if tickers is None:
+        tickers = list_tickers(stage, store_dir)
+    return {t: load_ticker(t, stage, columns, store_dir) for t in tickers}
+
+
+def delete_ticker(ticker, stage=DEFAULT_STAGE, store_dir=STORE_DIR):
+    path = ticker_path(ticker, stage, store_dir)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def raw_files(raw_dir=RAW_DIR):
+    """{ticker: path} of the downloaded ZSE histories, e.g. VLEN-R-A_HRVLENRB0001.xlsx -> VLEN-R-A."""
+    return {f.split('_')[0]: os.path.join(raw_dir, f)
+            for f in sorted(os.listdir(raw_dir)) if f.endswith('.xlsx') and not f.startswith('.')}
+
+
+def frame_digest(df):
+    """Content hash of a parsed frame (independent of xlsx container metadata)."""
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+
+def import_raw(raw_dir=RAW_DIR, tickers=None, store_dir=STORE_DIR):
+    """
+    Replaces xlsx-merge.py: stores every raw xlsx as the 'merged' stage.
+    With tickers given only those are re-imported (e.g. the dirty list written
+    by downloader.py --sync). Files of the same security whose bytes or parsed
+    content are identical (VLEN vs VLEN-R-A) are stored once, under the
+    canonical symbol; with a subset, the stored tickers of its securities take
+    part in that check too. Returns the list of imported tickers.
+    """
+    from symbols import SymbolMaster, file_sha256
+
+    master = SymbolMaster.build(raw_dir=raw_dir)
+    files = raw_files(raw_dir)
+
+    def security_id(ticker):
+        sec = master.resolve(ticker)
+        return sec.isin if sec is not None else ticker
+
+    stored = set()
+    if tickers is not None:
+        wanted = set(tickers)
+        securities = {security_id(t) for t in files if t in wanted}
+        stored = {t for t in files if t not in wanted and security_id(t) in securities
+                  and has_ticker(t, 'merged', store_dir)}
+        files = {t: p for t, p in files.items() if t in wanted or t in stored}
+
+    def canonical_first(ticker):
+        sec = master.resolve(ticker)
+        return (sec is None or sec.symbol != ticker, ticker)
+
+    imported = []
+    seen_bytes = {}
+    seen_content = {}
+    for ticker in sorted(files, key=canonical_first):
+        path = files[ticker]
+        byte_key = (security_id(ticker), file_sha256(path))
+        if byte_key in seen_bytes:
+            print(f"{ticker} is a byte-identical copy of {seen_bytes[byte_key]}, stored once")
+            delete_ticker(ticker, 'merged', store_dir)
+            continue
+        seen_bytes[byte_key] = ticker
+        try:
+            df = pd.read_excel(path)
+        except Exception as e:
+            print(f"Skipping {os.path.basename(path)}: {e}")
+            continue
+        if df.empty:
+            continue
+        content_key = (security_id(ticker), frame_digest(df))
+        if content_key in seen_content:
+            print(f"{ticker} has the same data as {seen_content[content_key]}, stored once")
+            delete_ticker(ticker, 'merged', store_dir)
+            continue
+        seen_content[content_key] = ticker
+        if ticker in stored:
+            continue        # already in the store and not re-imported
+        write_ticker(df, ticker, 'merged', store_dir)
+        imported.append(ticker)
+    return imported
+
+
+def export_excel(stage, output_path, tickers=None, store_dir=STORE_DIR):
+    """Optional human-facing export: one sheet per ticker, like the old workbooks."""
+    if tickers is None:
+        tickers = list_tickers(stage, store_dir)
+    with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
+        for ticker in tickers:
+            load_ticker(ticker, stage, store_dir=store_dir).to_excel(writer, sheet_name=ticker[:31], index=False)
+    return output_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Per-ticker Parquet price store.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_import = sub.add_parser('import', help='import stocks_raw_data/*.xlsx into the merged stage')
+    p_import.add_argument('--raw-dir', default=RAW_DIR)
+    p_import.add_argument('--all', action='store_true', help='re-import everything, not only dirty tickers')
+    p_export = sub.add_parser('export', help='export a stage to a multi-sheet xlsx')
+    p_export.add_argument('stage', choices=STAGES)
+    p_export.add_argument('output')
+    p_list = sub.add_parser('list', help='list the tickers of a stage')
+    p_list.add_argument('stage', choices=STAGES)
+    p_rewrite = sub.add_parser('rewrite', help='rewrite the files of a stage with the current layout')
+    p_rewrite.add_argument('stage', nargs='+', choices=STAGES)
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        from downloader import load_dirty, pop_dirty
+        dirty = None
+        if not args.all and list_tickers('merged'):
+            dirty = load_dirty(args.raw_dir)
+        imported = import_raw(args.raw_dir, dirty)
+        pop_dirty(args.raw_dir)
+        print(f"Imported {len(imported)} tickers into {stage_dir('merged')}")
+    elif args.command == 'export':
+        print(f"Exported to {export_excel(args.stage, args.output)}")
+    elif args.command == 'rewrite':
+        for stage in args.stage:
+            tickers = list_tickers(stage)
+            for ticker in tickers:
+                write_ticker(load_ticker(ticker, stage), ticker, stage)
+            print(f"Rewrote {len(tickers)} tickers in {stage_dir(stage)}")
+    else:
+        print('\n'.join(list_tickers(args.stage)))
+
+
+if __name__ == '__main__':
+    main()
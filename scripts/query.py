@@ -0,0 +1,192 @@
+"""
+Embedded SQL over the price store, the membership timeline, the event files
+and the stored event-study results.
+
+Ad-hoc questions (one ticker's prices in a year, a pivot of one metric, the
+first price after every event, which events have stored CARs) no longer need
+a new script that reloads Excel: QueryLayer opens an embedded DuckDB database
+(in memory, or a local .duckdb file with --database; no server) with
+
+    prices              the price_store stage (default filled), one row per
+                        stored row plus a ticker column taken from the file name
+    prices_<stage>      the same for every stage in the store (merged, eur, filled)
+    membership          MembershipIndex intervals (security, symbol, start, end, ...)
+                        with the stored ticker of the symbol
+    events              both event files (sweep.load_events) with Group and the
+                        stored ticker of the symbol
+    event_results       the results_store tables of results.sqlite
+    event_ar, event_est
+    live_ar
+
+The prices views read the Parquet files in place. A predicate on ticker picks
+the files by name, and a Date range skips the row groups of the other years
+(price_store writes one row group per year), so a single-ticker, single-year
+query reads one row group of one file. Compare Date itself (Date >= ... AND
+Date < ...); a function of it such as year(Date) is not pushed down. Files
+written before the yearly row groups are regrouped with price_store.py rewrite.
+
+membership and events are built in Python and handed over as Arrow tables. The
+results tables are attached read-only through DuckDB's sqlite extension when it
+is installed, otherwise copied in through sqlite3 when the layer opens. Query
+results come back as Arrow tables (arrow()) or as pandas frames on the same
+Arrow buffers (df(), ArrowDtype columns, no copy through NumPy):
+
+    layer = QueryLayer()
+    layer.df("SELECT Date, \"Last Price\" FROM prices WHERE ticker = ? "
+             "AND Date >= '2020-01-01' AND Date < '2021-01-01'", ['ADPL'])
+    layer.df('PIVOT (SELECT ticker, Date, "Last Price" FROM prices) ON ticker USING first("Last Price")')
+    layer.df('SELECT e.Group, e.ticker, e.EventDate, p.Date, p."Last Price" FROM events e '
+             'ASOF JOIN prices p ON e.ticker = p.ticker AND e.EventDate <= p.Date')   # first price on/after
+
+Usage:
+    python scripts/query.py                                  # list the relations
+    python scripts/query.py "SELECT ticker, count(*) AS days FROM prices GROUP BY ticker ORDER BY ticker"
+    python scripts/query.py --explain "SELECT * FROM prices WHERE ticker = 'ADPL' AND Date BETWEEN '2020-01-01' AND '2020-12-31'"
+    python scripts/query.py --stage eur --output out.csv "SELECT * FROM membership"
+"""
+import argparse
+import os
+import sqlite3
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+import price_store
+import results_store
+import sweep
+import symbols
+from membership import MembershipIndex
+
+# --- Configuration ---
+RESULT_TABLES = ('event_results', 'event_ar', 'event_est', 'live_ar')
+
+_PRICES_SQL = ("SELECT parse_filename(filename, true) AS ticker, * EXCLUDE (filename) "
+               "FROM read_parquet({glob}, filename = true, union_by_name = true)")
+
+
+def _literal(text):
+    """SQL string literal (paths in DDL cannot be bound as parameters)."""
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+class QueryLayer:
+
+    def __init__(self, database=':memory:', stage=price_store.DEFAULT_STAGE, store_dir=price_store.STORE_DIR,
+                 results_db=results_store.RESULTS_DB, master=None):
+        self.stage = stage
+        # never reach for the network: extensions are used only if already installed
+        self.con = duckdb.connect(database, config={'autoinstall_known_extensions': False})
+        self.con.execute('LOAD parquet')
+        self.con.execute('SET parquet_metadata_cache = true')
+
+        master = master or symbols.load_master()
+        tickers = set(price_store.list_tickers(stage, store_dir))
+        self._prices(stage, store_dir)
+        self._membership(master, tickers)
+        self._events(master, tickers)
+        self._results(results_db)
+
+    def close(self):
+        self.con.close()
+
+    # --- Relations ---
+    def _create(self, name, select, kind='VIEW'):
+        """(Re)creates a view or table as select, whatever name was before (a --database file keeps them)."""
+        old = self.con.execute("SELECT table_type FROM information_schema.tables WHERE table_catalog = "
+                               "current_database() AND table_schema = 'main' AND table_name = ?", [name]).fetchall()
+        if old:
+            self.con.execute(f"DROP {'VIEW' if old[0][0] == 'VIEW' else 'TABLE'} {name}")
+        self.con.execute(f'CREATE {kind} {name} AS {select}')
+
+    def _table(self, name, frame):
+        """Copies a pandas frame into a table through Arrow."""
+        self.con.register('_frame', pa.Table.from_pandas(frame, preserve_index=False))
+        try:
+            self._create(name, 'SELECT * FROM _frame', 'TABLE')
+        finally:
+            self.con.unregister('_frame')
+
+    def _prices(self, stage, store_dir):
+        for name in price_store.STAGES:
+            if price_store.list_tickers(name, store_dir):
+                glob = os.path.join(price_store.stage_dir(name, store_dir), '*.parquet')
+                self._create(f'prices_{name}', _PRICES_SQL.format(glob=_literal(glob)))
+        if price_store.list_tickers(stage, store_dir):
+            self._create('prices', f'SELECT * FROM prices_{stage}')
+
+    def _membership(self, master, tickers):
+        intervals = MembershipIndex.from_files(master=master).intervals
+        self._table('membership', intervals.assign(ticker=[master.sheet(s, tickers) or s for s in intervals['symbol']]))
+
+    def _events(self, master, tickers):
+        events = sweep.load_events()
+        self._table('events', events.assign(ticker=[master.sheet(s, tickers) or s for s in events['Symbol']]))
+
+    def _results(self, path):
+        if not os.path.exists(path):
+            return
+        try:
+            self.con.execute(f'ATTACH {_literal(path)} AS results (TYPE sqlite, READ_ONLY)')
+        except duckdb.Error:
+            # sqlite extension not installed (no download here): copy the tables in
+            conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+            try:
+                for table in RESULT_TABLES:
+                    self._table(table, pd.read_sql_query(f'SELECT * FROM {table}', conn))
+            finally:
+                conn.close()
+            return
+        for table in RESULT_TABLES:
+            self._create(table, f'SELECT * FROM results.{table}')
+
+    def relations(self):
+        """Name and kind (VIEW / BASE TABLE) of every queryable relation."""
+        return self.df("SELECT table_name AS name, table_type AS kind FROM information_schema.tables "
+                       "WHERE table_catalog = current_database() AND table_schema = 'main' ORDER BY name")
+
+    # --- Queries ---
+    def arrow(self, sql, params=None):
+        """Result of a query as a pyarrow Table."""
+        return self.con.execute(sql, params).to_arrow_table()
+
+    def df(self, sql, params=None):
+        """Result of a query as a pandas frame on the Arrow buffers (ArrowDtype columns, no copy)."""
+        return self.arrow(sql, params).to_pandas(types_mapper=pd.ArrowDtype)
+
+    def explain(self, sql, params=None):
+        """Executed plan of a query: files scanned, filters pushed into the Parquet scan, timings."""
+        return self.con.execute(f'EXPLAIN ANALYZE {sql}', params).fetchall()[0][1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='SQL over the price store, membership, events and stored results.')
+    parser.add_argument('sql', nargs='?', help='query to run; without one the relations are listed')
+    parser.add_argument('--stage', choices=price_store.STAGES, default=price_store.DEFAULT_STAGE,
+                        help='stage behind the prices view')
+    parser.add_argument('--database', default=':memory:', help='local .duckdb file to keep the relations in')
+    parser.add_argument('--results', default=results_store.RESULTS_DB)
+    parser.add_argument('--explain', action='store_true', help='print the executed plan instead of the result')
+    parser.add_argument('--output', help='csv to write the result to')
+    args = parser.parse_args(argv)
+
+    layer = QueryLayer(args.database, args.stage, results_db=args.results)
+    try:
+        if args.sql is None:
+            print(layer.relations().to_string(index=False))
+        elif args.explain:
+            print(layer.explain(args.sql))
+        else:
+            result = layer.df(args.sql)
+            if args.output:
+                result.to_csv(args.output, index=False)
+                print(f"{len(result)} rows written to {args.output}")
+            else:
+                print(result.to_string(index=False))
+    finally:
+        layer.close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,252 @@
+"""
+Bootstrap and placebo-date resampling of CAAR significance.
+
+Builds empirical null / sampling distributions of the CAAR of every CAR
+window instead of relying on the normal approximation of the parametric
+tests (thin ZSE trading and a few large outliers, e.g. DDJH, make the
+cross-section far from normal):
+
+    bootstrap   resamples the observed events with replacement (or whole
+                event dates with --unit date, keeping same-day events
+                together) and recomputes the CAAR; p-values come from the
+                bootstrap distribution centred on the observed CAAR
+    placebo     moves every event date to a random trading day of the
+                market calendar (events sharing a date keep sharing one),
+                re-estimates the normal-return model and recomputes the
+                CAAR; p-values are the share of placebo CAARs at least as
+                extreme as the observed one
+
+Replicates are drawn in batches: a batch is one vectorized draw (one index
+matrix for the bootstrap, one EventWindows of batch x events pseudo-events
+for the placebo), batches are spread over a process pool and every batch has
+its own seed spawned from one SeedSequence, so the replicates do not depend
+on the number of workers. Batch results are written into a preallocated
+(reps, windows) buffer as they arrive (a .npy memmap when saving), so
+memory stays bounded by one batch per worker.
+
+Output (in OUTPUT_DIR):
+    summary.csv             kind, window, observed CAAR, N, replicate mean / std,
+                            2.5% / 97.5% quantiles, p-value
+    <kind>_replicates.npy   reps x windows replicate CAARs
+
+Usage:
+    python scripts/resampling.py
+    python scripts/resampling.py --group deleted --reps 20000 --kind placebo --unit date --jobs 8
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import market_model
+import sweep
+from car_cache import CarCache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+
+# --- Configuration ---
+CAR_WINDOWS = [(-1, 1), (-5, 5), (0, 10), (-10, 10)]
+REPLICATIONS = 10000
+BATCH_SIZE = 250            # replicates per vectorized draw
+SEED = 12345
+MAX_WORKERS = 4
+OUTPUT_DIR = os.path.join(ROOT_DIR, 'resampling_results')
+KINDS = ('bootstrap', 'placebo')
+
+
+def replicate_caar(cars):
+    """(reps, events, windows) CARs -> (reps, windows) CAARs over the finite CARs."""
+    n = np.isfinite(cars).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n > 0, np.nansum(cars, axis=1) / n, np.nan)
+
+
+def window_cars(ar, pre, windows):
+    """(events, windows) CARs of an (events, days) abnormal-return array."""
+    t1 = np.array([w[0] for w in windows])
+    t2 = np.array([w[1] for w in windows])
+    return CarCache(ar, pre).car(np.arange(len(ar))[:, None], t1[None, :], t2[None, :])
+
+
+class Study:
+    """
+    Everything a worker needs to draw replicates of one event study: the
+    aligned returns, the observed events that entered the CAAR (ticker ids,
+    event-date cluster) and their CARs, and the study setup.
+    """
+
+    def __init__(self, aligned, events, est_days, pre, post, gap, model, min_obs, windows):
+        self.aligned = aligned
+        self.est_days, self.pre, self.post, self.gap = est_days, pre, post, gap
+        self.model, self.min_obs = model, min_obs
+        self.windows = list(windows)
+
+        event_windows = market_model.event_windows(events, None, None, est_days, pre, post, gap, aligned=aligned)
+        fit = market_model.MODELS[model](event_windows, min_obs)
+        _, ok, ar = market_model.fitted_ar(event_windows, fit)
+        self.ids = np.array([aligned.ticker_id[s] for s in events['Symbol'][ok]], dtype=np.int64)
+        self.cars = window_cars(ar[ok], pre, self.windows)
+        self.observed = replicate_caar(self.cars[None])[0]
+        self.n_events = np.isfinite(self.cars).sum(axis=0)
+        # resampling / placebo unit: the actual event date
+        _, self.cluster = np.unique(event_windows.event_dates()[ok], return_inverse=True)
+        self.n_clusters = int(self.cluster.max()) + 1 if len(self.cluster) else 0
+
+        # placebo dates: common trading days between the first and the last observed event
+        calendar = np.unique(aligned.dates)
+        actual = event_windows.event_dates()[ok]
+        if len(actual):
+            calendar = calendar[(calendar >= actual.min()) & (calendar <= actual.max())]
+        self.calendar = calendar
+
+    def bootstrap(self, rng, reps, unit='event'):
+        """reps bootstrap CAARs; unit 'date' resamples whole event dates."""
+        finite = np.isfinite(self.cars)
+        if unit == 'event':
+            sums, counts = np.where(finite, self.cars, 0.0), finite.astype(np.int64)
+        else:
+            sums = np.zeros((self.n_clusters, len(self.windows)))
+            counts = np.zeros((self.n_clusters, len(self.windows)), dtype=np.int64)
+            np.add.at(sums, self.cluster, np.where(finite, self.cars, 0.0))
+            np.add.at(counts, self.cluster, finite)
+        draw = rng.integers(0, len(sums), size=(reps, len(sums)))
+        n = counts[draw].sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(n > 0, sums[draw].sum(axis=1) / n, np.nan)
+
+    def placebo(self, rng, reps):
+        """reps placebo CAARs: one random trading day per event-date cluster per replicate."""
+        days = self.calendar[rng.integers(0, len(self.calendar), size=(reps, self.n_clusters))]
+        dates = days[:, self.cluster].ravel()
+        ids = np.tile(self.ids, reps)
+        loc = self.aligned.locate_ids(ids, dates)
+        windows = market_model.EventWindows(self.aligned, ids, loc, self.est_days, self.pre, self.post, self.gap)
+        fit = market_model.MODELS[self.model](windows, self.min_obs)
+        _, _, ar = market_model.fitted_ar(windows, fit)
+        cars = window_cars(ar, self.pre, self.windows)
+        return replicate_caar(cars.reshape(reps, len(self.ids), len(self.windows)))
+
+
+# --- Worker state: one Study per process ---
+_STATE = {}
+
+
+def _init_worker(study):
+    _STATE['study'] = study
+
+
+def _run_batch(kind, seed, reps, unit):
+    study = _STATE['study']
+    rng = np.random.default_rng(seed)
+    if kind == 'bootstrap':
+        return study.bootstrap(rng, reps, unit)
+    return study.placebo(rng, reps)
+
+
+def batch_plan(reps, batch_size, seed):
+    """(first row, size, seed) of every batch; seeds are spawned from one SeedSequence."""
+    sizes = [min(batch_size, reps - start) for start in range(0, reps, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    return list(zip(range(0, reps, batch_size), sizes, seeds))
+
+
+def resample(study, kind, reps=REPLICATIONS, batch_size=BATCH_SIZE, seed=SEED, workers=MAX_WORKERS,
+             unit='event', path=None):
+    """
+    (reps, windows) replicate CAARs of one kind, streamed batch by batch into
+    a preallocated buffer (a .npy memmap at path if given).
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown resampling kind '{kind}', expected one of {KINDS}")
+    shape = (reps, len(study.windows))
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=float, shape=shape) if path else np.empty(shape)
+    plan = batch_plan(reps, batch_size, seed)
+    args = ([kind] * len(plan), [s for _, _, s in plan], [n for _, n, _ in plan], [unit] * len(plan))
+    if workers <= 1:
+        _init_worker(study)
+        results = map(_run_batch, *args)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(study,))
+        results = pool.map(_run_batch, *args)
+    try:
+        for (start, n, _), caar in zip(plan, results):
+            out[start:start + n] = caar
+    finally:
+        if workers > 1:
+            pool.shutdown()
+    if path:
+        out.flush()
+    return out
+
+
+def summarize(study, kind, replicates):
+    """One row per window: observed CAAR, replicate moments and quantiles, empirical p-value."""
+    rows = []
+    for k, (t1, t2) in enumerate(study.windows):
+        draws = replicates[:, k]
+        draws = draws[np.isfinite(draws)]
+        observed = study.observed[k]
+        # bootstrap: H0 CAAR = 0 via the distribution centred on the observed CAAR
+        centre = observed if kind == 'bootstrap' else 0.0
+        extreme = np.count_nonzero(np.abs(draws - centre) >= abs(observed))
+        rows.append({'kind': kind, 'window': f'CAR({t1:+d},{t2:+d})', 'CAAR': observed,
+                     'N': int(study.n_events[k]), 'reps': len(draws),
+                     'mean': draws.mean() if len(draws) else np.nan,
+                     'std': draws.std(ddof=1) if len(draws) > 1 else np.nan,
+                     'q025': np.quantile(draws, 0.025) if len(draws) else np.nan,
+                     'q975': np.quantile(draws, 0.975) if len(draws) else np.nan,
+                     'p_value': (extreme + 1) / (len(draws) + 1)})
+    return rows
+
+
+def load_study(group='inserted', anchor='effective', benchmark='CBX', est_days=market_model.ESTIMATION_DAYS,
+               pre=market_model.EVENT_WINDOW_PRE, post=market_model.EVENT_WINDOW_POST,
+               gap=market_model.GAP_DAYS, model='market', min_obs=market_model.MIN_OBS, windows=CAR_WINDOWS,
+               stage=sweep.STOCK_STAGE):
+    """Study of one event group ('inserted', 'deleted' or 'all') from the price store."""
+    stocks, events = sweep.load_study(stage)
+    if group != 'all':
+        events = events[events['Group'] == group]
+    events = events.dropna(subset=[sweep.ANCHORS[anchor]]).reset_index(drop=True)
+    events = events.assign(EventDate=events[sweep.ANCHORS[anchor]])
+    aligned = market_model.AlignedReturns(stocks, sweep.benchmark_returns(benchmark, stocks), events['Symbol'])
+    return Study(aligned, events, est_days, pre, post, gap, model, min_obs, windows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bootstrap and placebo-date distributions of CAAR.')
+    parser.add_argument('--group', choices=list(sweep.EVENT_FILES) + ['all'], default='inserted')
+    parser.add_argument('--anchor', choices=sorted(sweep.ANCHORS), default='effective')
+    parser.add_argument('--benchmark', choices=sweep.BENCHMARKS, default='CBX')
+    parser.add_argument('--model', choices=sorted(market_model.MODELS), default='market')
+    parser.add_argument('--kind', nargs='+', choices=KINDS, default=list(KINDS))
+    parser.add_argument('--unit', choices=['event', 'date'], default='event', help='bootstrap resampling unit')
+    parser.add_argument('--reps', type=int, default=REPLICATIONS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--jobs', type=int, default=MAX_WORKERS)
+    parser.add_argument('--output', default=OUTPUT_DIR)
+    args = parser.parse_args(argv)
+
+    study = load_study(args.group, args.anchor, args.benchmark, model=args.model)
+    print(f"{len(study.ids)} events, {study.n_clusters} event dates, {len(study.calendar)} placebo days")
+    os.makedirs(args.output, exist_ok=True)
+    rows = []
+    for kind in args.kind:
+        start = time.time()
+        replicates = resample(study, kind, args.reps, args.batch_size, args.seed, args.jobs, args.unit,
+                              os.path.join(args.output, f'{kind}_replicates.npy'))
+        print(f"{kind}: {args.reps} replicates in {time.time() - start:.1f}s")
+        rows.extend(summarize(study, kind, replicates))
+    summary = pd.DataFrame(rows)
+    summary.to_csv(os.path.join(args.output, 'summary.csv'), index=False)
+    print(summary.to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
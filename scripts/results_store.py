@@ -0,0 +1,390 @@
+"""
+Persistent store of event-study results in one SQLite file.
+
+car-testing.py and CAR_analysys.py recomputed every event on every run and
+left their output in commented-out to_csv calls. The store keeps every
+scored event under the key
+
+    (Group, Symbol, EventDate, model, event_window, params, version)
+
+Group is the event type ('inserted' / 'deleted', '' for events without one),
+so a stock inserted and deleted on the same day (ULPL 2019-03-18) keeps two
+results. event_window is '[-pre,+post]', params the rest of the setup as JSON
+(estimation days, gap, min_obs, benchmark, ...) and version a hash of
+exactly the data the event's result depends on: the dates, stock and
+benchmark returns of its estimation and event window, one day wider on each
+side for the lag / lead models. New price rows after the window or a fix
+elsewhere in the history keep the version; a corrected price inside the
+window gives a new key, so the event is recomputed. Old versions are kept,
+so earlier runs stay queryable.
+
+    event_results   one row per key: EventDateActual, status, alpha, beta,
+                    sigma2, n_obs, CAR, days, created
+    event_ar        the event-window path of every scored key: DayOffset,
+                    Date, AR, CAR and the prediction-error correction
+    event_est       the estimation residuals of every scored key: pos, Date, resid
+    live_ar         the running paths of live_events.py, one row per event
+                    and day offset, replaced as the window fills
+
+event_study() is the memoized market_model.event_study: it looks the events
+up, fits the model only for the missing or invalidated ones, stores them and
+rebuilds (result, ar, tests) from the stored rows, EventTests included:
+
+    store = ResultsStore()
+    result, ar, tests = event_study(events, stocks, market_returns, store, benchmark='crobex_csv')
+    store.query("SELECT Symbol, EventDate, CAR FROM event_results WHERE model = ? AND status = 'ok'", ['market'])
+
+car-testing.py keys its market-adjusted paths the same way (row_versions of
+the window's dates, stock and CBX returns), checks them with cached() and
+computes and save_paths() only the new ones before reading paths() back.
+
+Usage:
+    python scripts/results_store.py summary
+    python scripts/results_store.py query "SELECT * FROM event_results WHERE Symbol = 'RIVP'"
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import market_model
+from event_tests import EventTests
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+
+# --- Configuration ---
+RESULTS_DB = os.path.join(ROOT_DIR, 'results.sqlite')
+VERSION_MARGIN = 1      # extra days hashed on each side of an event's rows (Scholes-Williams / Dimson lags)
+
+KEY_COLUMNS = ['Group', 'Symbol', 'EventDate', 'model', 'event_window', 'params', 'version']
+_KEY_SQL = '"Group" TEXT NOT NULL, Symbol TEXT NOT NULL, EventDate TEXT NOT NULL, model TEXT NOT NULL, ' \
+           'event_window TEXT NOT NULL, params TEXT NOT NULL, version TEXT NOT NULL'
+_KEY_LIST = ', '.join(f'"{c}"' for c in KEY_COLUMNS)
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS event_results (
+    {_KEY_SQL}, EventDateActual TEXT, status TEXT, alpha REAL, beta REAL, sigma2 REAL,
+    n_obs INTEGER, CAR REAL, days INTEGER, created TEXT,
+    PRIMARY KEY ({_KEY_LIST}));
+CREATE TABLE IF NOT EXISTS event_ar (
+    {_KEY_SQL}, DayOffset INTEGER NOT NULL, Date TEXT, AR REAL, CAR REAL, correction REAL,
+    PRIMARY KEY ({_KEY_LIST}, DayOffset)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS event_est (
+    {_KEY_SQL}, pos INTEGER NOT NULL, Date TEXT, resid REAL,
+    PRIMARY KEY ({_KEY_LIST}, pos)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS live_ar (
+    "Group" TEXT NOT NULL, Symbol TEXT NOT NULL, EventDate TEXT NOT NULL, model TEXT NOT NULL,
+    params TEXT NOT NULL, DayOffset INTEGER NOT NULL, Date TEXT, AR REAL, CAR REAL, provisional INTEGER,
+    as_of TEXT, PRIMARY KEY ("Group", Symbol, EventDate, model, params, DayOffset)) WITHOUT ROWID;
+"""
+
+
+def _day(value):
+    """'YYYY-MM-DD' of a date, None for NaT."""
+    return None if pd.isna(value) else str(pd.Timestamp(value).date())
+
+
+def _day_numbers(days):
+    """'YYYY-MM-DD' strings of float day numbers (days since 1970-01-01, NaN -> None)."""
+    days = np.asarray(days, dtype=float)
+    out = np.full(days.shape, None, dtype=object)
+    finite = np.isfinite(days)
+    out[finite] = np.datetime_as_string(days[finite].astype(np.int64).astype('datetime64[D]'))
+    return out
+
+
+def _dates(dates):
+    """'YYYY-MM-DD' strings of datetime64 values (NaT -> None)."""
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    out = np.full(dates.shape, None, dtype=object)
+    known = ~np.isnat(dates)
+    out[known] = np.datetime_as_string(dates[known])
+    return out
+
+
+def data_version(*arrays):
+    """Short SHA-256 of the bytes of some arrays."""
+    h = hashlib.sha256()
+    for values in arrays:
+        h.update(np.ascontiguousarray(values).tobytes())
+    return h.hexdigest()[:16]
+
+
+def row_versions(*arrays):
+    """data_version of every row of some equally long 2-D arrays (e.g. the cells of EventPanels)."""
+    return [data_version(*(values[i] for values in arrays)) for i in range(len(arrays[0]))]
+
+
+def window_versions(windows, margin=VERSION_MARGIN):
+    """
+    Data version of every event of market_model EventWindows: the hash of the
+    dates, stock and benchmark returns of its ticker's rows from the start of
+    the estimation window to the end of the event window (plus margin days),
+    clipped to the ticker's data; '' for events without a ticker.
+    """
+    aligned = windows.aligned
+    first = windows.local['est'][:, 0] - margin
+    stop = windows.loc + windows.post + 1 + margin
+    versions = []
+    for has, base, length, lo, hi in zip(windows.has_ticker, windows.base, windows.length, first, stop):
+        if not has:
+            versions.append('')
+            continue
+        a, b = base + max(lo, 0), base + max(min(hi, length), max(lo, 0))
+        versions.append(data_version(aligned.dates[a:b], aligned.stock[a:b], aligned.market[a:b]))
+    return versions
+
+
+class ResultsStore:
+
+    def __init__(self, path=RESULTS_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self._upgrade()
+        self.conn.executescript(SCHEMA)
+
+    def _upgrade(self):
+        """Moves the rows of a store written before Group was part of the key into the current tables."""
+        layout = {row[1]: row[5] for row in self.conn.execute('PRAGMA table_info(event_results)')}
+        if not layout or layout.get('Group'):
+            return
+        old_key = ', '.join(f'"{c}"' for c in KEY_COLUMNS if c != 'Group')
+        rest = ', '.join(f'"{c}"' for c in layout if c not in KEY_COLUMNS)
+        tables = ('event_results', 'event_ar', 'event_est')
+        script = ['BEGIN'] + [f'ALTER TABLE {t} RENAME TO _old_{t}' for t in tables] + [SCHEMA.strip().rstrip(';')]
+        script.append(f'INSERT INTO event_results ({_KEY_LIST}, {rest}) '
+                      f'SELECT COALESCE("Group", \'\'), {old_key}, {rest} FROM _old_event_results')
+        script += [f'INSERT OR REPLACE INTO {t} SELECT COALESCE(r."Group", \'\'), o.* '
+                   f'FROM _old_{t} o JOIN _old_event_results r USING ({old_key})' for t in tables[1:]]
+        script += [f'DROP TABLE _old_{t}' for t in tables] + ['COMMIT']
+        try:
+            self.conn.executescript(';\n'.join(script) + ';')
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+    def close(self):
+        self.conn.close()
+
+    # --- Writing ---
+    def _insert(self, table, frame):
+        if not len(frame):
+            return
+        columns = ', '.join(f'"{c}"' for c in frame.columns)
+        marks = ', '.join('?' * len(frame.columns))
+        rows = frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None)
+        self.conn.executemany(f'INSERT OR REPLACE INTO {table} ({columns}) VALUES ({marks})', rows)
+
+    def save(self, results, ar=None, est=None):
+        """Stores event_results rows and optionally their event_ar / event_est rows in one transaction."""
+        with self.conn:
+            self._insert('event_results', results.assign(created=str(pd.Timestamp.now().floor('s'))))
+            if ar is not None:
+                self._insert('event_ar', ar)
+            if est is not None:
+                self._insert('event_est', est)
+
+    def save_paths(self, events, ar, pre, model, params, versions, dates=None, group_col='Group'):
+        """
+        Stores ready-made AR paths (events x offsets from -pre) of studies
+        without an estimation window (e.g. car-testing.py). versions are the
+        data versions of the inputs each path was computed from (row_versions
+        of the window's dates and returns), so a rerun can look the events up
+        before computing. events has Symbol, EventDate and optionally
+        EventDateActual and group_col; dates are the datetime64 dates of the
+        cells (NaT outside the data).
+        """
+        ar = np.asarray(ar, dtype=float)
+        offsets = np.arange(-pre, ar.shape[1] - pre)
+        dates = np.full(ar.shape, np.datetime64('NaT'), dtype='datetime64[D]') if dates is None else dates
+        keys = self.keys(events, model, (-pre, offsets[-1]), params, versions, group_col)
+        finite = np.isfinite(ar)
+        car = np.cumsum(np.where(finite, ar, 0.0), axis=1)
+        results = keys.assign(**{'EventDateActual': [_day(d) for d in events['EventDateActual']]
+                                 if 'EventDateActual' in events.columns else None,
+                                 'status': np.where(finite.any(axis=1), market_model.OK, market_model.NO_DATA),
+                                 'CAR': np.where(finite.any(axis=1), car[:, -1], np.nan),
+                                 'days': finite.sum(axis=1)})
+        rows, cols = np.nonzero(finite)
+        path = keys.iloc[rows].reset_index(drop=True).assign(
+            DayOffset=offsets[cols], Date=_dates(np.asarray(dates)[rows, cols]), AR=ar[rows, cols],
+            CAR=car[rows, cols])
+        self.save(results, path)
+        return keys
+
+    def save_live(self, rows, params):
+        """Upserts live_events.py rows (one per event and day offset)."""
+        with self.conn:
+            self._insert('live_ar', rows.assign(params=params, provisional=rows['provisional'].astype(int)))
+
+    # --- Reading ---
+    @staticmethod
+    def keys(events, model, window, params, versions, group_col='Group'):
+        """Key frame (KEY_COLUMNS) of events with Symbol, EventDate and optionally group_col."""
+        group = events[group_col].fillna('').astype(str).to_numpy() if group_col in events.columns else ''
+        return pd.DataFrame({'Group': group, 'Symbol': events['Symbol'].to_numpy(),
+                             'EventDate': [_day(d) for d in events['EventDate']],
+                             'model': model, 'event_window': f'[{window[0]:+d},{window[1]:+d}]',
+                             'params': json.dumps(params, sort_keys=True), 'version': list(versions)})
+
+    def _join(self, table, keys, columns='*'):
+        """Rows of table matching the keys, through a temporary key table."""
+        with self.conn:
+            self.conn.execute('DROP TABLE IF EXISTS temp._wanted')
+            self.conn.execute(f'CREATE TEMP TABLE _wanted ({_KEY_SQL})')
+            self._insert('temp._wanted', keys[KEY_COLUMNS].drop_duplicates())
+        try:
+            return self.query(f'SELECT {columns} FROM {table} JOIN temp._wanted USING ({_KEY_LIST})')
+        finally:
+            self.conn.execute('DROP TABLE IF EXISTS temp._wanted')
+
+    def lookup(self, keys, table='event_results'):
+        """Stored rows of table (event_results, event_ar or event_est) for the keys."""
+        return self._join(table, keys, f'{table}.*')
+
+    def cached(self, keys):
+        """Boolean array: which keys already have an event_results row."""
+        known = self.lookup(keys)[KEY_COLUMNS].drop_duplicates().assign(_hit=True)
+        return keys[KEY_COLUMNS].merge(known, on=KEY_COLUMNS, how='left')['_hit'].notna().to_numpy()
+
+    def paths(self, keys, pre, post):
+        """(ar, dates) arrays (keys x offsets -pre .. +post) of the stored event_ar rows; NaN / NaT where none."""
+        width = pre + post + 1
+        ar = np.full((len(keys), width), np.nan)
+        dates = np.full((len(keys), width), np.datetime64('NaT'), dtype='datetime64[D]')
+        rows = keys[KEY_COLUMNS].reset_index(drop=True).reset_index().merge(self.lookup(keys, 'event_ar'),
+                                                                            on=KEY_COLUMNS)
+        i, j = rows['index'].to_numpy(), rows['DayOffset'].to_numpy(dtype=np.int64) + pre
+        ar[i, j] = rows['AR'].to_numpy(dtype=float)
+        dates[i, j] = pd.to_datetime(rows['Date']).to_numpy(dtype='datetime64[D]')
+        return ar, dates
+
+    def query(self, sql, params=()):
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def summary(self):
+        return self.query('SELECT model, event_window, params, status, COUNT(*) AS events, '
+                          'COUNT(DISTINCT version) AS versions, MAX(created) AS last_run '
+                          'FROM event_results GROUP BY model, event_window, params, status '
+                          'ORDER BY model, event_window, params, status')
+
+
+# --- Memoized event study ---
+def _store_fresh(store, keys, events, windows, result, fit):
+    """Stores freshly scored events with their paths and estimation residuals."""
+    tests = EventTests.from_fit(windows, fit)
+    ok = np.flatnonzero(tests.ok)
+    ar, est = tests.ar[ok], tests.est_resid[ok]
+    car = np.cumsum(np.nan_to_num(ar), axis=1)
+    car_total, days = np.full(len(keys), np.nan), np.zeros(len(keys), dtype=np.int64)
+    car_total[ok], days[ok] = car[:, -1], np.isfinite(ar).sum(axis=1)
+    results = keys.assign(**{'EventDateActual': [_day(d) for d in result['EventDateActual']],
+                             'status': result['status'].to_numpy(), 'alpha': result['alpha'].to_numpy(),
+                             'beta': result['beta'].to_numpy(), 'sigma2': result['sigma2'].to_numpy(),
+                             'n_obs': result['n_obs'].to_numpy(), 'CAR': car_total, 'days': days})
+    n_ar, n_est = ar.shape[1], est.shape[1]
+    path = keys.iloc[np.repeat(ok, n_ar)].reset_index(drop=True).assign(
+        DayOffset=np.tile(tests.offsets, len(ok)), Date=_day_numbers(windows.days('ev')[ok].ravel()),
+        AR=ar.ravel(), CAR=car.ravel(), correction=tests.correction[ok].ravel())
+    residuals = keys.iloc[np.repeat(ok, n_est)].reset_index(drop=True).assign(
+        pos=np.tile(np.arange(n_est), len(ok)), Date=_day_numbers(windows.days('est')[ok].ravel()),
+        resid=est.ravel())
+    store.save(results, path, residuals)
+
+
+def _rebuild(store, keys, events, model, pre, post, est_days):
+    """(result, ar, tests) of the events from their stored rows."""
+    stored = store.lookup(keys).drop_duplicates(KEY_COLUMNS)
+    row = keys[KEY_COLUMNS].merge(stored, on=KEY_COLUMNS, how='left')
+    result = events.copy()
+    result['EventDateActual'] = pd.to_datetime(row['EventDateActual'].to_numpy())
+    for col in ('alpha', 'beta', 'sigma2'):
+        result[col] = row[col].to_numpy(dtype=float)
+    result['n_obs'] = row['n_obs'].to_numpy()
+    result['model'] = model
+    result['status'] = row['status'].to_numpy()
+    ok = (result['status'] == market_model.OK).to_numpy()
+
+    def stored_rows(table):
+        """(event row, stored rows) pairs of a path table; an event listed twice gets its rows twice."""
+        rows = keys[KEY_COLUMNS].reset_index().merge(store.lookup(keys[ok], table), on=KEY_COLUMNS)
+        return rows['index'].to_numpy(), rows
+
+    width = pre + post + 1
+    ar = np.full((len(keys), width), np.nan)
+    correction = np.ones((len(keys), width))
+    i, path = stored_rows('event_ar')
+    j = path['DayOffset'].to_numpy(dtype=np.int64) + pre
+    ar[i, j] = path['AR'].to_numpy(dtype=float)
+    correction[i, j] = path['correction'].to_numpy(dtype=float)
+
+    est_resid = np.full((len(keys), est_days), np.nan)
+    est_day = np.full((len(keys), est_days), np.nan)
+    i, residuals = stored_rows('event_est')
+    j = residuals['pos'].to_numpy(dtype=np.int64)
+    est_resid[i, j] = residuals['resid'].to_numpy(dtype=float)
+    dates = pd.to_datetime(residuals['Date']).to_numpy(dtype='datetime64[D]')
+    est_day[i, j] = np.where(np.isnat(dates), np.nan, dates.astype(np.int64))
+
+    day0 = result['EventDateActual'].to_numpy(dtype='datetime64[D]')
+    cluster = np.where(np.isnat(day0), -1, day0.astype(np.int64))
+    tests = EventTests(est_resid, ar, np.arange(-pre, post + 1), np.sqrt(result['sigma2'].to_numpy(dtype=float)),
+                       correction, ok, est_day, cluster)
+    return result, ar, tests
+
+
+def event_study(events, stock_index, market_returns, store=None, benchmark='', est_days=market_model.ESTIMATION_DAYS,
+                pre=market_model.EVENT_WINDOW_PRE, post=market_model.EVENT_WINDOW_POST, gap=market_model.GAP_DAYS,
+                min_obs=market_model.MIN_OBS, model='market', aligned=None):
+    """
+    Memoized event study: (result, ar, tests) as market_model.event_study plus
+    event_tests.EventTests.from_fit, with version and cached columns in result.
+    Only events whose key or data version is not in the store are fitted.
+    benchmark names the market returns in the key (the data is in the version).
+    """
+    if model not in market_model.MODELS:
+        raise ValueError(f"Unknown model '{model}', expected one of {sorted(market_model.MODELS)}")
+    store = store or ResultsStore()
+    events = events.reset_index(drop=True)
+    windows = market_model.event_windows(events, stock_index, market_returns, est_days, pre, post, gap, aligned)
+    params = {'benchmark': benchmark, 'est_days': est_days, 'gap': gap, 'min_obs': min_obs}
+    keys = store.keys(events, model, (-pre, post), params, window_versions(windows))
+
+    cached = store.cached(keys)
+    missing = np.flatnonzero(~cached)
+    if len(missing):
+        fresh = events.iloc[missing].reset_index(drop=True)
+        sub = market_model.event_windows(fresh, None, None, est_days, pre, post, gap, aligned=windows.aligned)
+        fit = market_model.MODELS[model](sub, min_obs)
+        result, _ = market_model.score(fresh, sub, model, fit)
+        _store_fresh(store, keys.iloc[missing].reset_index(drop=True), fresh, sub, result, fit)
+
+    result, ar, tests = _rebuild(store, keys, events, model, pre, post, est_days)
+    result['version'] = keys['version'].to_numpy()
+    result['cached'] = cached
+    return result, ar, tests
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stored event-study results.')
+    parser.add_argument('--db', default=RESULTS_DB)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('summary', help='stored events per model, window, setup and status')
+    p_query = sub.add_parser('query', help='run one SQL query')
+    p_query.add_argument('sql')
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.db)
+    table = store.summary() if args.command == 'summary' else store.query(args.sql)
+    print(table.to_string(index=False) if len(table) else '(no rows)')
+    store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
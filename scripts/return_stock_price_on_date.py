@@ -1,12 +1,14 @@
 import pandas as pd
 import numpy as np
+from price_lookup import PriceLookup
+from trading_calendar import ON_OR_AFTER
 
 # -----------------------
 # FILE PATHS
 # -----------------------
 events_file = "xlsx//inserted-deleted.xlsx"
 index_file = "XZAG-IndexHistory-HRZB00ICBEX6-2010-01-01 - 2025-11-03.csv"
-stocks_file = "sve_dionice_merged_EUR_filled.xlsx"
+stocks_stage = "filled"
 
 
 # -----------------------
@@ -50,51 +52,56 @@ index = pd.read_csv(index_file, sep=";", decimal=",")
 
 index["date"] = pd.to_datetime(index["date"], errors="coerce")
 index = index[["date", "last_value"]].rename(columns={"last_value": "index_close"})
+index_prices = PriceLookup.from_series("CROBEX", index["date"], index_close=index["index_close"])
 
 
 # -----------------------
-# LOAD STOCKS — ONE SHEET PER TICKER
+# LOAD STOCKS — ALL TICKERS, SORTED ONCE (close = Last Price, volume = Volume)
 # -----------------------
-xls = pd.ExcelFile(stocks_file)
-sheet_names = xls.sheet_names
-
-stocks = {}
-
-for ticker in sheet_names:
-    df = pd.read_excel(stocks_file, sheet_name=ticker)
-
-    # Standardize column names
-    df.columns = df.columns.str.strip().str.lower()
-
-    # Parse date
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-
-    # Standardize price column name possibilities
-    if "last price" in df.columns:
-        df.rename(columns={"last price": "close"}, inplace=True)
-    if "close" not in df.columns:
-        raise ValueError(f"Ticker {ticker}: no close price column found")
-
-    stocks[ticker] = df[["date", "close", "volume"]]
+stocks = PriceLookup.from_store(stocks_stage)
 
 
 # -----------------------
 # HELPER: GET PRICE ON / AFTER EVENT DATE
 # -----------------------
+def _first_row(found, columns):
+    row = found.iloc[0]
+    if pd.isna(row["matched_date"]):
+        return None
+    return pd.Series({"date": row["matched_date"], **{c: row[c] for c in columns}})
+
+
 def get_stock_price_on_or_after(ticker, date):
     """Return first trading price >= date"""
-    if ticker not in stocks:
-        return None
-    
-    df = stocks[ticker]
-    row = df[df["date"] >= date].sort_values("date").head(1)
-    return row.iloc[0] if not row.empty else None
+    return _first_row(stocks.asof([ticker], [date], ON_OR_AFTER), ["close", "volume"])
 
 
 def get_index_on_or_after(date):
-    row = index[index["date"] >= date].sort_values("date").head(1)
-    return row.iloc[0] if not row.empty else None
+    return _first_row(index_prices.asof(["CROBEX"], [date], ON_OR_AFTER, resolve=False), ["index_close"])
+
+
+# -----------------------
+# BATCH: EVERY EVENT TICKER ON THE FIRST TRADING DAY AFTER IMPLEMENTATION
+# -----------------------
+def event_prices(events, policy=ON_OR_AFTER):
+    """One row per (event, included/excluded ticker) with the as-of stock and index prices."""
+    rows = [(i, side, t, date)
+            for i, date in events["Prvi dan trgovanja nakon provedbe"].items()
+            for side, col in (("included", "included_tickers"), ("excluded", "excluded_tickers"))
+            for t in events.at[i, col]]
+    pairs = pd.DataFrame(rows, columns=["event", "side", "ticker", "date"])
+    prices = stocks.asof(pairs["ticker"], pairs["date"], policy)
+    index_rows = index_prices.asof(["CROBEX"] * len(pairs), pairs["date"], policy, resolve=False)
+    return pairs.assign(matched_date=prices["matched_date"], close=prices["close"], volume=prices["volume"],
+                        index_date=index_rows["matched_date"], index_close=index_rows["index_close"])
 
 
 info = get_stock_price_on_or_after("ARNT", pd.Timestamp("2010-01-05"))
-print(info)
\ No newline at end of file
+print(info)
+
+# every included / excluded ticker of the events table in one batch
+prices = event_prices(events)
+print(prices)
+missing = prices["matched_date"].isna()
+if missing.any():
+    print(f"No price on or after the first trading day for {missing.sum()} of {len(prices)} event tickers")
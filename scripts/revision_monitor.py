@@ -0,0 +1,331 @@
+"""
+Early-warning monitor for upcoming CROBEX revisions.
+
+Ingests the market one trading day at a time and keeps, for every ZSE ticker,
+rolling liquidity statistics over the last WINDOW sessions: turnover, the
+number of sessions the stock actually traded and the sessions since it first
+appeared. Each ticker has a ring buffer of WINDOW days and running sums, so a
+new day costs O(1) per ticker (subtract the day leaving the window, add the
+new one) whatever the length of the history.
+
+From the statistics the monitor ranks likely insertions and deletions ahead
+of the next scheduled revision with CROBEX-style eligibility criteria:
+
+    eligible    traded on at least MIN_TRADED_RATIO of the last WINDOW
+                sessions (of its sessions so far if listed more recently);
+                a non-member must also be listed for at least WINDOW sessions,
+                a newly listed member is not deleted for its short history
+    rank        eligible stocks by turnover over the window (the store holds
+                no free-float market capitalisation, so turnover is the only
+                size criterion available)
+    insert      eligible non-member ranked inside the index size
+    delete      member that is not eligible or ranked outside the index size
+
+The index size has to be given (--size). The store does not hold the real
+constituent list, so membership comes from the list given with --constituents
+(e.g. the one published by ZSE), otherwise from the event files through
+MembershipIndex. The event files only know securities that were inserted or
+deleted at some point: a stock that has been in CROBEX the whole time counts
+as a non-member there and shows up as 'insert', so without --constituents
+the signals are indicative only.
+
+Regular revisions take effect on the Monday after the third Friday of March
+and September (every scheduled EventDate in the event files follows it).
+
+The state is a compact .npz snapshot (ring buffers, running sums, last day),
+so a restart continues from the last ingested day instead of replaying 15
+years of history.
+
+Usage:
+    python scripts/revision_monitor.py replay [--until 2020-01-01]   # stocks_raw_data/ day by day
+    python scripts/revision_monitor.py update [--watch 3600]         # new rows of the merged stage
+    python scripts/revision_monitor.py rank --size 20 [--constituents @crobex.txt] [--top 30]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import price_store
+import symbols
+from AB_eur_filled import convert_hrk, DROP_MODELS, MODEL_COL
+from membership import MembershipIndex
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+
+# --- Configuration ---
+STATE_FILE = os.path.join(ROOT_DIR, '.revision_monitor.npz')
+WINDOW = 126                # sessions in the rolling window (~6 months)
+MIN_TRADED_RATIO = 0.9      # share of the window's sessions with at least one trade
+REVISION_MONTHS = (3, 9)
+SOURCE_STAGE = 'merged'     # raw imported histories (update mode)
+
+DATE_COL = 'Date'
+TURNOVER_COL = 'Turnover'
+TRADES_COL = 'Num Trades'
+VOLUME_COL = 'Volume'
+PRICE_COL = 'Last Price'
+
+
+def next_revision(date):
+    """Effective date of the next regular revision on or after date: Monday after the third Friday of March / September."""
+    date = pd.Timestamp(date).normalize()
+    for year in (date.year, date.year + 1):
+        for month in REVISION_MONTHS:
+            first = pd.Timestamp(year, month, 1)
+            third_friday = first + pd.Timedelta(days=(4 - first.dayofweek) % 7 + 14)
+            effective = third_friday + pd.Timedelta(days=3)
+            if effective >= date:
+                return effective
+    raise AssertionError('unreachable')
+
+
+def daily_rows(frames, master=None):
+    """
+    Long frame Date, Symbol, turnover, traded, price from {ticker: raw history}:
+    HRK converted to EUR, BLOCK/OTC trades dropped, one row per ticker and day,
+    one ticker per security (the canonical one).
+    """
+    master = master or symbols.load_master()
+    keep = master.canonical_sheets(sorted(frames))
+    parts = []
+    for ticker in keep:
+        df, _, _ = convert_hrk(frames[ticker])
+        if DATE_COL not in df.columns or df.empty:
+            continue
+        df[DATE_COL] = pd.to_datetime(df[DATE_COL], errors='coerce').dt.normalize()
+        df = df.dropna(subset=[DATE_COL])
+        if MODEL_COL in df.columns:
+            df = df[~df[MODEL_COL].astype(str).str.upper().str.strip().isin(DROP_MODELS)]
+        sec = master.resolve(ticker)
+        activity = df[TRADES_COL] if TRADES_COL in df.columns else df.get(VOLUME_COL, pd.Series(0, index=df.index))
+        day = pd.DataFrame({
+            DATE_COL: df[DATE_COL],
+            'turnover': pd.to_numeric(df.get(TURNOVER_COL, 0), errors='coerce').fillna(0.0),
+            'trades': pd.to_numeric(activity, errors='coerce').fillna(0.0),
+            'price': pd.to_numeric(df.get(PRICE_COL, np.nan), errors='coerce')})
+        day = day.sort_values(DATE_COL).groupby(DATE_COL).agg(turnover=('turnover', 'sum'), trades=('trades', 'sum'),
+                                                               price=('price', 'last'))
+        day['Symbol'] = sec.symbol if sec is not None else ticker
+        parts.append(day.reset_index())
+    if not parts:
+        return pd.DataFrame(columns=[DATE_COL, 'Symbol', 'turnover', 'traded', 'price'])
+    rows = pd.concat(parts, ignore_index=True).sort_values([DATE_COL, 'Symbol'], kind='stable')
+    rows['traded'] = rows.pop('trades') > 0
+    return rows.reset_index(drop=True)
+
+
+class RevisionMonitor:
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.symbols = []
+        self.symbol_id = {}
+        self.turnover = np.zeros((0, window))              # ring buffers, column head is the oldest day
+        self.traded = np.zeros((0, window), dtype=bool)
+        self.turnover_sum = np.zeros(0)
+        self.traded_sum = np.zeros(0, dtype=np.int64)
+        self.sessions = np.zeros(0, dtype=np.int64)         # sessions since the ticker first appeared
+        self.last_price = np.zeros(0)
+        self.head = 0
+        self.days = 0
+        self.last_date = None
+
+    # --- Ingestion ---
+    def _ensure(self, names):
+        new = [n for n in dict.fromkeys(names) if n not in self.symbol_id]
+        if not new:
+            return
+        for n in new:
+            self.symbol_id[n] = len(self.symbols)
+            self.symbols.append(n)
+        k = len(new)
+        self.turnover = np.vstack([self.turnover, np.zeros((k, self.window))])
+        self.traded = np.vstack([self.traded, np.zeros((k, self.window), dtype=bool)])
+        self.turnover_sum = np.append(self.turnover_sum, np.zeros(k))
+        self.traded_sum = np.append(self.traded_sum, np.zeros(k, dtype=np.int64))
+        self.sessions = np.append(self.sessions, np.zeros(k, dtype=np.int64))
+        self.last_price = np.append(self.last_price, np.full(k, np.nan))
+
+    def ingest(self, date, names, turnover, traded, price):
+        """
+        Adds one trading day (the tickers that have a row that day); tickers
+        without a row did not trade. Days up to the last ingested one are
+        ignored, so re-feeding a stream is harmless. Returns True if ingested.
+        """
+        date = pd.Timestamp(date).normalize()
+        if self.last_date is not None and date <= self.last_date:
+            return False
+        self._ensure(names)
+        ids = np.array([self.symbol_id[n] for n in names], dtype=np.int64)
+        day_turnover = np.zeros(len(self.symbols))
+        day_traded = np.zeros(len(self.symbols), dtype=bool)
+        day_turnover[ids] = np.asarray(turnover, dtype=float)
+        day_traded[ids] = np.asarray(traded, dtype=bool)
+
+        h = self.head
+        self.turnover_sum += day_turnover - self.turnover[:, h]
+        self.traded_sum += day_traded.astype(np.int64) - self.traded[:, h]
+        self.turnover[:, h] = day_turnover
+        self.traded[:, h] = day_traded
+        self.head = (h + 1) % self.window
+
+        self.sessions += 1
+        price = np.asarray(price, dtype=float)
+        has_price = np.isfinite(price)
+        self.last_price[ids[has_price]] = price[has_price]
+        self.days += 1
+        self.last_date = date
+        return True
+
+    def ingest_rows(self, rows):
+        """Feeds a daily_rows() frame day by day; returns the number of new days."""
+        count = 0
+        if self.last_date is not None:
+            rows = rows[rows[DATE_COL] > self.last_date]
+        for date, day in rows.groupby(DATE_COL, sort=True):
+            count += self.ingest(date, day['Symbol'].tolist(), day['turnover'].to_numpy(),
+                                 day['traded'].to_numpy(), day['price'].to_numpy())
+        return count
+
+    # --- Snapshot ---
+    def save(self, path=STATE_FILE):
+        tmp_path = path + '.part.npz'
+        np.savez_compressed(tmp_path, window=self.window, symbols=np.array(self.symbols, dtype=str),
+                            turnover=self.turnover, traded=self.traded, turnover_sum=self.turnover_sum,
+                            traded_sum=self.traded_sum, sessions=self.sessions, last_price=self.last_price,
+                            head=self.head, days=self.days,
+                            last_date=np.datetime64(self.last_date if self.last_date is not None else 'NaT', 'D'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=STATE_FILE, window=WINDOW):
+        """The saved state, or an empty monitor if there is no snapshot yet."""
+        if not os.path.exists(path):
+            return cls(window)
+        with np.load(path) as data:
+            monitor = cls(int(data['window']))
+            monitor.symbols = data['symbols'].tolist()
+            monitor.symbol_id = {s: i for i, s in enumerate(monitor.symbols)}
+            for name in ('turnover', 'traded', 'turnover_sum', 'traded_sum', 'sessions', 'last_price'):
+                setattr(monitor, name, data[name])
+            monitor.head = int(data['head'])
+            monitor.days = int(data['days'])
+            last = data['last_date'][()]
+            monitor.last_date = None if np.isnat(last) else pd.Timestamp(last)
+        return monitor
+
+    # --- Ranking ---
+    def stats(self):
+        """Rolling statistics of every ticker."""
+        observed = np.minimum(self.sessions, self.window)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = np.where(observed > 0, self.traded_sum / observed, np.nan)
+        return pd.DataFrame({'Symbol': self.symbols, 'sessions': self.sessions, 'traded_ratio': ratio,
+                             'turnover': self.turnover_sum, 'last_price': self.last_price})
+
+    def rank(self, size, constituents=None, membership=None):
+        """
+        Stats plus member, eligible, rank (by window turnover among eligible
+        stocks) and signal ('insert' / 'delete' / '') as of the last day for
+        an index of size stocks. Members are the given constituents (tickers,
+        aliases or ISINs); without them the membership index of the event
+        files, which does not know stocks that were members all along.
+        """
+        table = self.stats()
+        if constituents is not None:
+            master = symbols.load_master()
+            seeded = {master.security_id(t) or str(t).strip().upper() for t in constituents}
+            table['member'] = [(master.security_id(s) or s) in seeded for s in table['Symbol']]
+        else:
+            membership = membership or MembershipIndex.from_files()
+            table['member'] = membership.is_member(table['Symbol'], [self.last_date] * len(table)) \
+                if len(table) else np.zeros(0, dtype=bool)
+        seasoned = table['member'] | (table['sessions'] >= self.window)
+        table['eligible'] = seasoned & (table['traded_ratio'] >= MIN_TRADED_RATIO)
+        score = table['turnover'].where(table['eligible'])
+        table['rank'] = score.rank(ascending=False, method='first').astype('Int64')
+        inside = table['rank'].fillna(size + 1) <= size
+        table['signal'] = np.select([~table['member'] & table['eligible'] & inside,
+                                     table['member'] & ~(table['eligible'] & inside)], ['insert', 'delete'], '')
+        return table.sort_values(['rank', 'turnover'], ascending=[True, False], na_position='last') \
+            .reset_index(drop=True)
+
+
+def raw_frames(raw_dir=price_store.RAW_DIR):
+    frames = {}
+    for ticker, path in price_store.raw_files(raw_dir).items():
+        try:
+            frames[ticker] = pd.read_excel(path)
+        except Exception as e:
+            print(f"Skipping {os.path.basename(path)}: {e}")
+    return frames
+
+
+def store_frames(stage=SOURCE_STAGE, after=None):
+    """{ticker: frame} of a stage, only the rows after the given day (read from the row-group statistics)."""
+    filters = [(DATE_COL, '>', pd.Timestamp(after))] if after is not None else None
+    return {t: price_store.load_ticker(t, stage, filters=filters) for t in price_store.list_tickers(stage)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rolling liquidity monitor and CROBEX revision candidates.',
+                                     fromfile_prefix_chars='@')
+    parser.add_argument('--state', default=STATE_FILE)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_replay = sub.add_parser('replay', help='rebuild the state from stocks_raw_data/ day by day')
+    p_replay.add_argument('--raw-dir', default=price_store.RAW_DIR)
+    p_replay.add_argument('--until', help='stop after this date')
+    p_replay.add_argument('--resume', action='store_true', help='continue from the saved state')
+    p_update = sub.add_parser('update', help='ingest the days of the merged stage after the saved state')
+    p_update.add_argument('--stage', default=SOURCE_STAGE, choices=price_store.STAGES)
+    p_update.add_argument('--watch', type=int, help='keep polling every WATCH seconds')
+    p_rank = sub.add_parser('rank', help='rank the revision candidates of the saved state')
+    p_rank.add_argument('--size', type=int, required=True, help='number of CROBEX constituents')
+    p_rank.add_argument('--constituents', nargs='+', metavar='TICKER',
+                        help='current CROBEX constituents (@file reads one per line)')
+    p_rank.add_argument('--top', type=int, default=30)
+    args = parser.parse_args(argv)
+
+    if args.command == 'replay':
+        monitor = RevisionMonitor.load(args.state) if args.resume else RevisionMonitor()
+        rows = daily_rows(raw_frames(args.raw_dir))
+        if args.until:
+            rows = rows[rows[DATE_COL] <= pd.Timestamp(args.until)]
+        start = time.time()
+        count = monitor.ingest_rows(rows)
+        monitor.save(args.state)
+        print(f"Replayed {count} days ({len(monitor.symbols)} tickers) in {time.time() - start:.1f}s, "
+              f"state at {monitor.last_date.date() if monitor.last_date is not None else '-'}")
+    elif args.command == 'update':
+        while True:
+            monitor = RevisionMonitor.load(args.state)
+            count = monitor.ingest_rows(daily_rows(store_frames(args.stage, monitor.last_date)))
+            if count:
+                monitor.save(args.state)
+            print(f"[{pd.Timestamp.now():%Y-%m-%d %H:%M}] {count} new days, state at "
+                  f"{monitor.last_date.date() if monitor.last_date is not None else '-'}")
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+    else:
+        monitor = RevisionMonitor.load(args.state)
+        if monitor.last_date is None:
+            print(f"No state in {args.state}; run 'replay' or 'update' first")
+            return 1
+        if args.constituents is None:
+            print("Warning: no --constituents given, members come from the event files; stocks that were in "
+                  "CROBEX all along count as non-members and show up as 'insert'. Signals are indicative only.")
+        table = monitor.rank(args.size, args.constituents)
+        print(f"As of {monitor.last_date.date()}, next regular revision {next_revision(monitor.last_date).date()}")
+        signals = table[table['signal'] != '']
+        print(f"\nCandidates:\n{signals.to_string(index=False) if len(signals) else '(none)'}")
+        print(f"\nTop {args.top}:\n{table.head(args.top).to_string(index=False)}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
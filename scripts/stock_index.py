@@ -0,0 +1,71 @@
+"""
+Grouped per-symbol index over the whole stock universe.
+
+All tickers are loaded once into contiguous arrays sorted by (symbol, date),
+with log returns precomputed and rows without a return dropped, plus an
+offset table symbol -> [start, stop). Getting one ticker's returns is then a
+dict lookup and a zero-copy slice instead of a boolean scan of the master
+frame (stocks[stocks['Symbol'] == ticker]) followed by a sort.
+"""
+import numpy as np
+import pandas as pd
+
+import price_store
+
+# --- Configuration ---
+PRICE_COL = 'Last Price'
+
+
+class StockIndex:
+
+    def __init__(self, symbols, offsets, dates, returns):
+        self.symbols = list(symbols)
+        self.offsets = offsets            # {symbol: (start, stop)}
+        self.dates = dates                # datetime64[ns], grouped by symbol, sorted within a group
+        self.returns = returns            # float64 log returns aligned with dates
+
+    @classmethod
+    def from_frames(cls, frames, price_col=PRICE_COL):
+        """Builds the index from {symbol: frame with Date and price_col}."""
+        symbols = sorted(frames)
+        offsets = {}
+        date_parts, return_parts = [], []
+        pos = 0
+        for symbol in symbols:
+            df = frames[symbol]
+            dates = pd.to_datetime(df['Date']).dt.normalize().to_numpy(dtype='datetime64[ns]')
+            prices = pd.to_numeric(df[price_col], errors='coerce').to_numpy(dtype=float)
+            order = np.argsort(dates, kind='stable')
+            dates, prices = dates[order], prices[order]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                log_ret = np.log(prices[1:] / prices[:-1])
+            keep = ~np.isnan(log_ret)
+            dates, log_ret = dates[1:][keep], log_ret[keep]
+            offsets[symbol] = (pos, pos + len(dates))
+            pos += len(dates)
+            date_parts.append(dates)
+            return_parts.append(log_ret)
+        dates = np.concatenate(date_parts) if date_parts else np.array([], dtype='datetime64[ns]')
+        returns = np.concatenate(return_parts) if return_parts else np.array([], dtype=float)
+        return cls(symbols, offsets, dates, returns)
+
+    @classmethod
+    def from_store(cls, stage=price_store.DEFAULT_STAGE, price_col=PRICE_COL, tickers=None):
+        frames = price_store.load_stage(stage, columns=['Date', price_col], tickers=tickers)
+        return cls.from_frames(frames, price_col)
+
+    def __contains__(self, symbol):
+        return symbol in self.offsets
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def slice(self, symbol):
+        """(dates, log returns) views for one symbol; raises KeyError if unknown."""
+        start, stop = self.offsets[symbol]
+        return self.dates[start:stop], self.returns[start:stop]
+
+    def frame(self, symbol, column='stock_return'):
+        """One symbol's log returns as a Date-indexed frame backed by the index arrays."""
+        dates, returns = self.slice(symbol)
+        return pd.DataFrame({column: returns}, index=pd.DatetimeIndex(dates, name='Date'), copy=False)
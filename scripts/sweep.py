@@ -0,0 +1,256 @@
+"""
+Window / parameter sweep over event-study configurations.
+
+Evaluates a grid of event windows (pre, post), estimation lengths, estimation
+gaps, anchor dates (effective EventDate vs announcement AnnDate), benchmarks
+and normal-return models in one invocation, instead of hand-editing
+ESTIMATION_DAYS / EVENT_WINDOW_PRE / window = 50 and re-running the scripts.
+
+Shared work is done once: every worker process loads the stock index and the
+events once, aligns each benchmark once, and grid points that differ only in
+`post` share one set of gathered windows and one model fit (the estimation
+window does not depend on post). Groups of grid points are fanned out over a
+process pool.
+
+Output (in OUTPUT_DIR):
+    <grid id>.csv   tidy table per grid point: group, Event Day, AAR, CAAR, N
+    summary.csv     one row per grid point and group: CAR(-pre,+post) CAAR, N, t
+                    the Patell / BMP / rank / generalized sign statistics and the
+                    clustered Kolari-Pynnoenen and portfolio-by-date statistics
+
+Usage:
+    python scripts/sweep.py
+    python scripts/sweep.py --pre 1 5 10 --post 1 5 10 20 --est-days 59 120 --gap 1 5 \\
+        --anchor effective announcement --benchmark CBX equal_weight --model market dimson
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import index_replay
+import market_model
+import price_store
+import symbols
+from car_cache import CarCache
+from event_tests import EventTests, STATISTICS, CLUSTERED_STATISTICS
+from stock_index import StockIndex
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+
+# --- Configuration ---
+EVENT_FILES = {
+    'inserted': os.path.join(ROOT_DIR, 'INSERTIONS_ANN_EVENT.csv'),
+    'deleted': os.path.join(ROOT_DIR, 'DELETIONS_ANN_EVENT.csv'),
+}
+ANCHORS = {'effective': 'EventDate', 'announcement': 'AnnDate'}
+MARKET_INDEX_FILE = os.path.join(ROOT_DIR, 'XZAG-IndexHistory-HRZB00ICBEX6-2010-01-01 - 2025-11-03.csv')
+BENCHMARK_TICKER = 'CBX'
+BENCHMARKS = ('CBX', 'crobex_csv', 'equal_weight', 'crobex_replay', 'crobex_replay_ex')
+STOCK_STAGE = 'filled'
+OUTPUT_DIR = os.path.join(ROOT_DIR, 'sweep_results')
+MAX_WORKERS = 4
+DEFAULT_GRID = {
+    'pre': [10],
+    'post': [10],
+    'est_days': [59],
+    'gap': [1],
+    'anchor': ['effective', 'announcement'],
+    'benchmark': ['CBX', 'equal_weight'],
+    'model': ['market'],
+}
+
+
+# --- Benchmarks: name -> log returns indexed by Date ---
+def _log_returns(dates, prices):
+    prices = pd.Series(pd.to_numeric(prices, errors='coerce').to_numpy(dtype=float),
+                       index=pd.DatetimeIndex(dates).normalize()).sort_index()
+    return np.log(prices / prices.shift(1)).dropna()
+
+
+def benchmark_returns(name, stocks):
+    """
+    'CBX'           the CROBEX sheet in the price store
+    'crobex_csv'    the XZAG index history csv
+    'equal_weight'  equal-weighted mean log return of every stored stock
+    'crobex_replay'     the capped turnover-weighted replay of CROBEX (index_replay)
+    'crobex_replay_ex'  the same replay without the stock itself: a DataFrame
+                        with one benchmark column per stock
+    Raises FileNotFoundError if the benchmark's data is not available.
+    """
+    if name == 'CBX':
+        df = price_store.load_ticker(BENCHMARK_TICKER, STOCK_STAGE, columns=['Date', 'Last Price'])
+        return _log_returns(df['Date'], df['Last Price'])
+    if name == 'crobex_csv':
+        df = pd.read_csv(MARKET_INDEX_FILE, delimiter=';', decimal=',')
+        df.columns = df.columns.str.strip('"')
+        return _log_returns(pd.to_datetime(df['date']), df['last_value'])
+    if name == 'equal_weight':
+        members = [s for s in stocks.symbols if s != BENCHMARK_TICKER]
+        start = [stocks.offsets[s][0] for s in members]
+        stop = [stocks.offsets[s][1] for s in members]
+        rows = np.concatenate([np.arange(a, b) for a, b in zip(start, stop)])
+        return pd.Series(stocks.returns[rows]).groupby(stocks.dates[rows]).mean()
+    if name in ('crobex_replay', 'crobex_replay_ex'):
+        replay = index_replay.IndexReplay.from_panel()
+        return replay.returns().dropna() if name == 'crobex_replay' else replay.excluding(stocks.symbols)
+    raise ValueError(f"Unknown benchmark '{name}'")
+
+
+def load_events():
+    """Both event files with a Group column, symbols mapped to stored tickers."""
+    frames = []
+    for group, path in EVENT_FILES.items():
+        events = symbols.read_events(path)
+        events['Group'] = group
+        frames.append(events)
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_study(stage=STOCK_STAGE):
+    """(stock index, events) with event symbols resolved to the stored sheets."""
+    stocks = StockIndex.from_store(stage)
+    events = load_events()
+    master = symbols.load_master()
+    events['Symbol'] = [master.sheet(s, stocks.offsets) or s for s in events['Symbol']]
+    return stocks, events
+
+
+# --- Worker state: loaded once per process ---
+_STATE = {}
+
+
+def _init_worker(stage):
+    stocks, events = load_study(stage)
+    _STATE.update(stocks=stocks, events=events, benchmarks={}, aligned={})
+
+
+def _benchmark(name):
+    if name not in _STATE['benchmarks']:
+        try:
+            _STATE['benchmarks'][name] = benchmark_returns(name, _STATE['stocks'])
+        except FileNotFoundError:
+            _STATE['benchmarks'][name] = None
+    return _STATE['benchmarks'][name]
+
+
+def _aligned(benchmark):
+    if benchmark not in _STATE['aligned']:
+        _STATE['aligned'][benchmark] = market_model.AlignedReturns(
+            _STATE['stocks'], _benchmark(benchmark), _STATE['events']['Symbol'])
+    return _STATE['aligned'][benchmark]
+
+
+def grid_id(point):
+    return '_'.join(f'{k}={point[k]}' for k in ('anchor', 'benchmark', 'model', 'est_days', 'gap', 'pre', 'post'))
+
+
+def tidy_table(point, result, ar):
+    """Per-day AAR, CAAR and N for every group (and 'all') of one grid point."""
+    days = np.arange(-point['pre'], point['post'] + 1)
+    ok = (result['status'] == market_model.OK).to_numpy()
+    parts = []
+    for group in list(EVENT_FILES) + ['all']:
+        rows = ok if group == 'all' else ok & (result['Group'] == group).to_numpy()
+        n = np.isfinite(ar[rows]).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            aar = np.where(n > 0, np.nansum(ar[rows], axis=0) / n, np.nan)
+        parts.append(pd.DataFrame(dict(point, group=group, **{'Event Day': days}, AAR=aar,
+                                       CAAR=np.nancumsum(aar), N=n)))
+    return pd.concat(parts, ignore_index=True)
+
+
+def summary_rows(point, result, ar, tests):
+    cars = CarCache.from_event_study(ar, point['pre'], result['status'])
+    ok = (result['status'] == market_model.OK).to_numpy()
+    window = [(-point['pre'], point['post'])]
+    rows = []
+    for group in list(EVENT_FILES) + ['all']:
+        in_group = np.ones(len(result), bool) if group == 'all' else (result['Group'] == group).to_numpy()
+        stats = cars.caar_table(window, np.flatnonzero(in_group & ok)).iloc[0]
+        selected = tests.select(in_group)
+        significance = selected.window_tests(window).iloc[0]
+        clustered = selected.clustered_tests(window).iloc[0]
+        rows.append(dict(point, group=group, CAAR=stats['CAAR'], N=int(stats['N']), t=stats['t'],
+                         **{name: significance[name] for name in STATISTICS},
+                         **{name: clustered[name] for name in CLUSTERED_STATISTICS},
+                         skipped=int((in_group & ~ok).sum())))
+    return rows
+
+
+def run_group(key, posts, min_obs=market_model.MIN_OBS):
+    """
+    All grid points sharing an estimation setup (anchor, benchmark, model,
+    est_days, gap, pre); the windows and the model fit are built once for the
+    longest post and cut down for the others.
+    """
+    anchor, benchmark, model, est_days, gap, pre = key
+    if _benchmark(benchmark) is None:
+        return [], f"benchmark '{benchmark}' not available, skipped"
+    events = _STATE['events'].dropna(subset=[ANCHORS[anchor]]).reset_index(drop=True)
+    events = events.assign(EventDate=events[ANCHORS[anchor]])
+
+    windows = market_model.event_windows(events, None, None, est_days, pre, max(posts), gap,
+                                         aligned=_aligned(benchmark))
+    fit = market_model.MODELS[model](windows, min_obs)
+    out = []
+    for post in posts:
+        point = {'anchor': anchor, 'benchmark': benchmark, 'model': model, 'est_days': est_days,
+                 'gap': gap, 'pre': pre, 'post': post}
+        result, ar = market_model.score(events, windows, model, fit, post)
+        tests = EventTests.from_fit(windows, fit, post)
+        out.append((point, tidy_table(point, result, ar), summary_rows(point, result, ar, tests)))
+    return out, None
+
+
+def sweep(grid, output_dir=OUTPUT_DIR, workers=MAX_WORKERS, stage=STOCK_STAGE):
+    """Runs the grid and writes one csv per grid point plus summary.csv; returns the summary."""
+    unknown = [m for m in grid['model'] if m not in market_model.MODELS]
+    if unknown:
+        raise ValueError(f"Unknown model(s) {unknown}, expected one of {sorted(market_model.MODELS)}")
+    posts = sorted(set(grid['post']))
+    keys = list(itertools.product(grid['anchor'], grid['benchmark'], grid['model'],
+                                  grid['est_days'], grid['gap'], grid['pre']))
+    os.makedirs(output_dir, exist_ok=True)
+
+    summary = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(stage,)) as pool:
+        for key, (points, message) in zip(keys, pool.map(run_group, keys, itertools.repeat(posts))):
+            if message:
+                print(f"[SKIP] {key}: {message}")
+            for point, table, rows in points:
+                table.to_csv(os.path.join(output_dir, grid_id(point) + '.csv'), index=False)
+                summary.extend(rows)
+    summary = pd.DataFrame(summary)
+    summary.to_csv(os.path.join(output_dir, 'summary.csv'), index=False)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sweep event-study windows, estimation setups, anchors, benchmarks and models.')
+    parser.add_argument('--pre', type=int, nargs='+', default=DEFAULT_GRID['pre'])
+    parser.add_argument('--post', type=int, nargs='+', default=DEFAULT_GRID['post'])
+    parser.add_argument('--est-days', type=int, nargs='+', default=DEFAULT_GRID['est_days'])
+    parser.add_argument('--gap', type=int, nargs='+', default=DEFAULT_GRID['gap'])
+    parser.add_argument('--anchor', nargs='+', choices=sorted(ANCHORS), default=DEFAULT_GRID['anchor'])
+    parser.add_argument('--benchmark', nargs='+', choices=BENCHMARKS, default=DEFAULT_GRID['benchmark'])
+    parser.add_argument('--model', nargs='+', choices=sorted(market_model.MODELS), default=DEFAULT_GRID['model'])
+    parser.add_argument('--jobs', type=int, default=MAX_WORKERS)
+    parser.add_argument('--output', default=OUTPUT_DIR)
+    args = parser.parse_args(argv)
+
+    grid = {'pre': args.pre, 'post': args.post, 'est_days': args.est_days, 'gap': args.gap,
+            'anchor': args.anchor, 'benchmark': args.benchmark, 'model': args.model}
+    start = time.time()
+    summary = sweep(grid, args.output, args.jobs)
+    print(f"{len(summary) // (len(EVENT_FILES) + 1)} grid points in {time.time() - start:.1f}s -> {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
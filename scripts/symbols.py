@@ -0,0 +1,187 @@
+"""
+Symbol master: one canonical security per ISIN, with O(1) alias lookup.
+
+Built once from txt/ticker-isin.txt and the raw file names in stocks_raw_data/
+(e.g. VLEN-R-A_HRVLENRB0001.xlsx). Every ticker, its -R-A / base variant, the
+ISIN and the stored sheet name map to the same Security through dict indexes,
+replacing the -R-A filtering loop that used to be copy-pasted into
+A_HRK_EURconv.py, B_dodavanjeiMicanjeRedaka.py, C_sinkronizacija.py and the
+notebook, and the replace("-R-A", "") fallback in car-testing.py.
+
+The canonical symbol of a security is its base ticker when that exists,
+otherwise the -R-A ticker (SUNH-R-A), i.e. the name the old filter kept.
+"""
+import hashlib
+import os
+
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+
+# --- Configuration ---
+TICKER_ISIN_FILE = os.path.join(ROOT_DIR, 'txt', 'ticker-isin.txt')
+RAW_DIR = os.path.join(ROOT_DIR, 'stocks_raw_data')
+R_A_SUFFIX = '-R-A'
+
+
+def base_ticker(ticker):
+    """VLEN-R-A -> VLEN; other tickers are returned unchanged."""
+    ticker = ticker.strip().upper()
+    return ticker[:-len(R_A_SUFFIX)] if ticker.endswith(R_A_SUFFIX) else ticker
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Security:
+    """One listed security: ISIN, canonical symbol, every alias and its raw files."""
+
+    __slots__ = ('isin', 'symbol', 'tickers', 'raw_files')
+
+    def __init__(self, isin):
+        self.isin = isin
+        self.symbol = None
+        self.tickers = set()
+        self.raw_files = {}     # ticker -> path
+
+    def aliases(self):
+        names = set(self.tickers) | {self.isin}
+        names |= {base_ticker(t) for t in self.tickers}
+        names |= {base_ticker(t) + R_A_SUFFIX for t in self.tickers}
+        return names
+
+    def __repr__(self):
+        return f'Security({self.isin!r}, {self.symbol!r})'
+
+
+class SymbolMaster:
+    """Hash indexes alias -> Security and ISIN -> Security."""
+
+    def __init__(self, securities):
+        self.by_isin = {}
+        self.by_alias = {}
+        for sec in securities:
+            bases = {t for t in sec.tickers if not t.endswith(R_A_SUFFIX)}
+            sec.symbol = min(bases) if bases else min(sec.tickers)
+            self.by_isin[sec.isin] = sec
+            for alias in sec.aliases():
+                # an explicit ticker always wins over a derived -R-A/base alias
+                if alias not in self.by_alias or alias in sec.tickers:
+                    self.by_alias[alias] = sec
+
+    @classmethod
+    def build(cls, ticker_isin_file=TICKER_ISIN_FILE, raw_dir=RAW_DIR):
+        securities = {}
+
+        def add(ticker, isin, path=None):
+            sec = securities.setdefault(isin, Security(isin))
+            sec.tickers.add(ticker.strip().upper())
+            if path is not None:
+                sec.raw_files[ticker.strip().upper()] = path
+
+        if ticker_isin_file and os.path.exists(ticker_isin_file):
+            with open(ticker_isin_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        ticker, isin = line.split(',')
+                        add(ticker, isin.strip())
+        if raw_dir and os.path.isdir(raw_dir):
+            for name in sorted(os.listdir(raw_dir)):
+                if name.endswith('.xlsx') and '_' in name and not name.startswith('.'):
+                    ticker, isin = name[:-len('.xlsx')].split('_', 1)
+                    add(ticker, isin, os.path.join(raw_dir, name))
+        return cls(securities.values())
+
+    def resolve(self, name):
+        """The Security for a ticker, -R-A alias, sheet name or ISIN; None if unknown."""
+        if name is None:
+            return None
+        key = str(name).strip().upper()
+        sec = self.by_alias.get(key)
+        if sec is None:
+            sec = self.by_alias.get(base_ticker(key))
+        return sec
+
+    def security_id(self, name):
+        sec = self.resolve(name)
+        return sec.isin if sec is not None else None
+
+    def sheet(self, name, available):
+        """
+        The name under which the security of `name` is stored among `available`
+        (sheet names / store tickers): the canonical symbol if present, otherwise
+        any other alias of the same security. None if nothing matches.
+        """
+        available = available if isinstance(available, (set, frozenset, dict)) else set(available)
+        name = str(name).strip()
+        sec = self.resolve(name)
+        if sec is None:
+            return name if name in available else None
+        for candidate in [sec.symbol, base_ticker(name), name] + sorted(sec.tickers):
+            if candidate in available:
+                return candidate
+        return None
+
+    def canonical_sheets(self, names):
+        """
+        Keeps one name per security, preserving order (the old -R-A filter).
+        Names unknown to the master (e.g. the CBX benchmark) are kept as they are.
+        """
+        names = list(names)
+        available = set(names)
+        chosen = {}
+        for name in names:
+            sec = self.resolve(name)
+            if sec is None:
+                chosen[name] = name
+            elif sec.isin not in chosen:
+                chosen[sec.isin] = self.sheet(name, available)
+        keep = set(chosen.values())
+        return [n for n in names if n in keep]
+
+    def duplicate_raw_files(self):
+        """Groups of raw files with identical bytes: {sha256: [paths]} (only groups of 2+)."""
+        groups = {}
+        for sec in self.by_isin.values():
+            for path in sec.raw_files.values():
+                groups.setdefault(file_sha256(path), []).append(path)
+        return {h: sorted(paths) for h, paths in groups.items() if len(paths) > 1}
+
+    def annotate_events(self, events, symbol_col='Symbol'):
+        """Adds SecurityId (ISIN) and CanonicalSymbol columns to an event frame."""
+        events = events.copy()
+        resolved = [self.resolve(s) for s in events[symbol_col]]
+        events['SecurityId'] = [sec.isin if sec else None for sec in resolved]
+        events['CanonicalSymbol'] = [sec.symbol if sec else None for sec in resolved]
+        return events
+
+
+_MASTER = None
+
+
+def load_master():
+    """The default master (built once per process)."""
+    global _MASTER
+    if _MASTER is None:
+        _MASTER = SymbolMaster.build()
+    return _MASTER
+
+
+def read_events(path, master=None):
+    """
+    Reads an INSERTIONS_/DELETIONS_ event csv: strips symbols, parses EventDate
+    (and AnnDate if present) and resolves every symbol through the master.
+    """
+    events = pd.read_csv(path, dtype=str)
+    events['Symbol'] = events['Symbol'].str.strip()
+    for col in ('EventDate', 'AnnDate'):
+        if col in events.columns:
+            events[col] = pd.to_datetime(events[col].str.strip(), format='%Y-%m-%d', errors='coerce')
+    return (master or load_master()).annotate_events(events)
@@ -0,0 +1,62 @@
+"""
+Lazy per-ticker loader with a bounded LRU cache of preprocessed series.
+
+car-testing.py used to parse, sort and recompute returns for a ticker once per
+event; with ~200 events over ~80 tickers most of that work was repeated. The
+loader does it once per ticker and keeps the last `maxsize` results.
+"""
+from collections import OrderedDict
+
+import pandas as pd
+
+import price_store
+
+# --- Configuration ---
+DEFAULT_MAXSIZE = 64
+PRICE_COL = "Last Price"
+
+
+class TickerLoader:
+    """
+    get(ticker) returns the ticker's frame sorted by Date with a 'Return'
+    column (simple returns of price_col). Results are cached; treat them as
+    read-only and .copy() before modifying.
+    """
+
+    def __init__(self, stage=price_store.DEFAULT_STAGE, price_col=PRICE_COL, maxsize=DEFAULT_MAXSIZE):
+        self.stage = stage
+        self.price_col = price_col
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def _load(self, ticker):
+        df = price_store.load_ticker(ticker, self.stage)
+        df.columns = df.columns.str.strip()
+        df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+        df = df.sort_values("Date").reset_index(drop=True)
+        df["Return"] = df[self.price_col].pct_change(fill_method=None)
+        return df
+
+    def get(self, ticker):
+        if ticker in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(ticker)
+            return self._cache[ticker]
+        self.misses += 1
+        df = self._load(ticker)
+        self._cache[ticker] = df
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return df
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        self._cache.clear()
+        self.hits = self.misses = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache), "maxsize": self.maxsize}
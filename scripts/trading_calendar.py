@@ -0,0 +1,164 @@
+"""
+ZSE trading calendar with vectorized trading-day arithmetic.
+
+The calendar is the sorted union of the dates of every stored ticker (what
+B_dodavanjeiMicanjeRedaka.py used to rebuild as global_dates from a Python
+set). Dates map to trading-day ordinals (position in the calendar) with one
+searchsorted over the whole array, under an explicit policy:
+
+    'on_or_after'   the first trading day >= date (event dates on weekends or
+                    holidays move to the next session, like the CAR scripts' backfill)
+    'on_or_before'  the last trading day <= date
+    'exact'         only dates that are trading days
+
+Unmatched dates get ordinal -1 and NaT, never an exception, so whole event
+files are aligned in one call:
+
+    cal = TradingCalendar.from_store()
+    cal.align(events['EventDate'])                  # day 0 of every event
+    cal.shift(events['EventDate'], -10)             # 10 sessions before day 0
+    cal.next_trading_day(dates), cal.previous_trading_day(dates)
+
+Usage:
+    python scripts/trading_calendar.py [--stage filled] [--date 2025-09-20 ...]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import price_store
+
+# --- Configuration ---
+ON_OR_AFTER = 'on_or_after'
+ON_OR_BEFORE = 'on_or_before'
+EXACT = 'exact'
+POLICIES = (ON_OR_AFTER, ON_OR_BEFORE, EXACT)
+DATE_COL = 'Date'
+
+
+def to_days(dates):
+    """Any date-like scalar / array -> datetime64[ns] array of normalized dates (NaT kept)."""
+    values = pd.DatetimeIndex(np.atleast_1d(np.asarray(dates, dtype='datetime64[ns]'))).normalize()
+    return values.values.astype('datetime64[ns]')
+
+
+class TradingCalendar:
+
+    def __init__(self, dates):
+        days = to_days(dates)
+        self.dates = np.unique(days[~np.isnat(days)])     # sorted, unique datetime64[ns]
+
+    @classmethod
+    def from_store(cls, stage=price_store.DEFAULT_STAGE, tickers=None, store_dir=price_store.STORE_DIR):
+        """Union of the Date column of every (or the given) stored ticker; unreadable sheets are skipped."""
+        if tickers is None:
+            tickers = price_store.list_tickers(stage, store_dir)
+        parts = []
+        for ticker in tickers:
+            try:
+                df = price_store.load_ticker(ticker, stage, columns=[DATE_COL], store_dir=store_dir)
+            except (KeyError, ValueError):
+                continue
+            parts.append(pd.to_datetime(df[DATE_COL], errors='coerce').to_numpy(dtype='datetime64[ns]'))
+        return cls(np.concatenate(parts) if parts else np.array([], dtype='datetime64[ns]'))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, date):
+        return bool(self.is_trading_day(date)[0])
+
+    @property
+    def first(self):
+        return self.dates[0] if len(self) else np.datetime64('NaT')
+
+    @property
+    def last(self):
+        return self.dates[-1] if len(self) else np.datetime64('NaT')
+
+    # --- date -> ordinal ---
+    def ordinal(self, dates, policy=ON_OR_AFTER):
+        """Trading-day ordinal of every date under the policy; -1 where there is none."""
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}', expected one of {POLICIES}")
+        days = to_days(dates)
+        missing = np.isnat(days)
+        if policy == ON_OR_BEFORE:
+            pos = np.searchsorted(self.dates, days, side='right') - 1
+            found = pos >= 0
+        else:
+            pos = np.searchsorted(self.dates, days, side='left')
+            found = pos < len(self)
+            if policy == EXACT:
+                found[found] = self.dates[pos[found]] == days[found]
+        return np.where(found & ~missing, pos, -1)
+
+    def is_trading_day(self, dates):
+        return self.ordinal(dates, EXACT) >= 0
+
+    # --- ordinal -> date ---
+    def date_of(self, ordinals):
+        """Calendar date of every ordinal; NaT for -1 and ordinals outside the calendar."""
+        ordinals = np.atleast_1d(np.asarray(ordinals, dtype=np.int64))
+        inside = (ordinals >= 0) & (ordinals < len(self))
+        out = np.full(ordinals.shape, np.datetime64('NaT'), dtype='datetime64[ns]')
+        out[inside] = self.dates[ordinals[inside]]
+        return out
+
+    def align(self, dates, policy=ON_OR_AFTER):
+        """The trading day each date resolves to under the policy (NaT if none)."""
+        return self.date_of(self.ordinal(dates, policy))
+
+    def shift(self, dates, n, policy=ON_OR_AFTER):
+        """
+        The trading day n sessions after (n < 0: before) each date's aligned
+        trading day; n may be an array broadcasting against dates. NaT where
+        the date does not align or the result leaves the calendar.
+        """
+        pos = self.ordinal(dates, policy)
+        shifted = pos + np.asarray(n, dtype=np.int64)
+        return self.date_of(np.where(pos >= 0, shifted, -1))
+
+    def next_trading_day(self, dates):
+        """First trading day strictly after each date."""
+        days = to_days(dates)
+        return self.date_of(np.where(np.isnat(days), -1, np.searchsorted(self.dates, days, side='right')))
+
+    def previous_trading_day(self, dates):
+        """Last trading day strictly before each date."""
+        days = to_days(dates)
+        return self.date_of(np.where(np.isnat(days), -1, np.searchsorted(self.dates, days, side='left') - 1))
+
+    # --- ranges ---
+    def between(self, start, end):
+        """Trading days in [start, end]."""
+        lo = np.searchsorted(self.dates, to_days(start)[0], side='left')
+        hi = np.searchsorted(self.dates, to_days(end)[0], side='right')
+        return self.dates[lo:hi]
+
+    def sessions_between(self, start, end, policy=ON_OR_AFTER):
+        """Trading days from each start to each end (ordinal difference); -1 where either does not align."""
+        a, b = self.ordinal(start, policy), self.ordinal(end, policy)
+        return np.where((a >= 0) & (b >= 0), b - a, -1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ZSE trading calendar from the price store.')
+    parser.add_argument('--stage', default=price_store.DEFAULT_STAGE, choices=price_store.STAGES)
+    parser.add_argument('--date', nargs='*', default=[], help='dates to align')
+    args = parser.parse_args(argv)
+
+    calendar = TradingCalendar.from_store(args.stage)
+    print(f"{len(calendar)} trading days, {pd.Timestamp(calendar.first).date()} .. {pd.Timestamp(calendar.last).date()}")
+    if args.date:
+        dates = pd.to_datetime(args.date)
+        print(pd.DataFrame({'date': dates.date,
+                            'trading_day': calendar.is_trading_day(dates),
+                            ON_OR_BEFORE: pd.to_datetime(calendar.align(dates, ON_OR_BEFORE)).date,
+                            ON_OR_AFTER: pd.to_datetime(calendar.align(dates, ON_OR_AFTER)).date}).to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,28 +1,19 @@
-import os
-import pandas as pd
+# Spajanje svih preuzetih .xlsx datoteka u price_store/merged/ (jedan Parquet po tickeru).
+# Excel s jednim sheetom po tickeru radi se samo ako je EXPORT_EXCEL = True (za ručni pregled).
+import price_store
 
-input_dir = 'c:\\ferprogrami\\.vscode\\PROJEKT R\\downloaded_xlsx'
+input_dir = price_store.RAW_DIR
 output_excel = 'sve_dionice_merged.xlsx'
+EXPORT_EXCEL = False
 
-xlsx_fajlovi = [f for f in os.listdir(input_dir) if f.endswith('.xlsx')]
-if not xlsx_fajlovi:
+if not price_store.raw_files(input_dir):
     raise Exception("Nema .xlsx datoteka u folderu!")
 
-with pd.ExcelWriter(output_excel, engine='openpyxl') as writer:
-    sheet_unesen = False
-    for xlsx_file in xlsx_fajlovi:
-        path = os.path.join(input_dir, xlsx_file)
-        ticker = xlsx_file.split('_')[0]
-        sheet_name = ticker[:31]
-        try:
-            df = pd.read_excel(path)
-            if not df.empty:
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-                sheet_unesen = True
-        except Exception as e:
-            print(f"Preskačem {xlsx_file} zbog greške: {e}")
+spremljeni = price_store.import_raw(input_dir)
+if not spremljeni:
+    raise Exception("Niti jedan ticker nije spremljen – provjeri ulazne fajlove!")
 
-    if not sheet_unesen:
-        raise Exception("Niti jedan sheet nije kreiran – provjeri ulazne fajlove!")
+if EXPORT_EXCEL:
+    price_store.export_excel('merged', output_excel)
 
-print("Sve spojeno, svaki sheet je ticker.")
+print(f"Sve spojeno, {len(spremljeni)} tickera u {price_store.stage_dir('merged')}.")
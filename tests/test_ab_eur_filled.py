@@ -0,0 +1,103 @@
+"""The fused AB_eur_filled stage against A_HRK_EURconv.py + B_dodavanjeiMicanjeRedaka.py."""
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import AB_eur_filled
+import price_store
+from trading_calendar import TradingCalendar
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(AB_eur_filled.__file__))
+COLUMNS = ['MIC', 'Symbol', 'ISIN', 'Date', 'Trading Model', 'Open Price', 'High Price', 'Low Price', 'Last Price',
+           'VWAP Price', 'Change Prev Close Percentage', 'Num Trades', 'Volume', 'Turnover', 'Price Currency',
+           'Turnover Currency']
+
+
+def raw_history(symbol, isin, start, end, seed, skip_every=5):
+    """
+    A merged-stage frame in the ZSE layout (newest first): HRK before 2023,
+    EUR after, days without trades, a BLOCK trade and a second row on some days.
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(start, end)
+    days = days[np.arange(len(days)) % skip_every != 3]
+    price = 50.0 * np.exp(np.cumsum(rng.normal(0, 0.01, len(days))))
+    hrk = days < pd.Timestamp('2023-01-01')
+    frame = pd.DataFrame({
+        'MIC': 'XZAG', 'Symbol': symbol, 'ISIN': isin, 'Date': days, 'Trading Model': 'CT',
+        'Open Price': price, 'High Price': price * 1.01, 'Low Price': price * 0.99, 'Last Price': price,
+        'VWAP Price': price, 'Change Prev Close Percentage': 0.0,
+        'Num Trades': rng.integers(1, 20, len(days)).astype(float),
+        'Volume': rng.integers(10, 1000, len(days)).astype(float),
+        'Turnover': price * 100, 'Price Currency': np.where(hrk, 'HRK', 'EUR'),
+        'Turnover Currency': np.where(hrk, 'HRK', 'EUR')})
+    if len(frame) > 6:
+        block = frame.iloc[[2]].assign(**{'Trading Model': 'BLOCK', 'Last Price': 1.0})
+        auction = frame.iloc[[6]].assign(**{'Trading Model': 'AUCT', 'Last Price': price[6] * 1.02})
+        frame = pd.concat([frame, block, auction], ignore_index=True)
+    return frame.sort_values('Date', ascending=False, kind='mergesort').reset_index(drop=True)[COLUMNS]
+
+
+def fixture_merged(store_dir):
+    """Small merged stage: two securities, one of them also under its -R-A alias, and a one-row ticker."""
+    histories = {
+        'ARNT': raw_history('ARNT', 'HRARNTRA0004', '2022-11-01', '2023-03-31', 1),
+        'ARNT-R-A': raw_history('ARNT-R-A', 'HRARNTRA0004', '2022-11-01', '2023-03-31', 2),
+        'INA': raw_history('INA', 'HRINA0RA0007', '2022-12-05', '2023-02-28', 3, skip_every=7),
+        'ZZZ': raw_history('ZZZ', 'HRZZZ0000000', '2023-01-10', '2023-01-10', 4),
+    }
+    for ticker, frame in histories.items():
+        price_store.write_ticker(frame, ticker, 'merged', store_dir)
+
+
+def run_script(name, store_dir):
+    env = dict(os.environ, PRICE_STORE_DIR=str(store_dir))
+    subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, name)], env=env, check=True, capture_output=True)
+
+
+def assert_same_filled(merged_dir, tmp_path):
+    """Runs A + B into one scratch store and the fused stage into another, then compares them ticker by ticker."""
+    legacy, fused = tmp_path / 'legacy', tmp_path / 'fused'
+    for store in (legacy, fused):
+        shutil.copytree(os.path.join(merged_dir, 'merged'), store / 'merged')
+    run_script('A_HRK_EURconv.py', legacy)
+    run_script('B_dodavanjeiMicanjeRedaka.py', legacy)
+    run_script('AB_eur_filled.py', fused)
+
+    expected = price_store.list_tickers('filled', str(legacy))
+    actual = price_store.list_tickers('filled', str(fused))
+    assert expected
+    assert sorted(set(actual) - {AB_eur_filled.BENCHMARK_TICKER}) == expected
+    for ticker in expected:
+        pd.testing.assert_frame_equal(price_store.load_ticker(ticker, 'filled', store_dir=str(fused)),
+                                      price_store.load_ticker(ticker, 'filled', store_dir=str(legacy)),
+                                      obj=ticker)
+
+
+def test_fused_stage_matches_a_then_b(tmp_path):
+    fixture_merged(str(tmp_path / 'src'))
+    assert_same_filled(str(tmp_path / 'src'), tmp_path)
+
+
+@pytest.mark.skipif(not price_store.list_tickers('merged'), reason='no merged stage in the price store')
+def test_fused_stage_matches_a_then_b_on_the_store(tmp_path):
+    assert_same_filled(price_store.STORE_DIR, tmp_path)
+
+
+def test_benchmark_on_the_trading_calendar(tmp_path):
+    index_file = tmp_path / 'index.csv'
+    index_file.write_text('date;last_value\n2023-01-05;2000,5\n2023-01-03;1990,25\n2023-01-09;2010,0\n',
+                          encoding='utf-8')
+    calendar = TradingCalendar(pd.to_datetime(['2023-01-02', '2023-01-03', '2023-01-04', '2023-01-05',
+                                               '2023-01-09', '2023-01-10']))
+
+    cbx = AB_eur_filled.benchmark_frame(str(index_file), calendar)
+
+    assert list(cbx['Date']) == list(pd.to_datetime(['2023-01-03', '2023-01-04', '2023-01-05', '2023-01-09']))
+    assert list(cbx['Last Price']) == [1990.25, 1990.25, 2000.5, 2010.0]
+    assert set(cbx['Symbol']) == {'CBX'}
@@ -0,0 +1,185 @@
+"""downloader.py against a local stand-in for the ZSE security-history endpoint."""
+import io
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+import downloader
+
+PAIRS = [('AAA', 'HRAAA0000001'), ('BBB-R-A', 'HRBBB0000002'), ('FLAKY', 'HRFLK0000003')]
+BROKEN = ('BAD', 'HRBAD0000004')
+START = '2025-09-01'
+END = '2025-10-27'
+SYNC_END = '2025-11-03'
+
+
+def history(ticker, isin):
+    """Full fixture history of one security, newest first like the ZSE export."""
+    dates = pd.bdate_range(START, SYNC_END)
+    prices = 10.0 + len(ticker) + 0.1 * pd.RangeIndex(len(dates))
+    frame = pd.DataFrame({'Date': dates, 'Symbol': ticker, 'ISIN': isin, 'Last Price': prices, 'Volume': 100.0})
+    return frame.iloc[::-1].reset_index(drop=True)
+
+
+def xlsx_bytes(frame):
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine='openpyxl') as writer:
+        frame.to_excel(writer, sheet_name='History', index=False)
+    return buf.getvalue()
+
+
+class StandIn:
+    """Serves /security-history/XZAG/<isin>/<start>/<end>/xlsx from the fixture histories."""
+
+    def __init__(self):
+        self.histories = {isin: history(ticker, isin) for ticker, isin in PAIRS}
+        self.requests = []
+        self.fail_once = {'HRFLK0000003'}      # first answer is an html error page, then the file
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = self.path.strip('/').split('/')
+                isin, start, end = parts[-4], parts[-3], parts[-2]
+                stand_in.requests.append((isin, start, end))
+                if isin in stand_in.fail_once:
+                    stand_in.fail_once.discard(isin)
+                    body, status = b'<html>Service unavailable</html>', 200
+                elif isin not in stand_in.histories:
+                    body, status = b'not a workbook', 200
+                else:
+                    frame = stand_in.histories[isin]
+                    frame = frame[(frame['Date'] >= start) & (frame['Date'] <= end)]
+                    body, status = xlsx_bytes(frame), 200
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def isins(self):
+        return sorted(isin for isin, _, _ in self.requests)
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    monkeypatch.setattr(downloader.time, 'sleep', lambda seconds: None)
+    server = StandIn()
+    server.thread.start()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
+
+
+def manifest(output_dir):
+    with open(os.path.join(output_dir, downloader.MANIFEST_NAME), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_download_retries_skips_and_resumes(stand_in, tmp_path):
+    out = str(tmp_path)
+    result = downloader.download_all(PAIRS + [BROKEN], out, START, END, stand_in.url, workers=2)
+
+    assert sorted(result['downloaded']) == sorted(downloader.raw_file_name(t, i) for t, i in PAIRS)
+    assert result['failed'] == [downloader.raw_file_name(*BROKEN)]
+    # the non-xlsx answers are retried: twice for FLAKY, every attempt for BAD
+    assert stand_in.isins().count('HRFLK0000003') == 2
+    assert stand_in.isins().count(BROKEN[1]) == downloader.MAX_RETRIES + 1
+    assert not os.path.exists(os.path.join(out, downloader.raw_file_name(*BROKEN)))
+    assert not [f for f in os.listdir(out) if f.endswith('.part')]
+
+    entries = manifest(out)
+    assert sorted(entries) == sorted(result['downloaded'])
+    for ticker, isin in PAIRS:
+        name = downloader.raw_file_name(ticker, isin)
+        stored, _ = downloader.read_history(os.path.join(out, name))
+        expected = stand_in.histories[isin]
+        assert stored['Date'].max() == pd.Timestamp(END)
+        assert len(stored) == (expected['Date'] <= END).sum()
+        assert entries[name]['end'] == END and entries[name]['ticker'] == ticker
+    assert downloader.load_dirty(out) == sorted(t for t, _ in PAIRS)
+
+    # a second run only retries what is missing
+    stand_in.requests.clear()
+    result = downloader.download_all(PAIRS + [BROKEN], out, START, END, stand_in.url, workers=2)
+    assert len(result['skipped']) == len(PAIRS)
+    assert stand_in.isins() == [BROKEN[1]] * (downloader.MAX_RETRIES + 1)
+
+    # an interrupted run (file written, manifest entry lost) resumes with that file only
+    lost = downloader.raw_file_name(*PAIRS[0])
+    entries.pop(lost)
+    downloader.save_manifest(os.path.join(out, downloader.MANIFEST_NAME), entries)
+    stand_in.requests.clear()
+    result = downloader.download_all(PAIRS, out, START, END, stand_in.url, workers=2)
+    assert result['downloaded'] == [lost] and stand_in.isins() == [PAIRS[0][1]]
+
+
+def test_sync_merges_delta_and_marks_dirty(stand_in, tmp_path):
+    out = str(tmp_path)
+    downloader.download_all(PAIRS, out, START, END, stand_in.url, workers=2)
+    downloader.pop_dirty(out)
+    # nothing after the download: the high-water day is compared with the stored file
+    result = downloader.sync_all(PAIRS, out, END, stand_in.url, workers=2)
+    assert len(result['unchanged']) == len(PAIRS) and downloader.load_dirty(out) == []
+
+    stand_in.requests.clear()
+    result = downloader.sync_all(PAIRS, out, SYNC_END, stand_in.url, workers=2)
+
+    assert sorted(result['updated']) == sorted(downloader.raw_file_name(t, i) for t, i in PAIRS)
+    # only the days from the high-water mark on are requested
+    assert sorted(stand_in.requests) == sorted((i, END, SYNC_END) for _, i in PAIRS)
+    assert downloader.load_dirty(out) == sorted(t for t, _ in PAIRS)
+
+    entries = manifest(out)
+    for ticker, isin in PAIRS:
+        name = downloader.raw_file_name(ticker, isin)
+        stored, _ = downloader.read_history(os.path.join(out, name))
+        pd.testing.assert_frame_equal(stored, stand_in.histories[isin], check_dtype=False)
+        assert entries[name]['last_date'] == SYNC_END
+        assert entries[name]['end'] == END
+
+    # nothing new: the high-water day is re-requested but no ticker is dirty
+    downloader.pop_dirty(out)
+    result = downloader.sync_all(PAIRS, out, SYNC_END, stand_in.url, workers=2)
+    assert len(result['unchanged']) == len(PAIRS) and downloader.load_dirty(out) == []
+
+    # a same-day re-sync replaces the high-water day when its rows changed (trading was still in progress)
+    frame = stand_in.histories[PAIRS[0][1]]
+    frame.loc[frame['Date'] == SYNC_END, 'Last Price'] += 1.0
+    result = downloader.sync_all(PAIRS, out, SYNC_END, stand_in.url, workers=2)
+    assert result['updated'] == [downloader.raw_file_name(*PAIRS[0])]
+    assert downloader.load_dirty(out) == [PAIRS[0][0]]
+    stored, _ = downloader.read_history(os.path.join(out, downloader.raw_file_name(*PAIRS[0])))
+    pd.testing.assert_frame_equal(stored, frame, check_dtype=False)
+    downloader.pop_dirty(out)
+    result = downloader.sync_all(PAIRS, out, SYNC_END, stand_in.url, workers=2)
+    assert len(result['unchanged']) == len(PAIRS) and downloader.load_dirty(out) == []
+
+    # a default full run after the sync keeps the synced histories
+    stand_in.requests.clear()
+    result = downloader.download_all(PAIRS, out, START, END, stand_in.url, workers=2)
+    assert len(result['skipped']) == len(PAIRS) and stand_in.requests == []
+
+
+def test_sync_downloads_missing_files(stand_in, tmp_path):
+    out = str(tmp_path)
+    downloader.download_all(PAIRS[:1], out, START, END, stand_in.url, workers=2)
+    downloader.pop_dirty(out)
+
+    result = downloader.sync_all(PAIRS, out, SYNC_END, stand_in.url, workers=2)
+
+    assert result['updated'] == [downloader.raw_file_name(*PAIRS[0])]
+    assert downloader.load_dirty(out) == sorted(t for t, _ in PAIRS)
+    for ticker, isin in PAIRS[1:]:
+        stored, _ = downloader.read_history(os.path.join(out, downloader.raw_file_name(ticker, isin)))
+        assert stored['Date'].max() == pd.Timestamp(SYNC_END)
@@ -0,0 +1,223 @@
+"""Closed-form market-model estimation and the MODELS kernels against reference implementations."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import market_model
+from stock_index import StockIndex
+
+sm = pytest.importorskip('statsmodels.api')
+
+TOL = 1e-10
+
+
+def synthetic_panel(n_events=200, n_days=market_model.ESTIMATION_DAYS, seed=7):
+    """Stock and market returns with random NaN gaps and a few windows shorter than MIN_OBS."""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(0.0, 0.01, (n_events, n_days))
+    beta = rng.uniform(-0.5, 2.0, (n_events, 1))
+    Y = 0.001 * rng.normal(size=(n_events, 1)) + beta * X + rng.normal(0.0, 0.02, (n_events, n_days))
+    Y[rng.random(Y.shape) < 0.15] = np.nan
+    X[rng.random(X.shape) < 0.05] = np.nan
+    # thin trading: a handful of events with only a few observed days
+    short = rng.choice(n_events, 20, replace=False)
+    keep = rng.integers(3, market_model.MIN_OBS + 5, len(short))
+    for row, n in zip(short, keep):
+        Y[row, n:] = np.nan
+    return Y, X
+
+
+def statsmodels_fit(y, regressors):
+    """(params, mse_resid, nobs) of sm.OLS on the rows where y and every regressor are finite; no fit below MIN_OBS."""
+    design = np.column_stack(regressors)
+    mask = np.isfinite(y) & np.isfinite(design).all(axis=1)
+    if mask.sum() < market_model.MIN_OBS:
+        return None, None, int(mask.sum())
+    fit = sm.OLS(y[mask], sm.add_constant(design[mask], has_constant='add')).fit()
+    return fit.params, fit.mse_resid, int(fit.nobs)
+
+
+def test_fit_market_model_matches_statsmodels():
+    Y, X = synthetic_panel()
+    fit = market_model.fit_market_model(Y, X)
+
+    assert fit['valid'].sum() > 150 and (~fit['valid']).any()
+    for row in range(len(Y)):
+        params, sigma2, nobs = statsmodels_fit(Y[row], [X[row]])
+        assert fit['n_obs'][row] == nobs
+        if nobs < market_model.MIN_OBS:
+            assert not fit['valid'][row] and np.isnan(fit['alpha'][row])
+            continue
+        assert fit['valid'][row]
+        np.testing.assert_allclose([fit['alpha'][row], fit['beta'][row]], params, rtol=TOL, atol=TOL)
+        np.testing.assert_allclose(fit['sigma2'][row], sigma2, rtol=TOL, atol=TOL)
+
+
+def test_fit_ols_matches_statsmodels_with_lags():
+    Y, X = synthetic_panel(seed=11)
+    lag = np.roll(X, 1, axis=1)
+    lag[:, 0] = np.nan
+    lead = np.roll(X, -1, axis=1)
+    lead[:, -1] = np.nan
+    fit = market_model.fit_ols(Y, [lag, X, lead])
+
+    assert fit['valid'].sum() > 100
+    for row in range(len(Y)):
+        params, sigma2, nobs = statsmodels_fit(Y[row], [lag[row], X[row], lead[row]])
+        assert fit['n_obs'][row] == nobs
+        if nobs < market_model.MIN_OBS:
+            assert not fit['valid'][row] and np.isnan(fit['coef'][row]).all()
+            continue
+        assert fit['valid'][row]
+        np.testing.assert_allclose(fit['coef'][row], params, rtol=TOL, atol=TOL)
+        np.testing.assert_allclose(fit['sigma2'][row], sigma2, rtol=TOL, atol=TOL)
+
+
+def test_market_model_kernel_matches_fit_market_model():
+    Y, X = synthetic_panel(seed=3)
+    closed = market_model.fit_market_model(Y, X)
+    general = market_model.fit_ols(Y, [X])
+
+    np.testing.assert_array_equal(closed['valid'], general['valid'])
+    ok = closed['valid']
+    np.testing.assert_allclose(general['coef'][ok, 0], closed['alpha'][ok], rtol=TOL, atol=TOL)
+    np.testing.assert_allclose(general['coef'][ok, 1], closed['beta'][ok], rtol=TOL, atol=TOL)
+    np.testing.assert_allclose(general['sigma2'][ok], closed['sigma2'][ok], rtol=TOL, atol=TOL)
+
+
+def synthetic_windows(n_tickers=40, n_days=400, seed=5):
+    """
+    EventWindows over a thinly traded synthetic universe: every stock misses a
+    random share of the market's sessions and reacts to the market with a lag;
+    a few have mostly missing returns (too few observations to fit). Several
+    events per ticker.
+    """
+    rng = np.random.default_rng(seed)
+    calendar = pd.bdate_range('2020-01-01', periods=n_days)
+    market = pd.Series(rng.normal(0.0, 0.01, n_days), index=calendar)
+    symbols, offsets, dates, returns = [], {}, [], []
+    events = []
+    for i in range(n_tickers):
+        symbol = f'S{i:02d}'
+        traded = np.flatnonzero(rng.random(n_days) >= rng.uniform(0.0, 0.4))
+        lagged = np.concatenate([[0.0], market.to_numpy()[:-1]])
+        r = (0.0005 + rng.uniform(0.2, 1.5) * market.to_numpy() + rng.uniform(0.0, 0.6) * lagged
+             + rng.normal(0.0, 0.02, n_days))
+        if i % 10 == 9:
+            r[rng.random(n_days) < 0.9] = np.nan
+        offsets[symbol] = (sum(len(d) for d in dates), sum(len(d) for d in dates) + len(traded))
+        symbols.append(symbol)
+        dates.append(calendar[traded].to_numpy(dtype='datetime64[ns]'))
+        returns.append(r[traded])
+        events += [(symbol, day) for day in calendar[rng.integers(60, n_days, 4)]]
+    stocks = StockIndex(symbols, offsets, np.concatenate(dates), np.concatenate(returns))
+    events = pd.DataFrame(events, columns=['Symbol', 'EventDate'])
+    return events, market_model.event_windows(events, stocks, market)
+
+
+def usable(*rows):
+    mask = np.ones(len(rows[0]), dtype=bool)
+    for values in rows:
+        mask &= np.isfinite(values)
+    return mask
+
+
+def scholes_williams_reference(y, lag, x, lead):
+    """Textbook Scholes-Williams: three simple-regression slopes and the market autocorrelation."""
+    mask = usable(y, lag, x, lead)
+    if mask.sum() < max(market_model.MIN_OBS, 4):
+        return None
+    y, lag, x, lead = y[mask], lag[mask], x[mask], lead[mask]
+    slopes = [sm.OLS(y, sm.add_constant(m)).fit().params[1] for m in (lag, x, lead)]
+    rho = np.corrcoef(x, lag)[0, 1]
+    beta = sum(slopes) / (1 + 2 * rho)
+    alpha = y.mean() - beta * x.mean()
+    resid = y - alpha - beta * x
+    return alpha, beta, (resid ** 2).sum() / (len(y) - 2), int(mask.sum())
+
+
+def test_scholes_williams_matches_reference():
+    _, w = synthetic_windows()
+    fit = market_model.scholes_williams(w)
+    Y, lag, X, lead = w.stock('est'), w.market('est', -1), w.market('est'), w.market('est', 1)
+
+    assert fit['valid'].sum() > 100 and (~fit['valid'] & w.est_ok).any()
+    for row in np.flatnonzero(w.est_ok):
+        ref = scholes_williams_reference(Y[row], lag[row], X[row], lead[row])
+        if ref is None:
+            assert not fit['valid'][row] and np.isnan(fit['beta'][row])
+            continue
+        alpha, beta, sigma2, nobs = ref
+        assert fit['valid'][row] and fit['n_obs'][row] == nobs
+        np.testing.assert_allclose([fit['alpha'][row], fit['beta'][row], fit['sigma2'][row]],
+                                   [alpha, beta, sigma2], rtol=TOL, atol=TOL)
+        np.testing.assert_allclose(fit['expected']['ev'][row], alpha + beta * w.market('ev')[row],
+                                   rtol=TOL, atol=TOL)
+
+
+def test_dimson_matches_statsmodels():
+    _, w = synthetic_windows(seed=9)
+    fit = market_model.dimson(w)
+    Y = w.stock('est')
+    shifts = range(-market_model.DIMSON_LAGS, market_model.DIMSON_LAGS + 1)
+    X = [w.market('est', k) for k in shifts]
+    M = [w.market('ev', k) for k in shifts]
+
+    assert fit['valid'].sum() > 100
+    for row in np.flatnonzero(w.est_ok):
+        params, sigma2, nobs = statsmodels_fit(Y[row], [x[row] for x in X])
+        assert fit['n_obs'][row] == nobs
+        if params is None:
+            assert not fit['valid'][row]
+            continue
+        assert fit['valid'][row]
+        np.testing.assert_allclose([fit['alpha'][row], fit['beta'][row], fit['sigma2'][row]],
+                                   [params[0], params[1:].sum(), sigma2], rtol=TOL, atol=TOL)
+        expected = params[0] + sum(c * m[row] for c, m in zip(params[1:], M))
+        np.testing.assert_allclose(fit['expected']['ev'][row], expected, rtol=TOL, atol=TOL)
+
+
+def test_mean_and_market_adjusted_match_reference():
+    _, w = synthetic_windows(seed=13)
+    mean_fit = market_model.mean_adjusted(w)
+    adj_fit = market_model.market_adjusted(w)
+    Y, X = w.stock('est'), w.market('est')
+
+    for row in np.flatnonzero(w.est_ok):
+        y = Y[row][np.isfinite(Y[row])]
+        if len(y) < market_model.MIN_OBS:
+            assert not mean_fit['valid'][row]
+        else:
+            np.testing.assert_allclose([mean_fit['alpha'][row], mean_fit['sigma2'][row]],
+                                       [y.mean(), y.var(ddof=1)], rtol=TOL, atol=TOL)
+            assert mean_fit['beta'][row] == 0.0
+            np.testing.assert_allclose(mean_fit['expected']['ev'][row], y.mean(), rtol=TOL, atol=TOL)
+        d = (Y[row] - X[row])[usable(Y[row], X[row])]
+        if len(d) < market_model.MIN_OBS:
+            assert not adj_fit['valid'][row]
+        else:
+            assert (adj_fit['alpha'][row], adj_fit['beta'][row]) == (0.0, 1.0)
+            np.testing.assert_allclose(adj_fit['sigma2'][row], d.var(ddof=1), rtol=TOL, atol=TOL)
+            np.testing.assert_array_equal(adj_fit['expected']['ev'][row], w.market('ev')[row])
+
+
+def test_models_registry_and_evaluate():
+    assert set(market_model.MODELS) == {'mean_adjusted', 'market_adjusted', 'market', 'scholes_williams', 'dimson'}
+    events, w = synthetic_windows(seed=17)
+    results = market_model.evaluate(events, None, None, list(market_model.MODELS), windows=w)
+
+    for name, (result, ar) in results.items():
+        fit = market_model.MODELS[name](w)
+        ok = (result['status'] == market_model.OK).to_numpy()
+        assert ok.any() and (result['model'] == name).all()
+        np.testing.assert_array_equal(ok, w.in_range & fit['valid'])
+        np.testing.assert_allclose(result['beta'].to_numpy()[ok], fit['beta'][ok], rtol=TOL, atol=TOL)
+        np.testing.assert_allclose(ar[ok], (w.stock('ev') - fit['expected']['ev'])[ok], rtol=TOL, atol=TOL)
+        assert np.isnan(ar[~ok]).all()
+    market_fit = market_model.fit_market_model(w.stock('est'), w.market('est'))
+    ok = (results['market'][0]['status'] == market_model.OK).to_numpy()
+    np.testing.assert_allclose(results['market'][0]['alpha'].to_numpy()[ok], market_fit['alpha'][ok],
+                               rtol=TOL, atol=TOL)
+
+    with pytest.raises(ValueError, match='Unknown model'):
+        market_model.evaluate(events, None, None, ['capm'], windows=w)
@@ -0,0 +1,40 @@
+"""pipeline.py: a changed raw file re-runs the import stage and reaches the merged stage."""
+import os
+
+import pandas as pd
+
+import pipeline
+import price_store
+
+PAIRS = [('AAA', 'HRAAA0000001'), ('BBB', 'HRBBB0000002')]
+
+
+def raw_history(ticker, isin, rows):
+    dates = pd.bdate_range('2025-01-01', periods=rows)[::-1]
+    return pd.DataFrame({'Date': dates, 'Symbol': ticker, 'ISIN': isin, 'Last Price': 10.0, 'Volume': 100.0})
+
+
+def import_stage(raw_dir, store_dir):
+    """The pipeline's import stage, pointed at a scratch raw directory and store."""
+    stage = next(s for s in pipeline.STAGES if s.name == 'import')
+    return pipeline.Stage(stage.name, stage.script, args=stage.args + ['--raw-dir', raw_dir],
+                          inputs=[raw_dir], outputs=[os.path.join(store_dir, 'merged')])
+
+
+def test_changed_raw_file_is_reimported(tmp_path, monkeypatch):
+    raw_dir, store_dir = str(tmp_path / 'raw'), str(tmp_path / 'store')
+    os.makedirs(raw_dir)
+    monkeypatch.setenv('PRICE_STORE_DIR', store_dir)
+    for ticker, isin in PAIRS:
+        raw_history(ticker, isin, 40).to_excel(os.path.join(raw_dir, f'{ticker}_{isin}.xlsx'), index=False)
+    stages, state = [import_stage(raw_dir, store_dir)], str(tmp_path / 'state.json')
+
+    assert pipeline.run(['all'], stages, state_path=state) == {'import': 'ok'}
+    assert len(price_store.load_ticker('AAA', 'merged', store_dir=store_dir)) == 40
+    assert pipeline.run(['all'], stages, state_path=state) == {'import': 'cached'}
+
+    # a shorter replacement download, not listed in dirty.json
+    raw_history('AAA', 'HRAAA0000001', 30).to_excel(os.path.join(raw_dir, 'AAA_HRAAA0000001.xlsx'), index=False)
+    assert pipeline.run(['all'], stages, state_path=state) == {'import': 'ok'}
+    assert len(price_store.load_ticker('AAA', 'merged', store_dir=store_dir)) == 30
+    assert len(price_store.load_ticker('BBB', 'merged', store_dir=store_dir)) == 40
@@ -0,0 +1,39 @@
+"""price_store.import_raw: one stored copy per security, also when only dirty tickers are re-imported."""
+import os
+import shutil
+
+import pandas as pd
+
+import price_store
+
+
+def raw_history(ticker, isin, rows, price=10.0):
+    dates = pd.bdate_range('2025-01-01', periods=rows)[::-1]
+    return pd.DataFrame({'Date': dates, 'Symbol': ticker, 'ISIN': isin, 'Last Price': price, 'Volume': 100.0})
+
+
+def test_dirty_alias_is_checked_against_the_stored_canonical(tmp_path):
+    raw_dir, store_dir = str(tmp_path / 'raw'), str(tmp_path / 'store')
+    os.makedirs(raw_dir)
+    canonical = os.path.join(raw_dir, 'VLEN_HRVLENRB0001.xlsx')
+    alias = os.path.join(raw_dir, 'VLEN-R-A_HRVLENRB0001.xlsx')
+    raw_history('VLEN', 'HRVLENRB0001', 30).to_excel(canonical, index=False)
+    raw_history('VLEN', 'HRVLENRB0001', 20).to_excel(alias, index=False)
+    raw_history('INA', 'HRINA0RA0007', 30).to_excel(os.path.join(raw_dir, 'INA_HRINA0RA0007.xlsx'), index=False)
+
+    assert price_store.import_raw(raw_dir, store_dir=store_dir) == ['INA', 'VLEN', 'VLEN-R-A']
+
+    # the alias is re-downloaded as a byte copy of the canonical file and only it is dirty
+    shutil.copyfile(canonical, alias)
+    assert price_store.import_raw(raw_dir, ['VLEN-R-A'], store_dir) == []
+    assert price_store.list_tickers('merged', store_dir) == ['INA', 'VLEN']
+
+    # same data in a different workbook
+    raw_history('VLEN', 'HRVLENRB0001', 30).to_excel(alias, index=False, sheet_name='History')
+    assert price_store.import_raw(raw_dir, ['VLEN-R-A'], store_dir) == []
+    assert price_store.list_tickers('merged', store_dir) == ['INA', 'VLEN']
+
+    # a dirty alias with its own data is still stored, the canonical file is left alone
+    raw_history('VLEN', 'HRVLENRB0001', 30, price=11.0).to_excel(alias, index=False)
+    assert price_store.import_raw(raw_dir, ['VLEN-R-A'], store_dir) == ['VLEN-R-A']
+    assert len(price_store.load_ticker('VLEN', 'merged', store_dir=store_dir)) == 30